@@ -0,0 +1,313 @@
+"""Asyncio variants of the clients.
+
+google-api-python-client has no async transport, so requests are executed on
+a bounded thread pool; max_concurrency caps how many are in flight at once.
+The pooled transport in service.py gives every worker thread its own
+connection, so the underlying clients can be shared safely.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import functools
+
+from .calendar import CalendarClient
+from .contacts import ContactsClient
+from .drive import DriveClient
+from .spreadsheet import GoogleSpreadsheet
+from .tasks import TaskClient
+
+DEFAULT_MAX_CONCURRENCY = 10
+
+
+class AsyncExecutor:
+    def __init__(self, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="google-cloud"
+        )
+
+    async def run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._pool, functools.partial(fn, *args, **kwargs)
+        )
+
+    async def execute(self, request):
+        return await self.run(request.execute)
+
+    async def paginate(self, make_request, items_key, page_token=None):
+        """Yield items page by page; make_request(page_token) builds the
+        request for each page."""
+        while True:
+            response = await self.execute(make_request(page_token))
+            for item in response.get(items_key, []):
+                yield item
+            page_token = response.get("nextPageToken")
+            if page_token is None:
+                break
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+
+
+class _AsyncClient:
+    def __init__(self, client, max_concurrency=DEFAULT_MAX_CONCURRENCY, executor=None):
+        self.client = client
+        self.executor = executor or AsyncExecutor(max_concurrency)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.executor.close()
+
+    async def _run(self, fn, *args, **kwargs):
+        return await self.executor.run(fn, *args, **kwargs)
+
+
+class AsyncDriveClient(_AsyncClient):
+    def __init__(
+        self,
+        token_file,
+        secrets_file,
+        scopes=None,
+        max_concurrency=DEFAULT_MAX_CONCURRENCY,
+    ):
+        super().__init__(
+            DriveClient(token_file, secrets_file, scopes=scopes), max_concurrency
+        )
+
+    async def get(self, id):
+        return await self._run(self.client.get, id)
+
+    async def list_files(self, **kwargs):
+        return await self._run(self.client.list_files, **kwargs)
+
+    async def list_folders(self, **kwargs):
+        return await self._run(self.client.list_folders, **kwargs)
+
+    async def iter_files(self, parent=None, mimetype=None, fields=None, **kwargs):
+        pages = await self._run(
+            self.client.iter_file_pages,
+            parent=parent,
+            mimetype=mimetype,
+            fields=fields,
+            **kwargs,
+        )
+        # the generator is advanced on the worker threads, one page per step
+        while (page := await self._run(next, pages, None)) is not None:
+            for file in page.files:
+                yield file
+
+    async def upload_file(self, path, **kwargs):
+        return await self._run(self.client.upload_file, path, **kwargs)
+
+    async def create_folder(self, name, parent=None):
+        return await self._run(self.client.create_folder, name, parent=parent)
+
+    async def list_permissions(self, file_id):
+        return await self._run(self.client.list_permissions, file_id)
+
+    async def create_permission(self, file_id, role, type, email_address, **kwargs):
+        return await self._run(
+            self.client.create_permission, file_id, role, type, email_address, **kwargs
+        )
+
+    async def update_permission(self, file_id, permission_id, role):
+        return await self._run(
+            self.client.update_permission, file_id, permission_id, role
+        )
+
+    async def delete_permission(self, file_id, permission_id):
+        return await self._run(self.client.delete_permission, file_id, permission_id)
+
+
+class AsyncCalendarClient(_AsyncClient):
+    def __init__(
+        self,
+        token_file,
+        secrets_file,
+        scopes=None,
+        tz=None,
+        max_concurrency=DEFAULT_MAX_CONCURRENCY,
+    ):
+        super().__init__(
+            CalendarClient(token_file, secrets_file, scopes=scopes, tz=tz),
+            max_concurrency,
+        )
+
+    async def list_calendars(self, wrapped=True):
+        return await self._run(self.client.list_calendars, wrapped=wrapped)
+
+    async def list_events(self, calendars, start, end, expand_recurring=True):
+        # CalendarClient.list_events fetches the calendars concurrently and
+        # merges them in start order, within this client's concurrency
+        return await self._run(
+            self.client.list_events,
+            list(calendars),
+            start,
+            end,
+            expand_recurring,
+            max_workers=self.executor.max_concurrency,
+        )
+
+    async def iter_events(self, calendar, start, end, expand_recurring=False):
+        pages = await self._run(
+            self.client.iter_calendar_event_pages,
+            calendar,
+            start,
+            end,
+            expand_recurring,
+        )
+        # each page is fetched and parsed on the worker threads
+        while (page := await self._run(next, pages, None)) is not None:
+            for event in page:
+                yield event
+
+
+class AsyncContactsClient(_AsyncClient):
+    def __init__(
+        self,
+        token_file,
+        secrets_file,
+        scopes=None,
+        max_concurrency=DEFAULT_MAX_CONCURRENCY,
+    ):
+        super().__init__(
+            ContactsClient(token_file, secrets_file, scopes=scopes), max_concurrency
+        )
+
+    async def list(self, **kwargs):
+        return await self._run(self.client.list, **kwargs)
+
+    async def iter_contacts(self, page_size=1000, fields="names,emailAddresses"):
+        service = await self._run(self.client.get_service)
+
+        def make_request(page_token):
+            list_kwargs = dict(
+                resourceName="people/me", pageSize=page_size, personFields=fields
+            )
+            if page_token:
+                list_kwargs["pageToken"] = page_token
+            return service.people().connections().list(**list_kwargs)
+
+        async for contact in self.executor.paginate(make_request, "connections"):
+            yield contact
+
+    async def groups(self):
+        return await self._run(self.client.groups)
+
+    async def create_group(self, group_name):
+        return await self._run(self.client.create_group, group_name)
+
+    async def group_modify_members(self, group, to_add=None, to_remove=None):
+        return await self._run(
+            self.client.group_modify_members, group, to_add=to_add, to_remove=to_remove
+        )
+
+    async def batch_create_contacts(self, batch_request):
+        return await self._run(self.client.batch_create_contacts, batch_request)
+
+    async def delete_contact(self, contact):
+        return await self._run(self.client.delete_contact, contact)
+
+
+class AsyncTaskClient(_AsyncClient):
+    def __init__(
+        self,
+        token_file,
+        secrets_file,
+        scopes=None,
+        max_concurrency=DEFAULT_MAX_CONCURRENCY,
+    ):
+        super().__init__(
+            TaskClient(token_file, secrets_file, scopes=scopes), max_concurrency
+        )
+
+    async def list_tasklists(self):
+        return await self._run(self.client.list_tasklists)
+
+    async def get_tasklist(self, title):
+        return await self._run(self.client.get_tasklist, title)
+
+    async def list_tasks(self, tasklist_id):
+        return await self._run(self.client.list_tasks, tasklist_id)
+
+    async def iter_tasks(self, tasklist_id):
+        service = await self._run(self.client.get_service)
+
+        def make_request(page_token):
+            return service.tasks().list(tasklist=tasklist_id, pageToken=page_token)
+
+        async for task in self.executor.paginate(make_request, "items"):
+            yield task
+
+    async def insert_task(self, tasklist_id, task):
+        return await self._run(self.client.insert_task, tasklist_id, task)
+
+    async def delete_task(self, tasklist_id, task_id):
+        return await self._run(self.client.delete_task, tasklist_id, task_id)
+
+    async def delete_tasks(self, tasklist_id, task_ids):
+        return await self._run(self.client.delete_tasks, tasklist_id, task_ids)
+
+    async def clear_tasklist(self, tasklist_id):
+        return await self._run(self.client.clear_tasklist, tasklist_id)
+
+
+class AsyncGoogleSpreadsheet(_AsyncClient):
+    def __init__(
+        self, spreadsheet, max_concurrency=DEFAULT_MAX_CONCURRENCY, executor=None
+    ):
+        super().__init__(spreadsheet, max_concurrency, executor)
+
+    @classmethod
+    async def for_id(
+        cls,
+        id,
+        token_file,
+        secrets_file,
+        scopes=None,
+        max_concurrency=DEFAULT_MAX_CONCURRENCY,
+        **kwargs,
+    ):
+        """GoogleSpreadsheet.for_id (sheets, lazy, ...) run on the new
+        client's own bounded pool."""
+        executor = AsyncExecutor(max_concurrency)
+        spreadsheet = await executor.run(
+            GoogleSpreadsheet.for_id,
+            id,
+            token_file,
+            secrets_file,
+            scopes=scopes,
+            **kwargs,
+        )
+        return cls(spreadsheet, executor=executor)
+
+    @property
+    def spreadsheet(self):
+        return self.client
+
+    async def get_sheet(self, title):
+        """The sheet, with a lazily loaded sheet's values fetched on the pool
+        rather than by the first read on the event loop."""
+        sheet = self.client.get_sheet(title)
+        if sheet is not None and not sheet.loaded:
+            await self._run(sheet.load)
+        return sheet
+
+    async def update_range(self, range, values, input_option="RAW"):
+        return await self._run(
+            self.client.update_range, range, values, input_option=input_option
+        )
+
+    async def add_sheet(self, name):
+        return await self._run(self.client.add_sheet, name)
+
+    async def update_single_cells(self, cells, values, input_option="RAW"):
+        return await self._run(
+            self.client.update_single_cells, cells, values, input_option=input_option
+        )
@@ -1,9 +1,20 @@
+from array import array
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 import datetime
+from functools import lru_cache
+import heapq
 import zoneinfo
 
+from googleapiclient.errors import HttpError
+
 from .service import ServiceFactory
 
+# the most events.list returns per page
+MAX_PAGE_SIZE = 2500
+# the most calendars one freebusy.query accepts
+FREEBUSY_MAX_CALENDARS = 50
+
 
 @dataclass
 class Calendar:
@@ -26,6 +37,8 @@ class Calendar:
 
 @dataclass
 class Event:
+    __slots__ = ("id", "name", "start", "end", "calendar", "tz", "recurrence")
+
     id: str
     name: str
     start: datetime.datetime
@@ -51,25 +64,42 @@ class Event:
         return self.start.time() == self.end.time() == datetime.time(0, 0)
 
 
+def parse_events(items, calendar, tz):
+    """Events from an events.list page, skipping cancelled ones."""
+    return [
+        Event.from_dict(item, calendar, tz)
+        for item in items
+        if item.get("status", "") != "cancelled"
+    ]
+
+
 def parse_date(raw):
-    return datetime.datetime.strptime(raw, "%Y-%m-%d").date()
+    return datetime.date.fromisoformat(raw)
 
 
 def parse_event_date(obj, tz):
     if date := obj.get("date"):
-        return datetime.datetime.combine(parse_date(date), datetime.time(0, 0)).replace(
-            tzinfo=tz
-        )
-    dt = obj["dateTime"]
-    if dt.endswith("Z"):
-        dt = dt[:-1]
-    return datetime.datetime.fromisoformat(dt).replace(tzinfo=tz)
+        return _midnight(date, tz)
+    dt = parse_rfc3339(obj["dateTime"])
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=tz)
+    # keep the instant, shown in the calendar's zone
+    return dt.astimezone(tz)
+
+
+@lru_cache(maxsize=4096)
+def _midnight(date, tz):
+    # all-day events repeat the same few dates, and datetimes are immutable
+    return datetime.datetime.combine(parse_date(date), datetime.time(0, 0)).replace(
+        tzinfo=tz
+    )
 
 
 class CalendarClient:
-    def __init__(self, token_file, secrets_file, scopes=None, tz=None):
+    def __init__(self, token_file, secrets_file, scopes=None, tz=None, store=None):
         self.token_file = token_file
         self.secrets_file = secrets_file
+        self.store = store
         self.factory = ServiceFactory(self.token_file, self.secrets_file, scopes=scopes)
         if tz is None:
             self.tz = datetime.timezone.utc
@@ -85,60 +115,199 @@ class CalendarClient:
             return [Calendar.from_dict(item) for item in response["items"]]
         return response["items"]
 
-    def list_events(self, calendars, start, end, expand_recurring=True):
+    def list_events(self, calendars, start, end, expand_recurring=True, max_workers=8):
+        """Events from all calendars between start and end, sorted by start."""
+        return list(
+            self.iter_events(calendars, start, end, expand_recurring, max_workers)
+        )
+
+    def iter_events(self, calendars, start, end, expand_recurring=True, max_workers=8):
+        """Iterate events from all calendars in start order.  Each calendar is
+        read page by page, with its next page fetched on a pool of up to
+        max_workers threads while the current one is merged, so only about a
+        page per calendar is held at once.  Recurring events are expanded into
+        instances by the server (singleEvents), which also returns them in
+        start order; without expansion each calendar is listed in full and
+        sorted before merging."""
+        calendars = list(calendars)
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            streams = [
+                _prefetch(
+                    pool,
+                    self._sorted_event_pages(calendar, start, end, expand_recurring),
+                )
+                for calendar in calendars
+            ]
+            yield from heapq.merge(*streams, key=lambda event: event.start)
+
+    def _sorted_event_pages(self, calendar, start, end, expand_recurring):
+        pages = self.iter_calendar_event_pages(calendar, start, end, expand_recurring)
+        if expand_recurring:
+            yield from pages
+            return
+        # orderBy=startTime is only allowed with singleEvents
+        events = [event for page in pages for event in page]
+        events.sort(key=lambda event: event.start)
+        yield events
+
+    def iter_calendar_events(
+        self, calendar, start, end, expand_recurring=True, page_size=MAX_PAGE_SIZE
+    ):
+        """Iterate one calendar's events, page by page."""
+        for page in self.iter_calendar_event_pages(
+            calendar, start, end, expand_recurring, page_size
+        ):
+            yield from page
+
+    def iter_calendar_event_pages(
+        self, calendar, start, end, expand_recurring=True, page_size=MAX_PAGE_SIZE
+    ):
+        """Lists of one calendar's events, one per events.list page."""
         start = self._normalize_timestamp(start)
         end = self._normalize_timestamp(end)
-
         service = self.get_service()
+        kwargs = {}
+        if expand_recurring:
+            kwargs = {"singleEvents": True, "orderBy": "startTime"}
+        return self._iter_event_pages(
+            calendar,
+            lambda page_token: service.events().list(
+                calendarId=calendar.id,
+                timeMax=end.isoformat(),
+                timeMin=start.isoformat(),
+                maxResults=page_size,
+                pageToken=page_token,
+                **kwargs,
+            ),
+        )
+
+    def _iter_event_pages(self, calendar, make_request):
+        page_token = None
+        while True:
+            response = make_request(page_token).execute()
+            yield parse_events(response.get("items", []), calendar, self.tz)
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                break
+
+    def sync(self, calendars, store=None, expand_recurring=True, max_workers=8):
+        """Sync the calendars into a CalendarStore concurrently: a calendar
+        without a token, or whose token the server answers 410 Gone for, is
+        listed in full, the rest just fetch their changes.  Returns
+        {calendar id: events listed or changed}."""
+        store = store or self.store
+        calendars = list(calendars)
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            counts = pool.map(
+                lambda calendar: self._sync_calendar(calendar, store, expand_recurring),
+                calendars,
+            )
+            return dict(zip((calendar.id for calendar in calendars), counts))
+
+    def _sync_calendar(self, calendar, store, expand_recurring):
+        sync_token = store.sync_token(calendar.id)
+        if sync_token is not None:
+            try:
+                return self._sync_changes(calendar, store, sync_token, expand_recurring)
+            except HttpError as err:
+                if err.resp.status != 410:
+                    raise
+                store.clear(calendar.id)
+        events, sync_token = self._list_for_sync(calendar, expand_recurring)
+        store.replace_calendar(calendar, events, sync_token)
+        return len(events)
+
+    def _sync_changes(self, calendar, store, sync_token, expand_recurring):
+        count = 0
+        page_token = None
+        while True:
+            response = self._sync_request(
+                calendar, sync_token, page_token, expand_recurring
+            ).execute()
+            page_token = response.get("nextPageToken")
+            count += store.apply_changes(
+                calendar, response.get("items", []), response.get("nextSyncToken")
+            )
+            if page_token is None:
+                return count
+
+    def _list_for_sync(self, calendar, expand_recurring):
         events = []
-        for calendar in calendars:
-            response = (
-                service.events()
-                .list(
-                    calendarId=calendar.id,
-                    timeMax=end.isoformat(),
-                    timeMin=start.isoformat(),
+        page_token = None
+        while True:
+            response = self._sync_request(
+                calendar, None, page_token, expand_recurring
+            ).execute()
+            events.extend(response.get("items", []))
+            page_token = response.get("nextPageToken")
+            if page_token is None:
+                return events, response["nextSyncToken"]
+
+    def _sync_request(self, calendar, sync_token, page_token, expand_recurring):
+        # sync requests can't carry timeMin/timeMax/orderBy, and must otherwise
+        # match the request that produced the token
+        return (
+            self.get_service()
+            .events()
+            .list(
+                calendarId=calendar.id,
+                syncToken=sync_token,
+                pageToken=page_token,
+                maxResults=MAX_PAGE_SIZE,
+                singleEvents=expand_recurring,
+            )
+        )
+
+    def freebusy(self, calendars, start, end, max_workers=8, index=None):
+        """Busy times for calendars (Calendars or ids) between start and end,
+        loaded into an AvailabilityIndex.  Calendars are queried
+        FREEBUSY_MAX_CALENDARS at a time, concurrently."""
+        start = self._normalize_timestamp(start)
+        end = self._normalize_timestamp(end)
+        ids = [getattr(calendar, "id", calendar) for calendar in calendars]
+        chunks = [
+            ids[i : i + FREEBUSY_MAX_CALENDARS]
+            for i in range(0, len(ids), FREEBUSY_MAX_CALENDARS)
+        ]
+        service = self.get_service()
+
+        def query(chunk):
+            return (
+                service.freebusy()
+                .query(
+                    body={
+                        "timeMin": start.isoformat(),
+                        "timeMax": end.isoformat(),
+                        "items": [{"id": id} for id in chunk],
+                    }
                 )
                 .execute()
             )
-            events.extend(
-                [
-                    Event.from_dict(event, calendar, self.tz)
-                    for event in response["items"]
-                    if event.get("status", "") != "cancelled"
-                ]
-            )
-        if expand_recurring:
-            events = self._expand_recurring(events, start, end, service=service)
-        return events
 
-    def _expand_recurring(self, events, start, end, service=None):
-        ret = []
-        for event in events:
-            if not event.recurrence:
-                ret.append(event)
-                continue
-            instances = self.list_event_instances(event, start, end, service=service)
-            ret.extend(instances)
-        return ret
+        index = index if index is not None else AvailabilityIndex()
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for response in pool.map(query, chunks):
+                index.add_freebusy(response)
+        return index
 
     def list_event_instances(self, parent, start, end, service=None):
+        """Instances of a recurring event between start and end, expanded by
+        the server as list_events does with singleEvents."""
+        start = self._normalize_timestamp(start)
+        end = self._normalize_timestamp(end)
         service = service or self.get_service()
-        response = (
-            service.events()
-            .instances(
+        pages = self._iter_event_pages(
+            parent.calendar,
+            lambda page_token: service.events().instances(
                 calendarId=parent.calendar.id,
                 eventId=parent.id,
                 timeMax=end.isoformat(),
                 timeMin=start.isoformat(),
-            )
-            .execute()
+                maxResults=MAX_PAGE_SIZE,
+                pageToken=page_token,
+            ),
         )
-        return [
-            Event.from_dict(event, parent.calendar, self.tz)
-            for event in response["items"]
-            if event.get("status", "") != "cancelled"
-        ]
+        return [event for page in pages for event in page]
 
     def _normalize_timestamp(self, timestamp):
         if is_tz_aware(timestamp):
@@ -146,5 +315,213 @@ class CalendarClient:
         return timestamp.replace(tzinfo=self.tz)
 
 
+@dataclass(frozen=True)
+class BusyInterval:
+    calendar_id: str
+    start: datetime.datetime
+    end: datetime.datetime
+    # None when the interval came from freebusy.query
+    event: Event = None
+
+
+class IntervalIndex:
+    """Augmented interval tree over (start, end, item) with numeric bounds.
+
+    The tree is implicit in arrays sorted by start: the node for a slice is its
+    middle element, and max_end holds the largest end in the node's subtree,
+    so whole subtrees ending before a query are skipped.  Intervals added
+    after a query trigger a rebuild on the next one."""
+
+    def __init__(self, intervals=()):
+        self._intervals = list(intervals)
+        self._built = False
+
+    def __len__(self):
+        return len(self._intervals)
+
+    def add(self, start, end, item=None):
+        self._intervals.append((start, end, item))
+        self._built = False
+
+    def overlapping(self, start, end):
+        """(start, end, item) of intervals overlapping start..end, by start."""
+        if not self._built:
+            self._build()
+        found = []
+        self._search(0, len(self._starts), start, end, found)
+        return found
+
+    def _build(self):
+        self._intervals.sort(key=lambda interval: interval[:2])
+        self._starts = array("d", (interval[0] for interval in self._intervals))
+        self._ends = array("d", (interval[1] for interval in self._intervals))
+        self._max_end = array("d", self._ends)
+        self._fill_max_end(0, len(self._intervals))
+        self._built = True
+
+    def _fill_max_end(self, lo, hi):
+        if lo >= hi:
+            return float("-inf")
+        mid = (lo + hi) // 2
+        self._max_end[mid] = max(
+            self._ends[mid],
+            self._fill_max_end(lo, mid),
+            self._fill_max_end(mid + 1, hi),
+        )
+        return self._max_end[mid]
+
+    def _search(self, lo, hi, start, end, found):
+        if lo >= hi:
+            return
+        mid = (lo + hi) // 2
+        if self._max_end[mid] <= start:
+            return
+        self._search(lo, mid, start, end, found)
+        if self._starts[mid] < end:
+            if self._ends[mid] > start:
+                found.append(self._intervals[mid])
+            self._search(mid + 1, hi, start, end, found)
+
+
+class AvailabilityIndex:
+    """Busy intervals per calendar, from Events or freebusy.query responses,
+    answering free slot and conflict queries without going back to the api.
+
+    All-day events mark a day rather than time taken, so add_event skips them
+    unless include_all_day is set."""
+
+    def __init__(self):
+        self._calendars = {}
+        # calendar id -> freebusy errors, e.g. notFound
+        self.errors = {}
+
+    @classmethod
+    def from_events(cls, events, include_all_day=False):
+        index = cls()
+        for event in events:
+            index.add_event(event, include_all_day=include_all_day)
+        return index
+
+    @property
+    def calendar_ids(self):
+        return list(self._calendars)
+
+    def add(self, calendar_id, start, end, event=None):
+        self._calendars.setdefault(calendar_id, IntervalIndex()).add(
+            start.timestamp(), end.timestamp(), event
+        )
+
+    def add_event(self, event, include_all_day=False):
+        if include_all_day or not event.all_day:
+            self.add(event.calendar.id, event.start, event.end, event)
+
+    def add_freebusy(self, response):
+        for calendar_id, result in response.get("calendars", {}).items():
+            if result.get("errors"):
+                self.errors[calendar_id] = result["errors"]
+            intervals = self._calendars.setdefault(calendar_id, IntervalIndex())
+            for busy in result.get("busy", []):
+                intervals.add(
+                    parse_rfc3339(busy["start"]).timestamp(),
+                    parse_rfc3339(busy["end"]).timestamp(),
+                )
+
+    def conflicts(self, start, end, calendar_ids=None):
+        """BusyIntervals overlapping start..end, by calendar then start."""
+        return [
+            BusyInterval(
+                calendar_id,
+                _from_timestamp(busy_start, start.tzinfo),
+                _from_timestamp(busy_end, start.tzinfo),
+                event,
+            )
+            for calendar_id in self._selected(calendar_ids)
+            for busy_start, busy_end, event in self._calendars[calendar_id].overlapping(
+                start.timestamp(), end.timestamp()
+            )
+        ]
+
+    def busy(self, start, end, calendar_ids=None):
+        """Merged (start, end) periods when any of the calendars is busy,
+        clipped to start..end."""
+        lo, hi = start.timestamp(), end.timestamp()
+        intervals = sorted(
+            (max(busy_start, lo), min(busy_end, hi))
+            for calendar_id in self._selected(calendar_ids)
+            for busy_start, busy_end, _ in self._calendars[calendar_id].overlapping(
+                lo, hi
+            )
+        )
+        merged = []
+        for busy_start, busy_end in intervals:
+            if merged and busy_start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], busy_end)
+            else:
+                merged.append([busy_start, busy_end])
+        return [
+            (_from_timestamp(a, start.tzinfo), _from_timestamp(b, start.tzinfo))
+            for a, b in merged
+        ]
+
+    def free_slots(self, start, end, duration, calendar_ids=None):
+        """(start, end) gaps of at least duration (a timedelta) when none of the
+        calendars is busy."""
+        slots = []
+        cursor = start
+        for busy_start, busy_end in self.busy(start, end, calendar_ids):
+            if busy_start - cursor >= duration:
+                slots.append((cursor, busy_start))
+            cursor = max(cursor, busy_end)
+        if end - cursor >= duration:
+            slots.append((cursor, end))
+        return slots
+
+    def is_free(self, start, end, calendar_ids=None):
+        return not self.conflicts(start, end, calendar_ids)
+
+    def _selected(self, calendar_ids):
+        if calendar_ids is None:
+            return list(self._calendars)
+        return [id for id in calendar_ids if id in self._calendars]
+
+
+def find_conflicts(events, include_all_day=False):
+    """Pairs of overlapping events, found with a sweep over start times."""
+    events = sorted(
+        (event for event in events if include_all_day or not event.all_day),
+        key=lambda event: event.start,
+    )
+    conflicts = []
+    active = []
+    for event in events:
+        active = [other for other in active if other.end > event.start]
+        conflicts.extend((other, event) for other in active)
+        active.append(event)
+    return conflicts
+
+
+def _prefetch(pool, pages):
+    """Iterate the items of an iterator of pages, fetching each next page on
+    the pool while the current one is consumed.  The first page is requested
+    straight away, so streams created together load concurrently."""
+
+    def items(future):
+        while (page := future.result()) is not None:
+            future = pool.submit(next, pages, None)
+            yield from page
+
+    return items(pool.submit(next, pages, None))
+
+
+def parse_rfc3339(raw):
+    if raw.endswith("Z"):
+        raw = raw[:-1] + "+00:00"
+    return datetime.datetime.fromisoformat(raw)
+
+
+def _from_timestamp(timestamp, tz):
+    return datetime.datetime.fromtimestamp(timestamp, tz or datetime.timezone.utc)
+
+
 def is_tz_aware(dt):
     return not (dt.tzinfo is None or dt.tzinfo.utcoffset(dt) is None)
@@ -0,0 +1,121 @@
+import json
+
+from .calendar import parse_event_date, parse_events
+from .sqlite_store import _SqliteStore
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    calendar_id TEXT,
+    id TEXT,
+    recurring_event_id TEXT,
+    start REAL,
+    end REAL,
+    data TEXT,
+    PRIMARY KEY (calendar_id, id)
+);
+CREATE INDEX IF NOT EXISTS events_recurring
+    ON events (calendar_id, recurring_event_id);
+CREATE INDEX IF NOT EXISTS events_start ON events (calendar_id, start);
+CREATE TABLE IF NOT EXISTS sync_tokens (
+    calendar_id TEXT PRIMARY KEY,
+    token TEXT
+);
+"""
+
+
+class CalendarStore(_SqliteStore):
+    """Events of any number of calendars in SQLite, keyed by calendar and
+    event id.  The recurringEventId index lets a recurring event's instances
+    be found, and dropped, together.  Every calendar moves on its own sync
+    token, hence a sync_tokens table rather than the shared state table."""
+
+    SCHEMA = SCHEMA
+    TABLE = "events"
+
+    def sync_token(self, calendar_id):
+        row = self._fetchone(
+            "SELECT token FROM sync_tokens WHERE calendar_id = ?", (calendar_id,)
+        )
+        return row[0] if row else None
+
+    def replace_calendar(self, calendar, events, sync_token):
+        """Drop what is stored for calendar in favour of events, a complete
+        events.list, and remember its sync_token."""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM events WHERE calendar_id = ?", (calendar.id,))
+            for event in events:
+                if event.get("status") != "cancelled":
+                    self._upsert(calendar, event)
+            self._set_sync_token(calendar.id, sync_token)
+
+    def apply_changes(self, calendar, events, sync_token=None):
+        """Apply a page of changed events; cancelled ones are removed.  The
+        sync token is only recorded with the last page.  Returns the number of
+        events applied."""
+        with self._transaction():
+            for event in events:
+                if event.get("status") == "cancelled":
+                    self._remove(calendar.id, event["id"])
+                else:
+                    self._upsert(calendar, event)
+            if sync_token is not None:
+                self._set_sync_token(calendar.id, sync_token)
+        return len(events)
+
+    def clear(self, calendar_id):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM events WHERE calendar_id = ?", (calendar_id,))
+            conn.execute(
+                "DELETE FROM sync_tokens WHERE calendar_id = ?", (calendar_id,)
+            )
+
+    def events(self, calendar, start=None, end=None, tz=None):
+        """The calendar's events overlapping start..end, as Events in start
+        order."""
+        clauses, params = ["calendar_id = ?"], [calendar.id]
+        if start is not None:
+            clauses.append("end > ?")
+            params.append(start.timestamp())
+        if end is not None:
+            clauses.append("start < ?")
+            params.append(end.timestamp())
+        rows = self._fetchall(
+            f"SELECT data FROM events WHERE {' AND '.join(clauses)} ORDER BY start",
+            params,
+        )
+        return parse_events([json.loads(row[0]) for row in rows], calendar, tz)
+
+    def instances(self, calendar, recurring_event_id, tz=None):
+        rows = self._fetchall(
+            "SELECT data FROM events WHERE calendar_id = ? "
+            "AND recurring_event_id = ? ORDER BY start",
+            (calendar.id, recurring_event_id),
+        )
+        return parse_events([json.loads(row[0]) for row in rows], calendar, tz)
+
+    def _upsert(self, calendar, event):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                calendar.id,
+                event["id"],
+                event.get("recurringEventId"),
+                parse_event_date(event["start"], calendar.time_zone).timestamp(),
+                parse_event_date(event["end"], calendar.time_zone).timestamp(),
+                json.dumps(event),
+            ),
+        )
+
+    def _remove(self, calendar_id, id):
+        # a cancelled recurring event takes its stored instances with it
+        self._conn.execute(
+            "DELETE FROM events WHERE calendar_id = ? "
+            "AND (id = ? OR recurring_event_id = ?)",
+            (calendar_id, id, id),
+        )
+
+    def _set_sync_token(self, calendar_id, sync_token):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO sync_tokens VALUES (?, ?)",
+            (calendar_id, sync_token),
+        )
@@ -0,0 +1,92 @@
+from array import array
+import math
+
+NUMERIC_TYPES = (int, float)
+
+
+class ColumnarValues:
+    """Sheet values stored column by column.  Columns holding only numbers
+    (and blanks, stored as NaN) are packed into array('d'); anything else is a
+    plain list.  Expects unformatted values, as fetched by
+    GoogleSpreadsheet.load_columns()."""
+
+    def __init__(self, names, columns, row_count, first_row=1):
+        self.names = names
+        self.columns = columns
+        self.row_count = row_count
+        # the (1-based) sheet row holding the first value of each column
+        self.first_row = first_row
+        self._positions = {name: idx for idx, name in enumerate(names)}
+
+    @classmethod
+    def from_columns(cls, raw_columns, header=True):
+        """raw_columns is a values response with majorDimension=COLUMNS."""
+        if header:
+            names = [str(column[0]) if column else "" for column in raw_columns]
+            raw_columns = [column[1:] for column in raw_columns]
+        else:
+            names = [f"{idx + 1}" for idx in range(len(raw_columns))]
+        row_count = max((len(column) for column in raw_columns), default=0)
+        columns = [pack_column(column, row_count) for column in raw_columns]
+        return cls(names, columns, row_count, first_row=2 if header else 1)
+
+    def __len__(self):
+        return self.row_count
+
+    def __getitem__(self, name):
+        return self.columns[self._positions[name]]
+
+    def set(self, row_idx, col_idx, value):
+        """Mirror an edit of the sheet cell at (row_idx, col_idx), returning
+        False when it can't be: a header cell or one outside the loaded grid.
+        A numeric column given a non-numeric value is unpacked to a list."""
+        row = row_idx - self.first_row
+        if not (0 <= row < self.row_count and 0 < col_idx <= len(self.columns)):
+            return False
+        column = self.columns[col_idx - 1]
+        if isinstance(column, array):
+            if value == "":
+                value = math.nan
+            elif not is_number(value):
+                column = ["" if math.isnan(packed) else packed for packed in column]
+                self.columns[col_idx - 1] = column
+        column[row] = value
+        return True
+
+    def is_numeric(self, name):
+        return isinstance(self[name], array)
+
+    def to_numpy(self, names=None):
+        """Dict of column name to numpy array; numeric columns are float64
+        views of the packed storage, without copying."""
+        try:
+            import numpy as np
+        except ImportError as err:
+            raise ImportError("to_numpy() requires numpy to be installed") from err
+        ret = {}
+        for name in names or self.names:
+            column = self[name]
+            if isinstance(column, array):
+                ret[name] = np.frombuffer(column, dtype=np.float64)
+            else:
+                ret[name] = np.array(column, dtype=object)
+        return ret
+
+    def to_records(self):
+        """List of dicts, one per row, keyed by column name."""
+        return [
+            {name: column[idx] for name, column in zip(self.names, self.columns)}
+            for idx in range(self.row_count)
+        ]
+
+
+def pack_column(values, row_count):
+    if all(value == "" or is_number(value) for value in values):
+        packed = array("d", (math.nan if value == "" else value for value in values))
+        packed.extend([math.nan] * (row_count - len(values)))
+        return packed
+    return list(values) + [""] * (row_count - len(values))
+
+
+def is_number(value):
+    return isinstance(value, NUMERIC_TYPES) and not isinstance(value, bool)
@@ -0,0 +1,86 @@
+import json
+
+from .sqlite_store import _SqliteStore
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS contacts (
+    resource_name TEXT PRIMARY KEY,
+    data TEXT
+);
+"""
+
+
+class ContactStore(_SqliteStore):
+    """The address book in SQLite: each person as the People api returned
+    them, keyed by resource name.  A sync token is only good for the
+    personFields it was issued with, so those are kept next to it."""
+
+    SCHEMA = SCHEMA
+    TABLE = "contacts"
+
+    @property
+    def sync_token(self):
+        return self._state("sync_token")
+
+    @property
+    def person_fields(self):
+        return self._state("person_fields")
+
+    def replace_all(self, pages, person_fields):
+        """Write a fresh listing over the old one.  pages yields (people,
+        sync_token) pairs and is consumed inside a single transaction, so
+        each page is stored as it arrives and an interrupted listing leaves
+        the previous contents in place.  Returns the number of people."""
+        count = 0
+        sync_token = None
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM contacts")
+            for people, page_token in pages:
+                for person in people:
+                    self._upsert(person)
+                count += len(people)
+                # only the last page carries one
+                sync_token = page_token or sync_token
+            self._set_state("sync_token", sync_token)
+            self._set_state("person_fields", person_fields)
+        return count
+
+    def apply_changes(self, people, sync_token=None):
+        """Apply a page of changed people; those whose metadata says deleted
+        are removed.  The sync token is only recorded with the last page.
+        Returns the number of people applied."""
+        with self._transaction() as conn:
+            for person in people:
+                if person.get("metadata", {}).get("deleted"):
+                    conn.execute(
+                        "DELETE FROM contacts WHERE resource_name = ?",
+                        (person["resourceName"],),
+                    )
+                else:
+                    self._upsert(person)
+            if sync_token is not None:
+                self._set_state("sync_token", sync_token)
+        return len(people)
+
+    def clear(self):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM contacts")
+            conn.execute("DELETE FROM state")
+
+    def get(self, resource_name):
+        row = self._fetchone(
+            "SELECT data FROM contacts WHERE resource_name = ?", (resource_name,)
+        )
+        if row:
+            return json.loads(row[0])
+
+    def list(self):
+        """All stored contacts, as the People api returned them."""
+        rows = self._fetchall("SELECT data FROM contacts ORDER BY resource_name")
+        return [json.loads(row[0]) for row in rows]
+
+    def _upsert(self, person):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO contacts VALUES (?, ?)",
+            (person["resourceName"], json.dumps(person)),
+        )
@@ -1,40 +1,26 @@
+import re
+
+_NON_DIGITS = re.compile(r"\D")
+
+
 def find_group_by_name(groups, name):
-    search_name = name.lower()
-    for group in groups:
-        if group["name"].lower() == search_name:
-            return group
+    return ContactDirectory(groups=groups).group(name)
 
 
 def filter_contacts_by_group(contacts, group):
-    ret = []
-    for contact in contacts:
-        memberships = contact.get("memberships", [])
-        for membership in memberships:
-            if (
-                membership.get("contactGroupMembership", {}).get(
-                    "contactGroupResourceName"
-                )
-                == group["resourceName"]
-            ):
-                ret.append(contact)
-                break
-    return ret
+    return ContactDirectory(contacts).members(group)
 
 
 def contacts_as_email_lookup(contacts):
-    ret = {}
-    for contact in contacts:
-        for email_address in contact.get("emailAddresses", []):
-            ret[email_address["value"].lower()] = contact
-    return ret
+    return ContactDirectory(contacts).email_lookup()
 
 
 def ensure_groups_exist(client, group_names):
-    groups = client.groups()
+    existing = {group["name"].lower() for group in client.groups()}
     for name in group_names:
-        group = find_group_by_name(groups, name)
-        if group is None:
+        if name.lower() not in existing:
             client.create_group(name)
+            existing.add(name.lower())
 
 
 def ensure_group_exists(client, group_name):
@@ -49,3 +35,167 @@ def create_contacts(client, objs):
     if batch_requests:
         payload = {"contacts": batch_requests, "read_mask": "names"}
         return client.batch_create_contacts(payload)
+
+
+class ContactDirectory:
+    """Contacts and groups with hash indexes by resource name, normalized
+    email, phone number, display name and group membership.  add() (which also
+    updates) and remove() keep the indexes current, so lookups stay O(1)
+    without rebuilding anything.  Build it from contacts listed with
+    memberships and phone numbers, e.g. with from_client()."""
+
+    def __init__(self, contacts=(), groups=()):
+        self._contacts = {}
+        self._groups = {}
+        self._groups_by_name = {}
+        # key -> {resource name: None}, dicts as insertion ordered sets
+        self._by_email = {}
+        self._by_phone = {}
+        self._by_name = {}
+        self._members = {}
+        for group in groups:
+            self.add_group(group)
+        for contact in contacts:
+            self.add(contact)
+
+    @classmethod
+    def from_client(cls, client):
+        return cls(
+            client.list(include_memberships=True, include_phone_numbers=True),
+            client.groups(),
+        )
+
+    def __len__(self):
+        return len(self._contacts)
+
+    def __contains__(self, resource_name):
+        return resource_name in self._contacts
+
+    def __iter__(self):
+        return iter(self._contacts.values())
+
+    def get(self, resource_name):
+        return self._contacts.get(resource_name)
+
+    def add(self, contact):
+        """Add a contact, or replace the one with the same resource name."""
+        resource_name = contact["resourceName"]
+        if resource_name in self._contacts:
+            self.remove(resource_name)
+        self._contacts[resource_name] = contact
+        for index, keys in self._index_keys(contact):
+            for key in keys:
+                index.setdefault(key, {})[resource_name] = None
+
+    update = add
+
+    def remove(self, contact):
+        """Remove a contact, given as a dict or a resource name."""
+        resource_name = contact if isinstance(contact, str) else contact["resourceName"]
+        contact = self._contacts.pop(resource_name, None)
+        if contact is None:
+            return
+        for index, keys in self._index_keys(contact):
+            for key in keys:
+                entries = index.get(key)
+                if entries is not None:
+                    entries.pop(resource_name, None)
+                    if not entries:
+                        del index[key]
+
+    def add_group(self, group):
+        self._groups[group["resourceName"]] = group
+        self._groups_by_name[group["name"].lower()] = group
+
+    def remove_group(self, group):
+        group = self._groups.pop(group["resourceName"], None)
+        if group is not None:
+            self._groups_by_name.pop(group["name"].lower(), None)
+
+    def group(self, name):
+        return self._groups_by_name.get(name.lower())
+
+    @property
+    def groups(self):
+        return list(self._groups.values())
+
+    def members(self, group):
+        """Contacts in a group, given as a group dict, resource name or name.
+        A resource name the directory has no group for, such as the system
+        group "contactGroups/myContacts", is matched against memberships
+        directly."""
+        if isinstance(group, str):
+            found = self._groups.get(group) or self.group(group)
+            if found is None:
+                return self._lookup(self._members, group)
+            group = found
+        return self._lookup(self._members, group["resourceName"])
+
+    def find_by_email(self, email):
+        found = self._lookup(self._by_email, normalize_email(email))
+        return found[0] if found else None
+
+    def find_by_phone(self, number):
+        return self._lookup(self._by_phone, normalize_phone({"value": number}))
+
+    def find_by_name(self, name):
+        return self._lookup(self._by_name, name.strip().lower())
+
+    def email_lookup(self):
+        """Normalized email -> contact, as contacts_as_email_lookup returns."""
+        return {
+            email: self._contacts[next(reversed(entries))]
+            for email, entries in self._by_email.items()
+        }
+
+    def _lookup(self, index, key):
+        return [self._contacts[name] for name in index.get(key, ())]
+
+    def _index_keys(self, contact):
+        return (
+            (
+                self._by_email,
+                {
+                    normalize_email(email["value"])
+                    for email in contact.get("emailAddresses", [])
+                },
+            ),
+            (
+                self._by_phone,
+                {normalize_phone(phone) for phone in contact.get("phoneNumbers", [])}
+                - {""},
+            ),
+            (
+                self._by_name,
+                {
+                    name["displayName"].strip().lower()
+                    for name in contact.get("names", [])
+                    if name.get("displayName")
+                },
+            ),
+            (self._members, set(contact_group_resource_names(contact))),
+        )
+
+
+def contact_group_resource_names(contact):
+    for membership in contact.get("memberships", []):
+        if name := membership.get("contactGroupMembership", {}).get(
+            "contactGroupResourceName"
+        ):
+            yield name
+
+
+def normalize_email(email):
+    return email.strip().lower()
+
+
+def normalize_phone(phone):
+    """The People api's E.164 canonicalForm when it has one; otherwise the
+    digits, keeping a leading + for numbers written in international form."""
+    if canonical := phone.get("canonicalForm"):
+        return canonical
+    value = phone.get("value", "").strip()
+    digits = _NON_DIGITS.sub("", value)
+    if digits and value.startswith("+"):
+        return "+" + digits
+    return digits
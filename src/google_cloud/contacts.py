@@ -1,12 +1,24 @@
 import json
+import os
+import tempfile
 
-from .service import ServiceFactory
+from googleapiclient.errors import HttpError
+
+from .ratelimit import TRANSPORT_ERRORS
+from .service import BatchResult, ServiceFactory
+
+# the most resource names one people.batchDeleteContacts accepts
+MAX_BATCH_DELETE = 500
+
+DEBUG_CONTACTS_PATH = os.path.join(tempfile.gettempdir(), "contacts.json")
+DEBUG_GROUPS_PATH = os.path.join(tempfile.gettempdir(), "groups.json")
 
 
 class ContactsClient:
-    def __init__(self, token_file, secrets_file, scopes=None):
+    def __init__(self, token_file, secrets_file, scopes=None, store=None):
         self.token_file = token_file
         self.secrets_file = secrets_file
+        self.store = store
         self.factory = ServiceFactory(self.token_file, self.secrets_file, scopes=scopes)
 
     def get_service(self, refresh=False):
@@ -18,17 +30,62 @@ class ContactsClient:
         include_memberships=False,
         include_phone_numbers=False,
         debug=False,
+        debug_path=DEBUG_CONTACTS_PATH,
     ):
-        service = self.get_service()
-        contacts = []
-        next_page_token = None
+        contacts = list(
+            self.iter_contacts(
+                page_size=page_size,
+                include_memberships=include_memberships,
+                include_phone_numbers=include_phone_numbers,
+            )
+        )
+        if debug:
+            with open(debug_path, "w") as f:
+                json.dump(contacts, f, indent=4)
+        return contacts
 
-        fields = "names,emailAddresses"
-        if include_memberships:
-            fields += ",memberships"
-        if include_phone_numbers:
-            fields += ",phoneNumbers"
+    def iter_contacts(
+        self, page_size=1000, include_memberships=False, include_phone_numbers=False
+    ):
+        """Yield connections page by page, without holding the whole address
+        book in memory."""
+        fields = person_fields(include_memberships, include_phone_numbers)
+        for page in self._iter_pages(page_size, fields):
+            yield from page.get("connections", [])
 
+    def sync(
+        self,
+        store=None,
+        page_size=1000,
+        include_memberships=False,
+        include_phone_numbers=False,
+    ):
+        """Pull the address book into a ContactStore.  A stored token for the
+        same fields means only changes and deletions are fetched; without one,
+        or once it has expired, everyone is listed again.  Returns the number
+        of people listed or changed."""
+        store = store or self.store
+        fields = person_fields(include_memberships, include_phone_numbers)
+        if store.sync_token is not None and store.person_fields == fields:
+            try:
+                count = 0
+                for page in self._iter_pages(page_size, fields, store.sync_token):
+                    count += store.apply_changes(
+                        page.get("connections", []), page.get("nextSyncToken")
+                    )
+                return count
+            except HttpError as err:
+                if not is_expired_sync_token(err):
+                    raise
+        pages = (
+            (page.get("connections", []), page.get("nextSyncToken"))
+            for page in self._iter_pages(page_size, fields, request_sync_token=True)
+        )
+        return store.replace_all(pages, fields)
+
+    def _iter_pages(self, page_size, fields, sync_token=None, request_sync_token=False):
+        service = self.get_service()
+        next_page_token = None
         while True:
             list_kwargs = dict(
                 resourceName="people/me",
@@ -37,23 +94,21 @@ class ContactsClient:
             )
             if next_page_token:
                 list_kwargs["pageToken"] = next_page_token
+            if sync_token:
+                list_kwargs["syncToken"] = sync_token
+            elif request_sync_token:
+                list_kwargs["requestSyncToken"] = True
 
             results = service.people().connections().list(**list_kwargs).execute()
-
-            contacts.extend(results.get("connections", []))
+            yield results
             if (next_page_token := results.get("nextPageToken")) is None:
                 break
 
-        if debug:
-            with open("/tmp/contacts.json", "w") as f:
-                json.dump(contacts, f, indent=4)
-        return contacts
-
-    def groups(self, debug=False):
+    def groups(self, debug=False, debug_path=DEBUG_GROUPS_PATH):
         service = self.get_service()
         groups = service.contactGroups().list().execute()["contactGroups"]
         if debug:
-            with open("/tmp/groups.json", "w") as f:
+            with open(debug_path, "w") as f:
                 json.dump(groups, f, indent=4)
         return groups
 
@@ -92,3 +147,39 @@ class ContactsClient:
             .deleteContact(resourceName=contact["resourceName"])
             .execute()
         )
+
+    def delete_contacts(self, contacts):
+        """Delete contacts with people.batchDeleteContacts, MAX_BATCH_DELETE
+        per call, returning a BatchResult per resource name.  A call succeeds
+        or fails as a whole, so a failure is recorded against every name in
+        it and the remaining calls still go ahead."""
+        service = self.get_service()
+        resource_names = [contact["resourceName"] for contact in contacts]
+        results = []
+        for offset in range(0, len(resource_names), MAX_BATCH_DELETE):
+            chunk = resource_names[offset : offset + MAX_BATCH_DELETE]
+            try:
+                service.people().batchDeleteContacts(
+                    body={"resourceNames": chunk}
+                ).execute()
+            except (HttpError, *TRANSPORT_ERRORS) as err:
+                results.extend(BatchResult(name, error=err) for name in chunk)
+            else:
+                results.extend(BatchResult(name) for name in chunk)
+        return results
+
+
+def person_fields(include_memberships=False, include_phone_numbers=False):
+    fields = "names,emailAddresses"
+    if include_memberships:
+        fields += ",memberships"
+    if include_phone_numbers:
+        fields += ",phoneNumbers"
+    return fields
+
+
+def is_expired_sync_token(err):
+    # the people api answers an expired token with 400 EXPIRED_SYNC_TOKEN
+    if err.resp.status == 410:
+        return True
+    return err.resp.status == 400 and b"EXPIRED_SYNC_TOKEN" in (err.content or b"")
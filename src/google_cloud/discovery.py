@@ -0,0 +1,152 @@
+import json
+import os
+from pathlib import Path
+import threading
+import time
+
+import httplib2
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build_from_document
+from googleapiclient.errors import UnknownApiNameOrVersion
+
+# the apis exposed by ServiceFactory
+SERVICE_APIS = (
+    ("docs", "v1"),
+    ("sheets", "v4"),
+    ("drive", "v3"),
+    ("tasks", "v1"),
+    ("calendar", "v3"),
+    ("books", "v1"),
+    ("people", "v1"),
+)
+
+DISCOVERY_URL = "https://www.googleapis.com/discovery/v1/apis/{name}/{version}/rest"
+
+# bump when the layout of the on-disk cache changes, old entries are then ignored
+CACHE_FORMAT_VERSION = 1
+
+DEFAULT_MAX_AGE = 24 * 60 * 60
+
+
+def default_cache_dir():
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return Path(base) / "google_cloud" / "discovery"
+
+
+class DiscoveryStore:
+    """Resolves discovery documents without a network round trip where possible.
+
+    Documents are looked up, in order, in memory, in the pinned snapshot
+    directory, in the on-disk cache, in the documents bundled with
+    google-api-python-client and finally fetched over the network (and then
+    written to the on-disk cache)."""
+
+    def __init__(
+        self,
+        cache_dir=None,
+        pinned_dir=None,
+        max_age=DEFAULT_MAX_AGE,
+        allow_network=True,
+    ):
+        self.cache_dir = Path(cache_dir) if cache_dir else default_cache_dir()
+        self.pinned_dir = Path(pinned_dir) if pinned_dir else None
+        self.max_age = max_age
+        self.allow_network = allow_network
+        self._documents = {}
+        self._lock = threading.Lock()
+
+    def build(self, name, version, credentials=None, **kwargs):
+        return build_from_document(
+            self.document(name, version), credentials=credentials, **kwargs
+        )
+
+    def document(self, name, version):
+        key = (name, version)
+        with self._lock:
+            if key in self._documents:
+                return self._documents[key]
+        # loaded without the lock, so a slow fetch doesn't hold up lookups of
+        # other apis; if two threads race, the first document stored wins
+        document = json.loads(self._load(name, version))
+        with self._lock:
+            return self._documents.setdefault(key, document)
+
+    def pin(self, apis=SERVICE_APIS):
+        """Write snapshots of the given apis to pinned_dir, so later startups
+        always build from exactly these documents."""
+        if self.pinned_dir is None:
+            raise ValueError("pin() requires a pinned_dir")
+        self.pinned_dir.mkdir(parents=True, exist_ok=True)
+        for name, version in apis:
+            _write_atomic(
+                self.pinned_dir / _doc_name(name, version),
+                json.dumps(self.document(name, version)),
+            )
+
+    def cache_path(self, name, version):
+        return self.cache_dir / f"v{CACHE_FORMAT_VERSION}" / _doc_name(name, version)
+
+    def _load(self, name, version):
+        if self.pinned_dir is not None:
+            pinned = self.pinned_dir / _doc_name(name, version)
+            if pinned.exists():
+                return pinned.read_text()
+
+        cached = self.cache_path(name, version)
+        if cached.exists() and time.time() - cached.stat().st_mtime < self.max_age:
+            return cached.read_text()
+
+        if content := discovery_cache.get_static_doc(name, version):
+            return content
+
+        if self.allow_network:
+            try:
+                content = _fetch(name, version)
+            except (httplib2.HttpLib2Error, OSError, UnknownApiNameOrVersion):
+                # UnknownApiNameOrVersion covers non-200 responses, e.g. a 5xx
+                if not cached.exists():
+                    raise
+            else:
+                cached.parent.mkdir(parents=True, exist_ok=True)
+                _write_atomic(cached, content)
+                return content
+
+        # a stale cached copy beats no document at all
+        if cached.exists():
+            return cached.read_text()
+        raise UnknownApiNameOrVersion(f"name: {name}  version: {version}")
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def default_store():
+    global _default_store
+    if _default_store is None:
+        with _default_store_lock:
+            if _default_store is None:
+                _default_store = DiscoveryStore()
+    return _default_store
+
+
+def _doc_name(name, version):
+    return f"{name}.{version}.json"
+
+
+def _fetch(name, version):
+    url = DISCOVERY_URL.format(name=name, version=version)
+    resp, content = httplib2.Http(timeout=30).request(url)
+    if resp.status != 200:
+        raise UnknownApiNameOrVersion(
+            f"name: {name}  version: {version} (HTTP {resp.status})"
+        )
+    return content.decode("utf-8")
+
+
+def _write_atomic(path, content):
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(content)
+    os.replace(tmp, path)
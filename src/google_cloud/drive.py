@@ -1,8 +1,59 @@
-from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+import mimetypes
+import mmap
+from pathlib import Path
 
-from googleapiclient.http import MediaFileUpload
+from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload
 
-from .service import ServiceFactory
+from .service import ServiceFactory, execute_batch
+
+FOLDER_MIMETYPE = "application/vnd.google-apps.folder"
+
+# the largest pageSize files.list accepts
+MAX_PAGE_SIZE = 1000
+
+# "'<id>' in parents" terms packed into a single files.list query when walking
+PARENTS_PER_QUERY = 50
+WALK_FIELDS = ("id", "name", "mimeType", "parents")
+PERMISSION_FIELDS = (
+    "id",
+    "type",
+    "role",
+    "emailAddress",
+    "domain",
+    "permissionDetails",
+)
+# the metadata held by a DriveMirror
+SYNC_FIELDS = (
+    "id",
+    "name",
+    "parents",
+    "mimeType",
+    "modifiedTime",
+    "createdTime",
+    "md5Checksum",
+    "trashed",
+)
+
+DOWNLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+# blobs larger than this are fetched as concurrent Range requests of this size
+DOWNLOAD_PART_SIZE = 32 * 1024 * 1024
+
+# google-native files have no binary content, they are exported to these
+EXPORT_MIMETYPES = {
+    "application/vnd.google-apps.document": (
+        "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+    ),
+    "application/vnd.google-apps.spreadsheet": (
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    ),
+    "application/vnd.google-apps.presentation": (
+        "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+    ),
+    "application/vnd.google-apps.drawing": "image/png",
+    "application/vnd.google-apps.script": "application/vnd.google-apps.script+json",
+}
 
 VALID_PERMISSION_TYPES = ("user", "group", "domain", "anyone")
 VALID_PERMISSION_ROLES = (
@@ -16,13 +67,10 @@ VALID_PERMISSION_ROLES = (
 
 
 def mimetype_for_path(path):
-    ext = path.suffix.replace(".", "").lower()
-    if ext in ("jpg", "jpeg"):
-        return "image/jpeg"
-    elif ext == "png":
-        return "image/png"
-    else:
+    mimetype, _ = mimetypes.guess_type(Path(path).name)
+    if mimetype is None:
         raise ValueError(f"No mimetype known for {path}")
+    return mimetype
 
 
 @dataclass
@@ -31,11 +79,111 @@ class FileWithId:
     id: str
 
 
+@dataclass
+class FilePage:
+    files: list
+    next_page_token: str = None
+
+
+@dataclass
+class DriveNode:
+    name: str
+    id: str
+    mimetype: str
+    parent: str
+    path: str
+
+    @property
+    def is_folder(self):
+        return self.mimetype == FOLDER_MIMETYPE
+
+    def as_file(self):
+        return FileWithId(self.name, self.id)
+
+
+@dataclass
+class DriveTree:
+    """Index of everything under a root folder, by id, by slash separated
+    path relative to the root and by parent.  Where siblings share a name the
+    first one added owns the path.  A file with several parents under the root
+    appears once per parent in children() and parents(); nodes holds the first
+    one added."""
+
+    root_id: str
+    nodes: dict = field(default_factory=dict)
+    paths: dict = field(default_factory=dict)
+    _children: dict = field(default_factory=dict, repr=False)
+    _parent_ids: dict = field(default_factory=dict, repr=False)
+
+    def add(self, node):
+        self.nodes.setdefault(node.id, node)
+        self.paths.setdefault(node.path, FileWithId(node.name, node.id))
+        parent_ids = self._parent_ids.setdefault(node.id, [])
+        if node.parent not in parent_ids:
+            parent_ids.append(node.parent)
+            self._children.setdefault(node.parent, []).append(node)
+
+    def lookup(self, path):
+        return self.paths.get(path.strip("/"))
+
+    def parent(self, id):
+        node = self.nodes.get(id)
+        if node is not None:
+            return self.nodes.get(node.parent)
+
+    def parents(self, id):
+        return [
+            self.nodes[parent_id]
+            for parent_id in self._parent_ids.get(id, ())
+            if parent_id in self.nodes
+        ]
+
+    def children(self, id):
+        return list(self._children.get(id, ()))
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __iter__(self):
+        return iter(self.nodes.values())
+
+
+@dataclass(frozen=True)
+class Grant:
+    type: str
+    role: str
+    email_address: str = None
+    domain: str = None
+
+    def __post_init__(self):
+        validate_permission_type(self.type)
+        validate_permission_role(self.role)
+
+    @property
+    def key(self):
+        return permission_key(self.type, self.email_address, self.domain)
+
+
+@dataclass
+class PermissionReport:
+    file_id: str
+    to_create: list = field(default_factory=list)
+    to_update: list = field(default_factory=list)
+    to_delete: list = field(default_factory=list)
+    errors: list = field(default_factory=list)
+
+    @property
+    def changed(self):
+        return bool(self.to_create or self.to_update or self.to_delete)
+
+
 class DriveClient:
-    def __init__(self, token_file, secrets_file, scopes=None):
+    def __init__(self, token_file, secrets_file, scopes=None, mirror=None):
         self.token_file = token_file
         self.secrets_file = secrets_file
         self.factory = ServiceFactory(self.token_file, self.secrets_file, scopes=scopes)
+        # a DriveMirror kept current with sync(), used to answer list_* queries
+        self.mirror = mirror
 
     def get_service(self, refresh=False):
         return self.factory.drive_api_service(refresh=refresh)
@@ -46,25 +194,185 @@ class DriveClient:
         return FileWithId(file.get("name"), file.get("id"))
 
     def list_folders(
-        self, parent=None, fields=None, modified_after=None, created_after=None
+        self,
+        parent=None,
+        fields=None,
+        modified_after=None,
+        created_after=None,
+        page_size=MAX_PAGE_SIZE,
     ):
-        return self._list_files(
-            parent=parent,
-            mimetype="application/vnd.google-apps.folder",
-            fields=fields,
-            modified_after=modified_after,
-            created_after=created_after,
+        if self._use_mirror(fields):
+            return self.mirror.list_folders(
+                parent=parent,
+                fields=fields,
+                modified_after=modified_after,
+                created_after=created_after,
+            )
+        return list(
+            self.iter_folders(
+                parent=parent,
+                fields=fields,
+                modified_after=modified_after,
+                created_after=created_after,
+                page_size=page_size,
+            )
         )
 
     def list_files(
-        self, parent=None, fields=None, modified_after=None, created_after=None
+        self,
+        parent=None,
+        fields=None,
+        modified_after=None,
+        created_after=None,
+        page_size=MAX_PAGE_SIZE,
+    ):
+        if self._use_mirror(fields):
+            return self.mirror.list_files(
+                parent=parent,
+                fields=fields,
+                modified_after=modified_after,
+                created_after=created_after,
+            )
+        return list(
+            self.iter_files(
+                parent=parent,
+                fields=fields,
+                modified_after=modified_after,
+                created_after=created_after,
+                page_size=page_size,
+            )
+        )
+
+    def iter_folders(self, parent=None, **kwargs):
+        return self.iter_files(parent=parent, mimetype=FOLDER_MIMETYPE, **kwargs)
+
+    def iter_files(self, parent=None, mimetype=None, fields=None, **kwargs):
+        """Yield files as each page arrives, see iter_file_pages for arguments."""
+        for page in self.iter_file_pages(
+            parent=parent, mimetype=mimetype, fields=fields, **kwargs
+        ):
+            yield from page.files
+
+    def iter_file_pages(
+        self,
+        parent=None,
+        mimetype=None,
+        fields=None,
+        modified_after=None,
+        created_after=None,
+        page_size=MAX_PAGE_SIZE,
+        order_by=None,
+        page_token=None,
     ):
-        return self._list_files(
+        """Yield a FilePage per api response.  Save a page's next_page_token and
+        pass it back as page_token to resume the listing after that page."""
+        q = files_query(
             parent=parent,
-            fields=fields,
+            mimetype=mimetype,
             modified_after=modified_after,
             created_after=created_after,
         )
+        return self._iter_file_pages(
+            q, fields, page_size=page_size, order_by=order_by, page_token=page_token
+        )
+
+    def sync(self, mirror=None):
+        """Fill the mirror from a full listing the first time, then from
+        changes.list starting at its stored page token.  Returns the number
+        of files listed or changed."""
+        mirror = mirror or self.mirror
+        service = self.get_service()
+        if mirror.page_token is None:
+            # take the token before listing, so nothing changed during the
+            # listing is missed
+            start = service.changes().getStartPageToken().execute()
+            # the parents of top level files are the real root id, not "root"
+            root = service.files().get(fileId="root", fields="id").execute()
+            files = list(self.iter_files(fields=SYNC_FIELDS))
+            mirror.replace_all(files, start["startPageToken"], root_id=root["id"])
+            return len(files)
+
+        fields_str = ", ".join(SYNC_FIELDS)
+        page_token = mirror.page_token
+        count = 0
+        while True:
+            response = (
+                service.changes()
+                .list(
+                    pageToken=page_token,
+                    pageSize=MAX_PAGE_SIZE,
+                    spaces="drive",
+                    includeRemoved=True,
+                    fields=(
+                        "nextPageToken, newStartPageToken, "
+                        f"changes(changeType, removed, fileId, file({fields_str}))"
+                    ),
+                )
+                .execute()
+            )
+            page_token = response.get("nextPageToken")
+            count += mirror.apply_changes(
+                response.get("changes", []),
+                page_token or response["newStartPageToken"],
+            )
+            if page_token is None:
+                return count
+
+    def tree(self, root_id, max_workers=8):
+        tree = DriveTree(root_id)
+        for node in self.walk(root_id, max_workers=max_workers):
+            tree.add(node)
+        return tree
+
+    def walk(self, root_id, max_workers=8):
+        """Yield a DriveNode for everything under root_id, breadth first, and
+        once per parent for files with several parents.
+
+        Each level's folders are packed PARENTS_PER_QUERY at a time into
+        "'a' in parents or 'b' in parents ..." queries, which are run
+        concurrently.  Each level is yielded sorted by path and id, so the
+        order (and which sibling owns a shared path in a DriveTree) doesn't
+        depend on which query finishes first."""
+        folder_paths = {root_id: ""}
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            while folder_paths:
+                parent_ids = list(folder_paths)
+                results = pool.map(
+                    self._list_children,
+                    [
+                        parent_ids[i : i + PARENTS_PER_QUERY]
+                        for i in range(0, len(parent_ids), PARENTS_PER_QUERY)
+                    ],
+                )
+                level = [
+                    DriveNode(
+                        name=file["name"],
+                        id=file["id"],
+                        mimetype=file["mimeType"],
+                        parent=parent,
+                        path=_join_path(folder_paths[parent], file["name"]),
+                    )
+                    for files in results
+                    for file in files
+                    for parent in file.get("parents", [])
+                    if parent in folder_paths
+                ]
+                level.sort(key=lambda node: (node.path, node.id, node.parent))
+                next_paths = {}
+                for node in level:
+                    if node.is_folder:
+                        next_paths.setdefault(node.id, node.path)
+                    yield node
+                folder_paths = next_paths
+
+    def _list_children(self, parent_ids):
+        parents = " or ".join(f"'{parent_id}' in parents" for parent_id in parent_ids)
+        q = f"{files_query()} and ({parents})"
+        return [
+            file
+            for page in self._iter_file_pages(q, fields=WALK_FIELDS)
+            for file in page.files
+        ]
 
     def upload_file(self, path, name=None, mimetype=None, parent=None):
         name = name or path.name
@@ -86,10 +394,82 @@ class DriveClient:
         )
         return FileWithId(name, file.get("id"))
 
+    def download(self, file_id, fileobj, chunk_size=DOWNLOAD_CHUNK_SIZE):
+        """Stream a file's content into fileobj, chunk_size bytes at a time."""
+        request = self.get_service().files().get_media(fileId=file_id)
+        _stream_download(request, fileobj, chunk_size)
+
+    def export(self, file_id, mimetype, fileobj, chunk_size=DOWNLOAD_CHUNK_SIZE):
+        """Stream a google-native file (doc, sheet, ...) exported as mimetype."""
+        request = (
+            self.get_service().files().export_media(fileId=file_id, mimeType=mimetype)
+        )
+        _stream_download(request, fileobj, chunk_size)
+
+    def download_to_path(
+        self,
+        file_id,
+        path,
+        export_mimetype=None,
+        max_workers=4,
+        part_size=DOWNLOAD_PART_SIZE,
+    ):
+        """Download a file to path.  Google-native files are exported (see
+        EXPORT_MIMETYPES), large blobs are fetched as concurrent Range requests
+        written straight into a pre-sized memory-mapped file, anything else is
+        streamed.  Memory use is bounded by max_workers * part_size."""
+        meta = (
+            self.get_service()
+            .files()
+            .get(fileId=file_id, fields="mimeType, size")
+            .execute()
+        )
+        mimetype = meta["mimeType"]
+        if mimetype.startswith("application/vnd.google-apps."):
+            export_mimetype = export_mimetype or EXPORT_MIMETYPES.get(mimetype)
+            if export_mimetype is None:
+                raise ValueError(f"No export format known for {mimetype}")
+            with open(path, "wb") as f:
+                self.export(file_id, export_mimetype, f)
+            return
+        size = int(meta.get("size", 0))
+        if size <= part_size or max_workers < 2:
+            with open(path, "wb") as f:
+                self.download(file_id, f)
+            return
+        self._download_ranges(file_id, path, size, max_workers, part_size)
+
+    def _download_ranges(self, file_id, path, size, max_workers, part_size):
+        with open(path, "wb+") as f:
+            f.truncate(size)
+            with mmap.mmap(f.fileno(), size) as buffer, ThreadPoolExecutor(
+                max_workers=max_workers
+            ) as pool:
+                parts = [
+                    (start, min(start + part_size, size) - 1)
+                    for start in range(0, size, part_size)
+                ]
+                list(
+                    pool.map(
+                        lambda part: self._download_range(file_id, buffer, *part),
+                        parts,
+                    )
+                )
+
+    def _download_range(self, file_id, buffer, start, end):
+        request = self.get_service().files().get_media(fileId=file_id)
+        request.headers["range"] = f"bytes={start}-{end}"
+        content = request.execute()
+        if len(content) != end - start + 1:
+            raise IOError(
+                f"Expected {end - start + 1} bytes at offset {start}, got {len(content)}"
+            )
+        buffer[start : end + 1] = content
+
     def create_folder(self, name, parent=None):
         file_metadata = {
             "name": name,
-            "mimeType": "application/vnd.google-apps.folder",
+            "mimeType": FOLDER_MIMETYPE,
         }
         if parent:
             file_metadata["parents"] = [parent]
@@ -99,7 +479,7 @@ class DriveClient:
         )
         return FileWithId(name, file.get("id"))
 
-    def list_permissions(self, file_id):
+    def list_permissions(self, file_id, fields=("id", "role", "emailAddress")):
         perms = []
         page_token = None
         service = self.get_service()
@@ -108,7 +488,7 @@ class DriveClient:
                 service.permissions()
                 .list(
                     fileId=file_id,
-                    fields="nextPageToken,permissions(id, role, emailAddress)",
+                    fields=f"nextPageToken,permissions({', '.join(fields)})",
                     pageToken=page_token,
                 )
                 .execute()
@@ -122,93 +502,296 @@ class DriveClient:
 
     def create_permission(
         self, file_id, role, type, email_address, send_notification=False
+    ):
+        response = self._create_permission_request(
+            self.get_service(), file_id, role, type, email_address, send_notification
+        ).execute()
+        return response["id"]
+
+    def update_permission(self, file_id, permission_id, role):
+        response = self._update_permission_request(
+            self.get_service(), file_id, permission_id, role
+        ).execute()
+        return response["id"]
+
+    def delete_permission(self, file_id, permission_id):
+        return self._delete_permission_request(
+            self.get_service(), file_id, permission_id
+        ).execute()
+
+    def create_permissions(self, permissions, send_notification=False):
+        """Batched create_permission, permissions being an iterable of
+        (file_id, role, type, email_address) tuples.  Returns a BatchResult per
+        tuple, with the created permission in its response."""
+        permissions = list(permissions)
+        service = self.get_service()
+        requests = [
+            self._create_permission_request(service, *perm, send_notification)
+            for perm in permissions
+        ]
+        return execute_batch(service, requests, keys=permissions)
+
+    def update_permissions(self, permissions):
+        """Batched update_permission, permissions being an iterable of
+        (file_id, permission_id, role) tuples."""
+        permissions = list(permissions)
+        service = self.get_service()
+        requests = [
+            self._update_permission_request(service, *perm) for perm in permissions
+        ]
+        return execute_batch(service, requests, keys=permissions)
+
+    def delete_permissions(self, permissions):
+        """Batched delete_permission, permissions being an iterable of
+        (file_id, permission_id) tuples."""
+        permissions = list(permissions)
+        service = self.get_service()
+        requests = [
+            self._delete_permission_request(service, *perm) for perm in permissions
+        ]
+        return execute_batch(service, requests, keys=permissions)
+
+    def reconcile_permissions(
+        self,
+        desired,
+        subtree=False,
+        remove_unlisted=True,
+        dry_run=False,
+        max_workers=8,
+    ):
+        """Make the permissions of many files match a desired ACL.
+
+        desired maps file ids to lists of Grants.  With subtree=True a folder's
+        ACL also applies to everything under it (unless listed itself).  Current
+        permissions are fetched concurrently, the minimal diff computed and
+        applied in batches; owners are never changed.  Returns a
+        PermissionReport per file, with dry_run only computing the diffs."""
+        desired = dict(desired)
+        # descendant id -> the listed folder it takes its ACL from
+        inherits_from = {}
+        if subtree:
+            for root_id in list(desired):
+                for node in self.walk(root_id, max_workers=max_workers):
+                    if node.id not in desired:
+                        inherits_from.setdefault(node.id, root_id)
+
+        # listed files first, so descendants are diffed against the
+        # permissions they inherit once their folder is up to date
+        reports = self._reconcile(
+            {file_id: (grants, ()) for file_id, grants in desired.items()},
+            remove_unlisted,
+            dry_run,
+            max_workers,
+        )
+        if inherits_from:
+            created = {
+                report.file_id: {grant.key for grant in report.to_create}
+                for report in reports
+            }
+            reports += self._reconcile(
+                {
+                    file_id: (
+                        desired[root_id],
+                        # not applied on a dry run, but will be inherited
+                        created[root_id] if dry_run else (),
+                    )
+                    for file_id, root_id in inherits_from.items()
+                },
+                remove_unlisted,
+                dry_run,
+                max_workers,
+            )
+        return reports
+
+    def _reconcile(self, desired, remove_unlisted, dry_run, max_workers):
+        # desired maps file ids to (grants, keys of grants inherited instead)
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            current = pool.map(
+                lambda file_id: self.list_permissions(file_id, PERMISSION_FIELDS),
+                desired,
+            )
+            reports = [
+                diff_permissions(file_id, perms, grants, remove_unlisted, inherited)
+                for (file_id, (grants, inherited)), perms in zip(
+                    desired.items(), current
+                )
+            ]
+        if not dry_run:
+            self._apply_permission_diffs(reports)
+        return reports
+
+    def _apply_permission_diffs(self, reports):
+        service = self.get_service()
+        requests, keys = [], []
+        for report in reports:
+            for grant in report.to_create:
+                requests.append(
+                    self._create_permission_request(
+                        service,
+                        report.file_id,
+                        grant.role,
+                        grant.type,
+                        grant.email_address,
+                        domain=grant.domain,
+                    )
+                )
+                keys.append((report, grant))
+            for permission_id, role in report.to_update:
+                requests.append(
+                    self._update_permission_request(
+                        service, report.file_id, permission_id, role
+                    )
+                )
+                keys.append((report, permission_id))
+            for permission_id in report.to_delete:
+                requests.append(
+                    self._delete_permission_request(
+                        service, report.file_id, permission_id
+                    )
+                )
+                keys.append((report, permission_id))
+        for result in execute_batch(service, requests, keys=keys):
+            if not result.ok:
+                report, change = result.key
+                report.errors.append((change, result.error))
+
+    def _create_permission_request(
+        self,
+        service,
+        file_id,
+        role,
+        type,
+        email_address,
+        send_notification=False,
+        domain=None,
     ):
         validate_permission_role(role)
         validate_permission_type(type)
         meta_data = {
             "role": role,
             "type": type,
-            "emailAddress": email_address,
         }
-        response = (
-            self.get_service()
-            .permissions()
-            .create(
-                fileId=file_id, sendNotificationEmail=send_notification, body=meta_data
-            )
-            .execute()
+        if email_address:
+            meta_data["emailAddress"] = email_address
+        if domain:
+            meta_data["domain"] = domain
+        return service.permissions().create(
+            fileId=file_id, sendNotificationEmail=send_notification, body=meta_data
         )
-        return response["id"]
 
-    def update_permission(self, file_id, permission_id, role):
+    def _update_permission_request(self, service, file_id, permission_id, role):
         validate_permission_role(role)
         body = {"role": role}
-        response = (
-            self.get_service()
-            .permissions()
-            .update(fileId=file_id, permissionId=permission_id, body=body)
-            .execute()
+        return service.permissions().update(
+            fileId=file_id, permissionId=permission_id, body=body
         )
-        return response["id"]
 
-    def delete_permission(self, file_id, permission_id):
+    def _delete_permission_request(self, service, file_id, permission_id):
+        return service.permissions().delete(fileId=file_id, permissionId=permission_id)
+
+    def _use_mirror(self, fields):
+        # an unsynced mirror is empty, so the api answers until sync() has run
         return (
-            self.get_service()
-            .permissions()
-            .delete(fileId=file_id, permissionId=permission_id)
-            .execute()
+            self.mirror is not None
+            and self.mirror.page_token is not None
+            and (fields is None or all(name in SYNC_FIELDS for name in fields))
         )
 
-    def _list_files(
-        self,
-        parent=None,
-        mimetype=None,
-        fields=None,
-        modified_after=None,
-        created_after=None,
+    def _iter_file_pages(
+        self, q, fields=None, page_size=MAX_PAGE_SIZE, order_by=None, page_token=None
     ):
-        if fields is None:
-            custom_fields = False
-            fields = ("id", "name")
-        else:
-            custom_fields = True
-        fields_str = ", ".join(fields)
-        files = []
-        page_token = None
-        q_terms = ["trashed=false"]
-        if mimetype:
-            q_terms.append(f"mimeType='{mimetype}'")
-        if parent:
-            q_terms.append(f"'{parent}' in parents")
-        if modified_after:
-            modified_after_str = modified_after.strftime("%Y-%m-%dT%H:%M:%S")
-            q_terms.append(f"modifiedTime > '{modified_after_str}'")
-        if created_after:
-            created_after_str = created_after.strftime("%Y-%m-%dT%H:%M:%S")
-            q_terms.append(f"createdTime > '{created_after_str}'")
+        if not 1 <= page_size <= MAX_PAGE_SIZE:
+            raise ValueError(f"page_size must be between 1 and {MAX_PAGE_SIZE}")
+        custom_fields = fields is not None
+        fields_str = ", ".join(fields or ("id", "name"))
+        list_kwargs = dict(
+            q=q,
+            spaces="drive",
+            fields=f"nextPageToken, files({fields_str})",
+            pageSize=page_size,
+        )
+        if order_by:
+            list_kwargs["orderBy"] = order_by
         service = self.get_service()
         while True:
             response = (
-                service.files()
-                .list(
-                    q=" and ".join(q_terms),
-                    spaces="drive",
-                    fields=f"nextPageToken, files({fields_str})",
-                    pageToken=page_token,
-                )
-                .execute()
+                service.files().list(pageToken=page_token, **list_kwargs).execute()
             )
-            for file in response.get("files", []):
-                # if the caller does not specify fields, return FileWithId objects, otherwise just the native obj
-                if custom_fields:
-                    obj = file
-                else:
-                    obj = FileWithId(file.get("name"), file.get("id"))
-                files.append(obj)
             page_token = response.get("nextPageToken", None)
+            yield FilePage(
+                [wrap_file(file, custom_fields) for file in response.get("files", [])],
+                page_token,
+            )
             if page_token is None:
                 break
-        return files
+
+
+def files_query(parent=None, mimetype=None, modified_after=None, created_after=None):
+    q_terms = ["trashed=false"]
+    if mimetype:
+        q_terms.append(f"mimeType='{mimetype}'")
+    if parent:
+        q_terms.append(f"'{parent}' in parents")
+    if modified_after:
+        modified_after_str = modified_after.strftime("%Y-%m-%dT%H:%M:%S")
+        q_terms.append(f"modifiedTime > '{modified_after_str}'")
+    if created_after:
+        created_after_str = created_after.strftime("%Y-%m-%dT%H:%M:%S")
+        q_terms.append(f"createdTime > '{created_after_str}'")
+    return " and ".join(q_terms)
+
+
+def _stream_download(request, fileobj, chunk_size):
+    downloader = MediaIoBaseDownload(fileobj, request, chunksize=chunk_size)
+    done = False
+    while not done:
+        _, done = downloader.next_chunk()
+
+
+def _join_path(parent_path, name):
+    return f"{parent_path}/{name}" if parent_path else name
+
+
+def wrap_file(file, custom_fields):
+    # if the caller does not specify fields, return FileWithId objects, otherwise just the native obj
+    if custom_fields:
+        return file
+    return FileWithId(file.get("name"), file.get("id"))
+
+
+def diff_permissions(file_id, current, grants, remove_unlisted=True, inherited=()):
+    """The minimal changes turning current (permissions.list items) into
+    grants.  Owner permissions, and those inherited from a parent folder,
+    can't be changed here and are left alone; grants whose keys are in
+    inherited are expected to arrive from a parent and aren't created."""
+    report = PermissionReport(file_id)
+    wanted = {grant.key: grant for grant in grants}
+    for perm in current:
+        key = permission_key(
+            perm.get("type"), perm.get("emailAddress"), perm.get("domain")
+        )
+        grant = wanted.pop(key, None)
+        if perm.get("role") == "owner" or is_inherited(perm):
+            continue
+        if grant is None:
+            if remove_unlisted:
+                report.to_delete.append(perm["id"])
+        elif grant.role != perm.get("role"):
+            report.to_update.append((perm["id"], grant.role))
+    report.to_create.extend(
+        grant for key, grant in wanted.items() if key not in inherited
+    )
+    return report
+
+
+def is_inherited(perm):
+    """Whether a permission only applies through a parent folder."""
+    details = perm.get("permissionDetails")
+    return bool(details) and all(detail.get("inherited") for detail in details)
+
+
+def permission_key(type, email_address=None, domain=None):
+    return (type, (email_address or domain or "").lower())
 
 
 def validate_permission_role(role):
@@ -0,0 +1,159 @@
+from .drive import FOLDER_MIMETYPE, SYNC_FIELDS, FileWithId
+from .sqlite_store import _SqliteStore
+
+# drive api field name -> mirror column
+MIRROR_COLUMNS = {
+    "id": "id",
+    "name": "name",
+    "mimeType": "mime_type",
+    "modifiedTime": "modified_time",
+    "createdTime": "created_time",
+    "md5Checksum": "md5",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    mime_type TEXT,
+    modified_time TEXT,
+    created_time TEXT,
+    md5 TEXT
+);
+CREATE TABLE IF NOT EXISTS parents (
+    file_id TEXT,
+    parent_id TEXT,
+    PRIMARY KEY (file_id, parent_id)
+);
+CREATE INDEX IF NOT EXISTS parents_parent_id ON parents (parent_id);
+"""
+
+
+class DriveMirror(_SqliteStore):
+    """Drive file metadata in SQLite, so DriveClient.list_files can answer
+    without the api once sync() has filled it.  Files are rows of the
+    MIRROR_COLUMNS; parents get a table of their own so a folder listing is
+    an indexed lookup."""
+
+    SCHEMA = SCHEMA
+    TABLE = "files"
+
+    @property
+    def page_token(self):
+        return self._state("page_token")
+
+    @property
+    def root_id(self):
+        """The real id behind drive's "root" alias, recorded by sync()."""
+        return self._state("root_id")
+
+    def replace_all(self, files, page_token, root_id=None):
+        """Swap everything mirrored for files, recording page_token (and the
+        id "root" stands for) alongside."""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM files")
+            conn.execute("DELETE FROM parents")
+            for file in files:
+                self._upsert(file)
+            self._set_state("page_token", page_token)
+            if root_id is not None:
+                self._set_state("root_id", root_id)
+
+    def apply_changes(self, changes, page_token):
+        """Apply a page of changes.list results, then record page_token so a
+        crash mid-sync resumes from the next page.  Returns the number of
+        file changes applied."""
+        count = 0
+        with self._transaction():
+            for change in changes:
+                if change.get("changeType", "file") != "file":
+                    continue
+                file = change.get("file")
+                if change.get("removed") or file is None or file.get("trashed"):
+                    self._remove(change["fileId"])
+                else:
+                    self._upsert(file)
+                count += 1
+            self._set_state("page_token", page_token)
+        return count
+
+    def get(self, id):
+        row = self._fetchone("SELECT name, id FROM files WHERE id = ?", (id,))
+        if row:
+            return FileWithId(*row)
+
+    def list_folders(
+        self, parent=None, fields=None, modified_after=None, created_after=None
+    ):
+        return self.list_files(
+            parent=parent,
+            mimetype=FOLDER_MIMETYPE,
+            fields=fields,
+            modified_after=modified_after,
+            created_after=created_after,
+        )
+
+    def list_files(
+        self,
+        parent=None,
+        mimetype=None,
+        fields=None,
+        modified_after=None,
+        created_after=None,
+    ):
+        """Same queries and return values as DriveClient.list_files, for the
+        fields the mirror holds."""
+        if fields is not None and not can_answer(fields):
+            raise ValueError(f"the mirror only holds the fields {SYNC_FIELDS}")
+        clauses, params = [], []
+        if parent == "root":
+            parent = self.root_id or parent
+        if parent:
+            clauses.append("id IN (SELECT file_id FROM parents WHERE parent_id = ?)")
+            params.append(parent)
+        if mimetype:
+            clauses.append("mime_type = ?")
+            params.append(mimetype)
+        if modified_after:
+            clauses.append("modified_time > ?")
+            params.append(modified_after.strftime("%Y-%m-%dT%H:%M:%S"))
+        if created_after:
+            clauses.append("created_time > ?")
+            params.append(created_after.strftime("%Y-%m-%dT%H:%M:%S"))
+        sql = f"SELECT {', '.join(MIRROR_COLUMNS.values())} FROM files"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY name", params).fetchall()
+            if fields is None:
+                return [FileWithId(row[1], row[0]) for row in rows]
+            files = [dict(zip(MIRROR_COLUMNS, row), trashed=False) for row in rows]
+            if "parents" in fields:
+                for file in files:
+                    file["parents"] = self._parents(file["id"])
+        return [{name: file[name] for name in fields if name in file} for file in files]
+
+    def _parents(self, id):
+        rows = self._conn.execute(
+            "SELECT parent_id FROM parents WHERE file_id = ?", (id,)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def _upsert(self, file):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)",
+            tuple(file.get(name) for name in MIRROR_COLUMNS),
+        )
+        self._conn.execute("DELETE FROM parents WHERE file_id = ?", (file["id"],))
+        self._conn.executemany(
+            "INSERT INTO parents VALUES (?, ?)",
+            [(file["id"], parent) for parent in file.get("parents", [])],
+        )
+
+    def _remove(self, id):
+        self._conn.execute("DELETE FROM files WHERE id = ?", (id,))
+        self._conn.execute("DELETE FROM parents WHERE file_id = ?", (id,))
+
+
+def can_answer(fields):
+    return all(name in SYNC_FIELDS for name in fields)
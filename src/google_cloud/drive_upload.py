@@ -0,0 +1,226 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import hashlib
+import json
+import os
+from pathlib import Path
+import threading
+
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaFileUpload
+
+from .drive import FileWithId, mimetype_for_path
+from .ratelimit import TRANSPORT_ERRORS, api_executor
+
+# resumable upload chunks must be a multiple of 256 KiB
+CHUNK_ALIGNMENT = 256 * 1024
+DEFAULT_CHUNK_SIZE = 32 * CHUNK_ALIGNMENT
+
+
+@dataclass
+class UploadResult:
+    path: Path
+    file: FileWithId = None
+    skipped: bool = False
+    error: Exception = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class UploadSessions:
+    """Resumable session URIs persisted to a JSON file, so a crashed process
+    can pick an upload back up mid-file."""
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else None
+        self._lock = threading.Lock()
+        self._sessions = {}
+        if self.path and self.path.exists():
+            self._sessions = json.loads(self.path.read_text())
+
+    def get(self, key):
+        with self._lock:
+            return self._sessions.get(key)
+
+    def save(self, key, uri, md5):
+        with self._lock:
+            self._sessions[key] = {"uri": uri, "md5": md5}
+            self._write()
+
+    def remove(self, key):
+        with self._lock:
+            if self._sessions.pop(key, None) is not None:
+                self._write()
+
+    def _write(self):
+        if self.path is None:
+            return
+        tmp = self.path.with_name(f".{self.path.name}.tmp")
+        tmp.write_text(json.dumps(self._sessions))
+        os.replace(tmp, self.path)
+
+
+class UploadManager:
+    """Uploads many files to a drive folder concurrently.
+
+    Files whose name and md5 already match a file in the target folder are
+    skipped, and with a state_file an interrupted upload resumes from the
+    last chunk the server acknowledged.  Session requests and chunks go
+    through the drive ApiExecutor, so they are rate limited and retried."""
+
+    def __init__(
+        self,
+        client,
+        state_file=None,
+        max_workers=4,
+        chunk_size=DEFAULT_CHUNK_SIZE,
+        skip_unchanged=True,
+        executor=None,
+    ):
+        if chunk_size % CHUNK_ALIGNMENT:
+            raise ValueError(f"chunk_size must be a multiple of {CHUNK_ALIGNMENT}")
+        self.client = client
+        self.sessions = UploadSessions(state_file)
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        self.skip_unchanged = skip_unchanged
+        self.executor = executor or api_executor("drive")
+
+    def upload(self, paths, parent=None):
+        """Upload paths into parent, returning an UploadResult per path."""
+        paths = [Path(path) for path in paths]
+        remote = self._remote_files(parent) if self.skip_unchanged else {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return list(
+                pool.map(lambda path: self._upload_one(path, parent, remote), paths)
+            )
+
+    def _remote_files(self, parent):
+        files = self.client.list_files(
+            parent=parent or "root", fields=("id", "name", "md5Checksum")
+        )
+        return {file["name"]: file for file in files}
+
+    def _upload_one(self, path, parent, remote):
+        try:
+            md5 = file_md5(path)
+            existing = remote.get(path.name)
+            if existing and existing.get("md5Checksum") == md5:
+                return UploadResult(
+                    path, FileWithId(path.name, existing["id"]), skipped=True
+                )
+            file = self._upload(path, parent, md5)
+        except (HttpError, OSError, ValueError, *TRANSPORT_ERRORS) as err:
+            return UploadResult(path, error=err)
+        return UploadResult(path, file)
+
+    def _upload(self, path, parent, md5):
+        key = f"{path.resolve()}::{parent or ''}"
+        session = self.sessions.get(key)
+        if session and session["md5"] != md5:
+            # the file changed since the session started, begin again
+            session = None
+        try:
+            return self._send(path, parent, md5, key, session)
+        except HttpError as err:
+            if session is None or err.resp.status not in (404, 410):
+                raise
+            # the saved session expired on the server
+            self.sessions.remove(key)
+            return self._send(path, parent, md5, key, None)
+
+    def _send(self, path, parent, md5, key, session):
+        mimetype = mimetype_for_path(path)
+        file_metadata = {"name": path.name, "mimeType": mimetype}
+        if parent:
+            file_metadata["parents"] = [parent]
+        media = MediaFileUpload(
+            str(path), mimetype=mimetype, chunksize=self.chunk_size, resumable=True
+        )
+        request = (
+            self.client.get_service()
+            .files()
+            .create(body=file_metadata, media_body=media, fields="id")
+        )
+        if session:
+            offset, response = self.executor.call(
+                lambda: query_upload_offset(request.http, session["uri"], media.size())
+            )
+            if response is not None:
+                # the last chunk landed before the process went away
+                self.sessions.remove(key)
+                return FileWithId(path.name, response["id"])
+            request.resumable_uri = session["uri"]
+        else:
+            offset = 0
+            # saved before any data is sent, so a crash mid-chunk can resume
+            request.resumable_uri = self.executor.call(
+                lambda: start_upload_session(request, media)
+            )
+            self.sessions.save(key, request.resumable_uri, md5)
+        request.resumable_progress = offset
+        response = None
+        while response is None:
+            _, response = self._next_chunk(request, media.size())
+        self.sessions.remove(key)
+        return FileWithId(path.name, response["id"])
+
+    def _next_chunk(self, request, size):
+        retrying = False
+
+        def attempt():
+            nonlocal retrying
+            if retrying:
+                # part of the failed chunk may have landed, go on from the
+                # server's offset rather than ours
+                offset, response = query_upload_offset(
+                    request.http, request.resumable_uri, size
+                )
+                if response is not None:
+                    return None, response
+                request.resumable_progress = offset
+            retrying = True
+            return request.next_chunk()
+
+        return self.executor.call(attempt)
+
+
+def start_upload_session(request, media):
+    """Open a resumable upload session for request, returning its URI."""
+    headers = dict(request.headers)
+    headers["X-Upload-Content-Type"] = media.mimetype()
+    headers["X-Upload-Content-Length"] = str(media.size())
+    resp, content = request.http.request(
+        request.uri, method=request.method, body=request.body, headers=headers
+    )
+    if resp.status != 200 or "location" not in resp:
+        raise HttpError(resp, content, uri=request.uri)
+    return resp["location"]
+
+
+def query_upload_offset(http, uri, size):
+    """Ask a resumable session how much it has received.  Returns (offset,
+    None) while incomplete, or (size, response) once the upload finished."""
+    resp, content = http.request(
+        uri,
+        method="PUT",
+        body=b"",
+        headers={"Content-Range": f"bytes */{size}", "Content-Length": "0"},
+    )
+    if resp.status in (200, 201):
+        return size, json.loads(content)
+    if resp.status != 308:
+        raise HttpError(resp, content, uri=uri)
+    # e.g. "bytes=0-524287"; absent when nothing has been stored yet
+    received = resp.get("range")
+    return (int(received.rsplit("-", 1)[1]) + 1 if received else 0), None
+
+
+def file_md5(path, block_size=1024 * 1024):
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        while block := f.read(block_size):
+            digest.update(block)
+    return digest.hexdigest()
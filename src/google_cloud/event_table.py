@@ -0,0 +1,131 @@
+from array import array
+import bisect
+import datetime
+
+from .calendar import Event, parse_event_date
+
+MIDNIGHT = datetime.time(0, 0)
+
+
+class EventTable:
+    """Events stored column by column, for exports too large to keep as Event
+    objects.  Start and end are epoch seconds in array('d'); calendars are
+    stored once and referenced by position.  Rows are materialized as Events on
+    access.  between() uses binary search once the table is sorted."""
+
+    def __init__(self, tz=None):
+        self.tz = tz
+        self.calendars = []
+        self._calendar_positions = {}
+        self.ids = []
+        self.names = []
+        self.recurrences = []
+        self.starts = array("d")
+        self.ends = array("d")
+        self.calendar_positions = array("I")
+        self.all_day = array("b")
+        self._sorted = True
+        self._max_duration = 0.0
+
+    @classmethod
+    def from_events(cls, events, tz=None):
+        table = cls(tz)
+        for event in events:
+            table.append(event)
+        return table
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, idx):
+        calendar = self.calendars[self.calendar_positions[idx]]
+        zone = calendar.time_zone
+        return Event(
+            self.ids[idx],
+            self.names[idx],
+            datetime.datetime.fromtimestamp(self.starts[idx], zone),
+            datetime.datetime.fromtimestamp(self.ends[idx], zone),
+            calendar,
+            self.tz,
+            self.recurrences[idx],
+        )
+
+    def __iter__(self):
+        return (self[idx] for idx in range(len(self)))
+
+    def append(self, event):
+        self._append(
+            event.id,
+            event.name,
+            event.start,
+            event.end,
+            self._calendar_position(event.calendar),
+            event.recurrence,
+        )
+
+    def extend_payloads(self, items, calendar):
+        """Add an events.list page straight from its payload, skipping
+        cancelled events, without building Events."""
+        position = self._calendar_position(calendar)
+        zone = calendar.time_zone
+        for item in items:
+            if item.get("status", "") == "cancelled":
+                continue
+            self._append(
+                item.get("id"),
+                item.get("summary", "Untitled Event"),
+                parse_event_date(item.get("start"), zone),
+                parse_event_date(item.get("end"), zone),
+                position,
+                item.get("recurrence"),
+            )
+
+    def sort(self):
+        """Order rows by start time."""
+        order = sorted(range(len(self)), key=self.starts.__getitem__)
+        for name in (
+            "ids",
+            "names",
+            "recurrences",
+            "starts",
+            "ends",
+            "calendar_positions",
+            "all_day",
+        ):
+            column = getattr(self, name)
+            sorted_column = [column[idx] for idx in order]
+            if isinstance(column, array):
+                sorted_column = array(column.typecode, sorted_column)
+            setattr(self, name, sorted_column)
+        self._sorted = True
+
+    def between(self, start, end):
+        """Events overlapping start..end, in start order."""
+        if not self._sorted:
+            self.sort()
+        lo, hi = start.timestamp(), end.timestamp()
+        # nothing starting before lo - max_duration can still be running at lo
+        first = bisect.bisect_left(self.starts, lo - self._max_duration)
+        last = bisect.bisect_left(self.starts, hi)
+        return [self[idx] for idx in range(first, last) if self.ends[idx] > lo]
+
+    def _calendar_position(self, calendar):
+        position = self._calendar_positions.get(calendar.id)
+        if position is None:
+            position = self._calendar_positions[calendar.id] = len(self.calendars)
+            self.calendars.append(calendar)
+        return position
+
+    def _append(self, id, name, start, end, calendar_position, recurrence):
+        start_ts = start.timestamp()
+        end_ts = end.timestamp()
+        self._max_duration = max(self._max_duration, end_ts - start_ts)
+        if self.starts and start_ts < self.starts[-1]:
+            self._sorted = False
+        self.ids.append(id)
+        self.names.append(name)
+        self.recurrences.append(recurrence)
+        self.starts.append(start_ts)
+        self.ends.append(end_ts)
+        self.calendar_positions.append(calendar_position)
+        self.all_day.append(start.time() == end.time() == MIDNIGHT)
@@ -0,0 +1,242 @@
+"""A1 notation ranges: parsing, formatting and range algebra.
+
+A range is stored as 1-based, inclusive bounds.  The first row and column
+are always set; a last row or column of None means the range is open ended,
+as in whole columns ("A:C"), whole rows ("2:5") or a whole sheet.
+"""
+
+from dataclasses import dataclass, replace
+from functools import lru_cache
+import re
+
+from .utils import column_name_to_number, column_number_to_name
+
+_CELL = re.compile(r"\$?([A-Za-z]{0,3})\$?(\d*)")
+_QUOTED_SHEET = re.compile(r"'((?:[^']|'')+)'!(.*)")
+
+
+@dataclass(frozen=True)
+class A1Range:
+    sheet: str = None
+    first_row: int = 1
+    first_col: int = 1
+    last_row: int = None
+    last_col: int = None
+
+    def __str__(self):
+        cells = self._cells()
+        if self.sheet is None:
+            return cells
+        quoted = self.sheet.replace("'", "''")
+        return f"'{quoted}'!{cells}" if cells else f"'{quoted}'"
+
+    def _cells(self):
+        if self.last_row is None and self.last_col is None:
+            if self.first_row == 1 and self.first_col == 1:
+                return ""
+        if self.last_col is None and self.first_col == 1:
+            return f"{self.first_row}:{_fmt(self.last_row)}"
+        first = column_number_to_name(self.first_col)
+        last = "" if self.last_col is None else column_number_to_name(self.last_col)
+        if self.last_row is None and self.first_row == 1:
+            return f"{first}:{last}"
+        start = f"{first}{self.first_row}"
+        end = f"{last}{_fmt(self.last_row)}"
+        return start if start == end else f"{start}:{end}"
+
+    @property
+    def is_cell(self):
+        return self.first_row == self.last_row and self.first_col == self.last_col
+
+    @property
+    def row_count(self):
+        if self.last_row is not None:
+            return self.last_row - self.first_row + 1
+
+    @property
+    def col_count(self):
+        if self.last_col is not None:
+            return self.last_col - self.first_col + 1
+
+    def contains(self, row, col):
+        return self.first_row <= row <= _bound(
+            self.last_row
+        ) and self.first_col <= col <= _bound(self.last_col)
+
+    def intersection(self, other):
+        """The overlapping range, or None when the ranges are disjoint."""
+        if self.sheet != other.sheet:
+            return None
+        first_row = max(self.first_row, other.first_row)
+        first_col = max(self.first_col, other.first_col)
+        last_row = _min_bound(self.last_row, other.last_row)
+        last_col = _min_bound(self.last_col, other.last_col)
+        if first_row > _bound(last_row) or first_col > _bound(last_col):
+            return None
+        return A1Range(self.sheet, first_row, first_col, last_row, last_col)
+
+    def bounding(self, other):
+        """The smallest range covering both ranges."""
+        if self.sheet != other.sheet:
+            raise ValueError("Ranges on different sheets have no bounding range")
+        return A1Range(
+            self.sheet,
+            min(self.first_row, other.first_row),
+            min(self.first_col, other.first_col),
+            _max_bound(self.last_row, other.last_row),
+            _max_bound(self.last_col, other.last_col),
+        )
+
+    def union(self, other):
+        """The union as a single range, or None when it is not a rectangle."""
+        if self.sheet != other.sheet:
+            return None
+        bounding = self.bounding(other)
+        same_cols = (self.first_col, self.last_col) == (other.first_col, other.last_col)
+        same_rows = (self.first_row, self.last_row) == (other.first_row, other.last_row)
+        if bounding == self or bounding == other:
+            return bounding
+        if same_cols and _touch(
+            self.first_row, self.last_row, other.first_row, other.last_row
+        ):
+            return bounding
+        if same_rows and _touch(
+            self.first_col, self.last_col, other.first_col, other.last_col
+        ):
+            return bounding
+        return None
+
+    def split_rows(self, max_rows):
+        """Split a bounded range into consecutive ranges of at most max_rows."""
+        if self.last_row is None:
+            raise ValueError("Cannot split a range with no last row")
+        return [
+            replace(
+                self, first_row=row, last_row=min(row + max_rows - 1, self.last_row)
+            )
+            for row in range(self.first_row, self.last_row + 1, max_rows)
+        ]
+
+    def split_cells(self, max_cells):
+        """Split by rows so each piece holds at most max_cells cells."""
+        if self.col_count is None:
+            raise ValueError("Cannot split a range with no last column")
+        return self.split_rows(max(1, max_cells // self.col_count))
+
+
+@lru_cache(maxsize=4096)
+def parse_range(text):
+    """Parse A1 notation: cells ("B2"), ranges ("B2:D40"), whole columns
+    ("A:C"), whole rows ("2:5"), open ended ranges ("A5:C") and a sheet on its
+    own, each optionally prefixed by a quoted or plain sheet name."""
+    sheet, cells = _split_sheet(text)
+    if cells is None:
+        return A1Range(sheet)
+    first, sep, last = cells.partition(":")
+    first_row, first_col = _parse_cell(first, text)
+    if not sep:
+        if first_row is None or first_col is None:
+            raise ValueError(f"Invalid A1 cell {text!r}")
+        return A1Range(sheet, first_row, first_col, first_row, first_col)
+    last_row, last_col = _parse_cell(last, text)
+    if first_col is None and last_col is None:
+        # whole rows
+        return A1Range(sheet, first_row or 1, 1, last_row, None)
+    return A1Range(sheet, first_row or 1, first_col or 1, last_row, last_col)
+
+
+@lru_cache(maxsize=4096)
+def parse_cell(text):
+    """(row, column) of a single cell like "B2" or "$B$2"."""
+    row, col = _parse_cell(text, text)
+    if row is None or col is None:
+        raise ValueError(f"Invalid A1 cell {text!r}")
+    return row, col
+
+
+def merge_ranges(ranges):
+    """Merge ranges whose union is itself a rectangle, until none can be."""
+    merged = list(ranges)
+    changed = True
+    while changed:
+        changed = False
+        for i in range(len(merged)):
+            for j in range(i + 1, len(merged)):
+                if (union := merged[i].union(merged[j])) is not None:
+                    merged[i] = union
+                    del merged[j]
+                    changed = True
+                    break
+            if changed:
+                break
+    return merged
+
+
+def column_names(numbers):
+    """column_number_to_name over many numbers, e.g. [1, 27] -> ["A", "AA"]."""
+    return list(map(column_number_to_name, numbers))
+
+
+def column_numbers(names):
+    """column_name_to_number over many names, e.g. ["A", "AA"] -> [1, 27]."""
+    return list(map(column_name_to_number, names))
+
+
+def _split_sheet(text):
+    if match := _QUOTED_SHEET.fullmatch(text):
+        return match.group(1).replace("''", "'"), match.group(2) or None
+    if text.startswith("'") and text.endswith("'") and len(text) > 1:
+        return text[1:-1].replace("''", "'"), None
+    sheet, sep, cells = text.rpartition("!")
+    if sep:
+        return sheet, cells or None
+    if _is_cells(text):
+        return None, text
+    # no cells, just a sheet name
+    return text, None
+
+
+def _is_cells(text):
+    first, _, last = text.partition(":")
+    return all(
+        (match := _CELL.fullmatch(part)) and (match.group(1) or match.group(2))
+        for part in (first, last or first)
+    )
+
+
+def _parse_cell(cell, text):
+    match = _CELL.fullmatch(cell)
+    if match is None or not (match.group(1) or match.group(2)):
+        raise ValueError(f"Invalid A1 notation {text!r}")
+    letters, digits = match.groups()
+    return (
+        int(digits) if digits else None,
+        column_name_to_number(letters) if letters else None,
+    )
+
+
+def _fmt(value):
+    return "" if value is None else value
+
+
+def _bound(value):
+    return float("inf") if value is None else value
+
+
+def _min_bound(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return min(a, b)
+
+
+def _max_bound(a, b):
+    if a is None or b is None:
+        return None
+    return max(a, b)
+
+
+def _touch(first_a, last_a, first_b, last_b):
+    """Whether two spans overlap or are adjacent."""
+    return first_b <= _bound(last_a) + 1 and first_a <= _bound(last_b) + 1
@@ -0,0 +1,213 @@
+from dataclasses import dataclass, field
+import email.utils
+import json
+import random
+import ssl
+import threading
+import time
+
+from googleapiclient.errors import HttpError
+import httplib2
+
+
+@dataclass
+class Quota:
+    requests: int
+    period: float
+
+    @property
+    def rate(self):
+        return self.requests / self.period
+
+
+# Per-user quotas from each api's documentation.  Where reads and writes have
+# separate quotas the lower one is used; tasks and books document only daily
+# limits, so a conservative per-minute rate is assumed.  Override with
+# configure_api().
+DEFAULT_QUOTAS = {
+    "docs": Quota(60, 60),
+    "sheets": Quota(60, 60),
+    "drive": Quota(12000, 60),
+    "tasks": Quota(600, 60),
+    "calendar": Quota(600, 60),
+    "books": Quota(100, 60),
+    "people": Quota(90, 60),
+}
+FALLBACK_QUOTA = Quota(60, 60)
+
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+RATE_LIMIT_REASONS = ("rateLimitExceeded", "userRateLimitExceeded")
+# dropped connections, timeouts and failed lookups surface as these from
+# httplib2 and the socket/ssl layers below it
+TRANSPORT_ERRORS = (
+    ConnectionError,
+    TimeoutError,
+    ssl.SSLError,
+    httplib2.HttpLib2Error,
+)
+
+
+class RateLimiter:
+    """Token bucket refilled at the quota's rate, holding at most a quota
+    period's worth of tokens.  Rate-limit errors halve the refill rate, and
+    each success creeps it back up towards the quota (AIMD)."""
+
+    def __init__(self, quota, min_rate_factor=0.1, recovery_factor=0.05):
+        self.quota = quota
+        self.capacity = quota.requests
+        self.max_rate = quota.rate
+        self.min_rate = quota.rate * min_rate_factor
+        self.recovery = quota.rate * recovery_factor
+        self.rate = quota.rate
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._sleep = time.sleep
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            self._sleep(wait)
+
+    def throttle(self):
+        with self._lock:
+            self._refill()
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = 0.0
+
+    def recover(self):
+        if self.rate < self.max_rate:
+            with self._lock:
+                self.rate = min(self.max_rate, self.rate + self.recovery)
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+
+
+@dataclass
+class RetryPolicy:
+    max_retries: int = 5
+    base_delay: float = 1.0
+    max_delay: float = 64.0
+
+    def delay(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return retry_after
+        # exponential backoff with full jitter
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+
+@dataclass
+class ApiExecutor:
+    """Runs every request for one api through its rate limiter, retrying
+    rate-limit, server and transport errors with backoff."""
+
+    limiter: RateLimiter
+    retry_policy: RetryPolicy = field(default_factory=RetryPolicy)
+
+    def __post_init__(self):
+        self._sleep = time.sleep
+
+    def call(self, fn, tokens=1):
+        attempt = 0
+        while True:
+            for _ in range(tokens):
+                self.limiter.acquire()
+            try:
+                result = fn()
+            except (HttpError, *TRANSPORT_ERRORS) as err:
+                if not is_retryable(err) or attempt >= self.retry_policy.max_retries:
+                    raise
+                self.backoff(attempt, [err])
+                attempt += 1
+            else:
+                self.limiter.recover()
+                return result
+
+    def backoff(self, attempt, errors):
+        if any(is_rate_limited(err) for err in errors):
+            self.limiter.throttle()
+        retry_afters = [
+            seconds for err in errors if (seconds := retry_after(err)) is not None
+        ]
+        self._sleep(
+            self.retry_policy.delay(
+                attempt, max(retry_afters) if retry_afters else None
+            )
+        )
+
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def api_executor(name):
+    with _executors_lock:
+        if name not in _executors:
+            quota = DEFAULT_QUOTAS.get(name, FALLBACK_QUOTA)
+            _executors[name] = ApiExecutor(RateLimiter(quota))
+        return _executors[name]
+
+
+def configure_api(name, quota=None, retry_policy=None):
+    """Override the quota and/or retry policy used for an api, process-wide."""
+    executor = api_executor(name)
+    if quota is not None:
+        executor.limiter = RateLimiter(quota)
+    if retry_policy is not None:
+        executor.retry_policy = retry_policy
+    return executor
+
+
+def is_retryable(err):
+    if isinstance(err, ssl.SSLCertVerificationError):
+        # a bad certificate won't fix itself
+        return False
+    if isinstance(err, TRANSPORT_ERRORS):
+        return True
+    if not isinstance(err, HttpError):
+        return False
+    return err.resp.status in RETRYABLE_STATUSES or is_rate_limited(err)
+
+
+def is_rate_limited(err):
+    if not isinstance(err, HttpError):
+        return False
+    if err.resp.status == 429:
+        return True
+    return err.resp.status == 403 and error_reason(err) in RATE_LIMIT_REASONS
+
+
+def error_reason(err):
+    try:
+        error = json.loads(err.content)["error"]
+    except (TypeError, ValueError, KeyError):
+        return None
+    if errors := error.get("errors"):
+        return errors[0].get("reason")
+    return error.get("status")
+
+
+def retry_after(err):
+    if not isinstance(err, HttpError):
+        return None
+    value = err.resp.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
@@ -1,12 +1,25 @@
+from collections import namedtuple
 from dataclasses import dataclass, field
 from typing import List
+import os
+import threading
 
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
 from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
+import httplib2
 
+from .discovery import DiscoveryStore, default_store
+from .ratelimit import api_executor, is_retryable
+
+
+DEFAULT_HTTP_TIMEOUT = 60
+
+# Google rejects batches over 1000 calls, and several apis (e.g. drive) over 100
+MAX_BATCH_SIZE = 100
 
 DEFAULT_SCOPES = [
     "https://www.googleapis.com/auth/documents",
@@ -20,10 +33,13 @@ class ServiceFactory:
     token_file: str
     secrets_file: str
     scopes: List = field(default_factory=list)
+    discovery_store: DiscoveryStore = None
 
     def __post_init__(self):
         if not self.scopes:
             self.scopes = DEFAULT_SCOPES
+        if self.discovery_store is None:
+            self.discovery_store = default_store()
 
     def _get_service(self, name, version, attr=None, refresh=False):
         service = _get_generic_api_service(
@@ -33,6 +49,7 @@ class ServiceFactory:
             token_file=self.token_file,
             secrets_file=self.secrets_file,
             refresh=refresh,
+            discovery_store=self.discovery_store,
         )
         if attr:
             return getattr(service, attr)()
@@ -60,9 +77,241 @@ class ServiceFactory:
         return self._get_service("people", "v1", refresh=refresh)
 
 
+class HttpPool:
+    """Hands out one authorized httplib2 transport per thread and credentials.
+
+    httplib2.Http is not thread-safe, but each instance keeps its connections
+    alive, so a transport per thread lets every client share the same service
+    objects across threads while still reusing TCP/TLS connections."""
+
+    def __init__(self, timeout=DEFAULT_HTTP_TIMEOUT):
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def http_for(self, credentials):
+        transports = getattr(self._local, "transports", None)
+        if transports is None:
+            transports = self._local.transports = {}
+        entry = transports.get(id(credentials))
+        # hold on to the credentials so the id cannot be reused while cached
+        if entry is None or entry[0] is not credentials:
+            http = AuthorizedHttp(credentials, http=httplib2.Http(timeout=self.timeout))
+            entry = transports[id(credentials)] = (credentials, http)
+        return entry[1]
+
+    def request_builder(self, credentials, executor=None):
+        def build_request(http, *args, **kwargs):
+            return PooledHttpRequest(self, credentials, executor, *args, **kwargs)
+
+        return build_request
+
+
+class PooledHttpRequest(HttpRequest):
+    """An HttpRequest whose transport is resolved from the pool in the thread
+    that executes it, rather than the thread that built it, and whose execute()
+    goes through the api's rate limiter and retry policy."""
+
+    def __init__(self, pool, credentials, executor, *args, **kwargs):
+        self._pool = pool
+        self._credentials = credentials
+        self._http = None
+        self.executor = executor
+        super().__init__(None, *args, **kwargs)
+
+    def execute(self, http=None, num_retries=0):
+        run = super().execute
+        if self.executor is None:
+            return run(http=http, num_retries=num_retries)
+        return self.executor.call(lambda: run(http=http, num_retries=num_retries))
+
+    @property
+    def http(self):
+        if self._http is not None:
+            return self._http
+        return self._pool.http_for(self._credentials)
+
+    @http.setter
+    def http(self, value):
+        self._http = value
+
+
+_http_pool = HttpPool()
+
+
+@dataclass
+class BatchResult:
+    key: object
+    response: object = None
+    error: Exception = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def execute_batch(service, requests, keys=None, batch_size=MAX_BATCH_SIZE):
+    """Execute requests through the api's batch endpoint, batch_size calls per
+    round trip.  Returns a BatchResult per request, in order, keyed by keys (or
+    the request's position) and holding either its response or its error."""
+    requests = list(requests)
+    keys = list(range(len(requests))) if keys is None else list(keys)
+    if len(keys) != len(requests):
+        raise ValueError("keys and requests must be the same length")
+    results = [BatchResult(key) for key in keys]
+    # every call in a batch counts against the api's quota
+    executor = getattr(requests[0], "executor", None) if requests else None
+
+    def callback(request_id, response, exception):
+        result = results[int(request_id)]
+        result.response = response
+        result.error = exception
+
+    pending = list(range(len(requests)))
+    attempt = 0
+    while True:
+        for offset in range(0, len(pending), batch_size):
+            chunk = pending[offset : offset + batch_size]
+            batch = service.new_batch_http_request(callback=callback)
+            for idx in chunk:
+                batch.add(requests[idx], request_id=str(idx))
+            if executor is None:
+                batch.execute()
+            else:
+                executor.call(batch.execute, tokens=len(chunk))
+        if executor is None:
+            return results
+        # resend only the calls that failed with a retryable error
+        pending = [
+            idx
+            for idx in pending
+            if results[idx].error is not None and is_retryable(results[idx].error)
+        ]
+        if not pending or attempt >= executor.retry_policy.max_retries:
+            return results
+        executor.backoff(attempt, [results[idx].error for idx in pending])
+        attempt += 1
+
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "size"])
+
+
+@dataclass
+class _CachedService:
+    service: object
+    credentials: Credentials
+    token_mtime: float
+
+
+class ServiceCache:
+    """Process-wide cache of built API services, keyed by api, version, scopes,
+    token file and discovery store.  A cached service is reused until its credentials change
+    on disk or the caller asks for a refresh."""
+
+    def __init__(self):
+        self._entries = {}
+        # one lock per key, so a slow login or build only holds up callers
+        # of that same service; _lock just guards the dicts and counters
+        self._key_locks = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(
+        self,
+        name,
+        version,
+        scopes,
+        token_file,
+        secrets_file,
+        refresh=False,
+        discovery_store=None,
+    ):
+        discovery_store = discovery_store or default_store()
+        # stores compare by identity, so each one gets its own services
+        key = (name, version, tuple(scopes), str(token_file), discovery_store)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is not None and not refresh:
+                if entry.token_mtime == _token_mtime(token_file):
+                    if not entry.credentials.valid:
+                        # the service is bound to this credentials object, so
+                        # refreshing in place keeps it usable without a rebuild
+                        _refresh_credentials(entry.credentials, token_file)
+                        entry.token_mtime = _token_mtime(token_file)
+                    if entry.credentials.valid:
+                        with self._lock:
+                            self.hits += 1
+                        return entry.service
+            with self._lock:
+                self.misses += 1
+            creds = _load_credentials(scopes, token_file, secrets_file, refresh)
+            service = _build_service(name, version, creds, discovery_store)
+            if service is not None:
+                with self._lock:
+                    self._entries[key] = _CachedService(
+                        service, creds, _token_mtime(token_file)
+                    )
+            return service
+
+    def info(self):
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, len(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+
+_service_cache = ServiceCache()
+
+
+def service_cache_info():
+    return _service_cache.info()
+
+
+def clear_service_cache():
+    _service_cache.clear()
+
+
 def _get_generic_api_service(
-    name, version, scopes, token_file, secrets_file, refresh=False
+    name,
+    version,
+    scopes,
+    token_file,
+    secrets_file,
+    refresh=False,
+    discovery_store=None,
 ):
+    return _service_cache.get(
+        name,
+        version,
+        scopes,
+        token_file,
+        secrets_file,
+        refresh=refresh,
+        discovery_store=discovery_store,
+    )
+
+
+def _token_mtime(token_file):
+    try:
+        return os.stat(token_file).st_mtime
+    except FileNotFoundError:
+        return None
+
+
+def _refresh_credentials(creds, token_file):
+    if creds.expired and creds.refresh_token:
+        creds.refresh(Request())
+        with open(token_file, "w") as token:
+            token.write(creds.to_json())
+
+
+def _load_credentials(scopes, token_file, secrets_file, refresh=False):
     creds = None
     # The file token.json stores the user's access and refresh tokens, and is
     # created automatically when the authorization flow completes for the first
@@ -79,7 +328,16 @@ def _get_generic_api_service(
         # Save the credentials for the next run
         with open(token_file, "w") as token:
             token.write(creds.to_json())
+    return creds
+
+
+def _build_service(name, version, creds, discovery_store):
     try:
-        return build(name, version, credentials=creds, cache_discovery=False)
+        return discovery_store.build(
+            name,
+            version,
+            http=_http_pool.http_for(creds),
+            requestBuilder=_http_pool.request_builder(creds, api_executor(name)),
+        )
     except HttpError as err:
         print(err)
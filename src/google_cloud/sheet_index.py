@@ -0,0 +1,75 @@
+from dataclasses import dataclass
+
+from .sheet_writes import a1_range
+from .utils import column_number_to_name
+
+
+@dataclass
+class SheetRow:
+    sheet_title: str
+    row_number: int
+    values: list
+
+    @property
+    def address(self):
+        """A1 range covering the row's values, e.g. 'Sheet1'!A5:D5"""
+        return a1_range(
+            self.sheet_title,
+            self.row_number,
+            1,
+            self.row_number,
+            max(1, len(self.values)),
+        )
+
+    def cell_address(self, col_idx):
+        quoted = self.sheet_title.replace("'", "''")
+        return f"'{quoted}'!{column_number_to_name(col_idx)}{self.row_number}"
+
+
+class SheetIndex:
+    """Hash index from a column's values to the (1-based) rows holding them.
+    Missing cells are indexed as ""."""
+
+    def __init__(self, col_idx, unique=False):
+        self.col_idx = col_idx
+        self.unique = unique
+        self._rows = {}
+
+    def build(self, values, first_row):
+        self._rows = {}
+        for row_idx in range(first_row, len(values) + 1):
+            self.add(cell_value(values, row_idx, self.col_idx), row_idx)
+
+    def lookup(self, value):
+        return sorted(self._rows.get(value, ()))
+
+    def add(self, value, row_idx):
+        rows = self._rows.setdefault(value, set())
+        if self.unique and rows and value != "":
+            raise ValueError(
+                f"Duplicate value {value!r} in unique column {self.col_idx} "
+                f"(rows {min(rows)} and {row_idx})"
+            )
+        rows.add(row_idx)
+
+    def remove(self, value, row_idx):
+        rows = self._rows.get(value)
+        if rows is not None:
+            rows.discard(row_idx)
+            if not rows:
+                del self._rows[value]
+
+    def check(self, value, row_idx):
+        """Raise if setting row_idx to value would break uniqueness."""
+        if self.unique and value != "":
+            if self._rows.get(value, {row_idx}) - {row_idx}:
+                raise ValueError(
+                    f"Duplicate value {value!r} in unique column {self.col_idx}"
+                )
+
+
+def cell_value(values, row_idx, col_idx):
+    try:
+        return values[row_idx - 1][col_idx - 1]
+    except (IndexError, TypeError):
+        return ""
@@ -0,0 +1,291 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, replace
+import itertools
+import json
+import time
+
+from .ranges import A1Range, parse_range
+
+# Google recommends keeping sheets request payloads under 2 MB
+MAX_REQUEST_BYTES = 2 * 1024 * 1024
+DEFAULT_MAX_CELLS = 10000
+DEFAULT_BLOCK_ROWS = 2000
+# rows added past what a block needs, so a long upload doesn't cost an
+# appendDimension per block without leaving a large blank tail behind
+DEFAULT_HEADROOM_ROWS = 1000
+
+
+class WriteBuffer:
+    """Write-behind buffer for cell updates.
+
+    Cells are written to the local GoogleSheet values straight away and
+    tracked as dirty; a flush merges adjacent dirty cells into rectangular
+    ranges and sends them in as few values.batchUpdate calls as the payload
+    limit allows.  Flushes happen when max_cells are dirty, when the oldest
+    dirty cell is older than max_delay seconds (checked on each write), on
+    flush() and when leaving the context manager."""
+
+    def __init__(
+        self,
+        spreadsheet,
+        input_option="RAW",
+        max_cells=DEFAULT_MAX_CELLS,
+        max_delay=None,
+        max_request_bytes=MAX_REQUEST_BYTES,
+    ):
+        self.spreadsheet = spreadsheet
+        self.input_option = input_option
+        self.max_cells = max_cells
+        self.max_delay = max_delay
+        self.max_request_bytes = max_request_bytes
+        self._dirty = {}
+        self._dirty_count = 0
+        self._dirty_since = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.flush()
+
+    def __len__(self):
+        return self._dirty_count
+
+    def set(self, sheet_title, row, col, value):
+        sheet = self.spreadsheet.get_sheet(sheet_title)
+        if sheet is None:
+            raise ValueError(f"Sheet {sheet_title!r} not found")
+        sheet.set(row, col, value)
+        cells = self._dirty.setdefault(sheet.title, {})
+        if (row, col) not in cells:
+            self._dirty_count += 1
+        cells[(row, col)] = value
+        if self._dirty_since is None:
+            self._dirty_since = time.monotonic()
+        if self._dirty_count >= self.max_cells or (
+            self.max_delay is not None
+            and time.monotonic() - self._dirty_since >= self.max_delay
+        ):
+            self.flush()
+
+    def __setitem__(self, address, value):
+        """buffer["Sheet1!B2"] = value"""
+        target = parse_range(address)
+        if not target.is_cell:
+            raise ValueError(f"{address!r} is not a single cell")
+        self.set(target.sheet, target.first_row, target.first_col, value)
+
+    def flush(self):
+        """Send all dirty cells, returning the number of api calls made."""
+        if not self._dirty:
+            return 0
+        data = [
+            {"range": a1_range(title, *rect[:4]), "values": rect[4]}
+            for title, cells in self._dirty.items()
+            for rect in coalesce(cells)
+        ]
+        requests = 0
+        for chunk in split_payload(data, self.max_request_bytes):
+            self.spreadsheet.service_factory.sheets_api_service().values().batchUpdate(
+                spreadsheetId=self.spreadsheet.id,
+                body={"valueInputOption": self.input_option, "data": chunk},
+            ).execute()
+            requests += 1
+        self._dirty = {}
+        self._dirty_count = 0
+        self._dirty_since = None
+        return requests
+
+
+@dataclass
+class BulkWriteProgress:
+    # rows confirmed written, contiguously from the first row of the upload
+    rows_written: int
+    # pass as start_row, with the rows not yet written, to resume
+    next_row: int
+
+
+def write_rows(
+    spreadsheet,
+    sheet_title,
+    rows,
+    start_row=1,
+    block_rows=DEFAULT_BLOCK_ROWS,
+    max_workers=4,
+    input_option="RAW",
+    on_progress=None,
+    max_request_bytes=MAX_REQUEST_BYTES,
+    headroom_rows=DEFAULT_HEADROOM_ROWS,
+):
+    """Stream an iterable of rows into a sheet, block_rows rows per request
+    with up to max_workers requests in flight (each still subject to the
+    sheets rate limiter).  The grid is grown with appendDimension as needed,
+    leaving headroom_rows spare rows past the block (0 grows it exactly).
+    Blocks of empty rows are skipped rather than sent, and blocks over
+    max_request_bytes are sent as several requests.
+    on_progress(BulkWriteProgress) is called as blocks complete; the local
+    sheet values are not updated.  Returns the final BulkWriteProgress."""
+    sheet = spreadsheet.get_sheet(sheet_title)
+    if sheet is None:
+        raise ValueError(f"Sheet {sheet_title!r} not found")
+    rows = iter(rows)
+    completed = set()
+    progress = BulkWriteProgress(0, start_row)
+
+    def harvest(futures):
+        done, pending = wait(futures, return_when=FIRST_COMPLETED)
+        for future in done:
+            completed.add(future.result())
+        advance()
+        return pending
+
+    def advance():
+        while progress.next_row in completed:
+            completed.discard(progress.next_row)
+            progress.next_row += futures_rows[progress.next_row]
+            progress.rows_written = progress.next_row - start_row
+        if on_progress is not None:
+            on_progress(BulkWriteProgress(progress.rows_written, progress.next_row))
+
+    futures_rows = {}
+    futures = set()
+    next_row = start_row
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while block := list(itertools.islice(rows, block_rows)):
+            last_row = next_row + len(block) - 1
+            width = max(len(row) for row in block)
+            futures_rows[next_row] = len(block)
+            if width == 0:
+                # nothing to write, and a zero width range isn't valid A1
+                completed.add(next_row)
+                advance()
+                next_row = last_row + 1
+                continue
+            _ensure_grid(spreadsheet, sheet, last_row, width, headroom_rows)
+            futures.add(
+                pool.submit(
+                    _write_block,
+                    spreadsheet,
+                    sheet,
+                    next_row,
+                    width,
+                    block,
+                    input_option,
+                    max_request_bytes,
+                )
+            )
+            next_row = last_row + 1
+            # keep memory bounded by only reading ahead of the blocks in flight
+            while len(futures) >= max_workers:
+                futures = harvest(futures)
+        while futures:
+            futures = harvest(futures)
+    return progress
+
+
+def _write_block(
+    spreadsheet, sheet, first_row, width, block, input_option, max_request_bytes
+):
+    last_row = first_row + len(block) - 1
+    item = {
+        "range": a1_range(sheet.title, first_row, 1, last_row, width),
+        "values": block,
+    }
+    for piece in _split_range(item, max_request_bytes):
+        spreadsheet.update_range(
+            piece["range"], piece["values"], input_option=input_option
+        )
+    return first_row
+
+
+def _ensure_grid(spreadsheet, sheet, last_row, width, headroom_rows):
+    requests = []
+    if last_row > sheet.meta_row_count:
+        length = last_row - sheet.meta_row_count + headroom_rows
+        requests.append(_append_dimension(sheet, "ROWS", length))
+        sheet.meta_row_count += length
+    if width > sheet.meta_col_count:
+        requests.append(
+            _append_dimension(sheet, "COLUMNS", width - sheet.meta_col_count)
+        )
+        sheet.meta_col_count = width
+    if requests:
+        spreadsheet.service_factory.sheets_api_service().batchUpdate(
+            spreadsheetId=spreadsheet.id, body={"requests": requests}
+        ).execute()
+
+
+def _append_dimension(sheet, dimension, length):
+    return {
+        "appendDimension": {
+            "sheetId": sheet.id,
+            "dimension": dimension,
+            "length": length,
+        }
+    }
+
+
+def coalesce(cells):
+    """Merge a {(row, col): value} mapping into rectangles, returned as
+    (first_row, first_col, last_row, last_col, values) tuples: horizontal runs
+    are found first, then runs spanning the same columns on consecutive rows
+    are stacked."""
+    runs = []
+    for row, col in sorted(cells):
+        if runs and runs[-1][0] == row and runs[-1][2] == col - 1:
+            run = runs[-1]
+            run[2] = col
+            run[3].append(cells[(row, col)])
+        else:
+            runs.append([row, col, col, [cells[(row, col)]]])
+
+    rects = []
+    open_rects = {}
+    for row, first_col, last_col, values in runs:
+        rect = open_rects.get((first_col, last_col))
+        if rect is not None and rect[2] == row - 1:
+            rect[2] = row
+            rect[4].append(values)
+        else:
+            rect = [row, first_col, row, last_col, [values]]
+            open_rects[(first_col, last_col)] = rect
+            rects.append(rect)
+    return [tuple(rect) for rect in rects]
+
+
+def split_payload(data, max_bytes):
+    """Group value ranges into chunks whose serialized size stays under
+    max_bytes, splitting ranges that are too large on their own by rows."""
+    chunk, chunk_bytes = [], 0
+    for item in data:
+        for piece in _split_range(item, max_bytes):
+            size = len(json.dumps(piece))
+            if chunk and chunk_bytes + size > max_bytes:
+                yield chunk
+                chunk, chunk_bytes = [], 0
+            chunk.append(piece)
+            chunk_bytes += size
+    if chunk:
+        yield chunk
+
+
+def _split_range(item, max_bytes):
+    values = item["values"]
+    size = len(json.dumps(values))
+    if size <= max_bytes or len(values) == 1:
+        yield item
+        return
+    target = parse_range(item["range"])
+    rows_per_piece = max(1, len(values) * max_bytes // size)
+    target = replace(target, last_row=target.first_row + len(values) - 1)
+    for offset, piece in zip(
+        range(0, len(values), rows_per_piece), target.split_rows(rows_per_piece)
+    ):
+        yield {
+            "range": str(piece),
+            "values": values[offset : offset + rows_per_piece],
+        }
+
+
+def a1_range(sheet_title, first_row, first_col, last_row, last_col):
+    return str(A1Range(sheet_title, first_row, first_col, last_row, last_col))
@@ -1,9 +1,23 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
+from googleapiclient.errors import HttpError
+
+from .columnar import ColumnarValues
+from .ranges import A1Range
 from .service import ServiceFactory
-from .utils import column_number_to_name
+from .sheet_index import SheetIndex, SheetRow, cell_value
+from .sheet_writes import (
+    DEFAULT_BLOCK_ROWS,
+    DEFAULT_HEADROOM_ROWS,
+    MAX_REQUEST_BYTES,
+    WriteBuffer,
+    write_rows,
+)
 from .utils import address_to_coordinates
 
+# only what GoogleSheet.from_response needs, not the full grid metadata
+METADATA_FIELDS = "properties.title,sheets.properties"
+
 
 @dataclass
 class GoogleSpreadsheet:
@@ -11,33 +25,174 @@ class GoogleSpreadsheet:
     title: str
     sheets: list
     service_factory: ServiceFactory
+    _sheets_by_title: dict = field(default=None, repr=False, compare=False)
+    # drive (version, modifiedTime) as of the last refresh
+    _revision: tuple = field(default=None, repr=False, compare=False)
 
     def __str__(self):
         return self.title
 
     @classmethod
-    def for_id(cls, id, token_file, secrets_file, scopes=None):
+    def for_id(cls, id, token_file, secrets_file, scopes=None, sheets=None, lazy=False):
+        """Open a spreadsheet.  Values are fetched up front for the sheets
+        titled in sheets (all of them by default), or for none with lazy=True;
+        every other sheet fetches its values on first access."""
         service_factory = ServiceFactory(token_file, secrets_file, scopes=scopes)
         service = service_factory.sheets_api_service()
 
-        response = service.get(spreadsheetId=id).execute()
+        response = service.get(spreadsheetId=id, fields=METADATA_FIELDS).execute()
         title = response["properties"]["title"]
-        sheets = GoogleSheet.from_response(response["sheets"])
+        spreadsheet = cls(
+            id, title, GoogleSheet.from_response(response["sheets"]), service_factory
+        )
+
+        if sheets is None:
+            to_load = list(spreadsheet.sheets)
+        else:
+            to_load = []
+            for sheet_title in sheets:
+                if (sheet := spreadsheet.get_sheet(sheet_title)) is None:
+                    raise ValueError(f"Sheet {sheet_title!r} not found in {title!r}")
+                to_load.append(sheet)
+        if lazy:
+            to_load = []
+        # taken before the values are, so refresh() only skips re-fetching
+        # when nothing changed since this load
+        try:
+            spreadsheet._revision = spreadsheet._drive_revision()
+        except HttpError:
+            # e.g. no drive scope; the first refresh() then compares everything
+            pass
+        loaded_ids = {sheet.id for sheet in to_load}
+        for sheet in spreadsheet.sheets:
+            if sheet.id not in loaded_ids:
+                sheet._loader = spreadsheet._load_sheet
+        spreadsheet.load_sheets(to_load)
+        return spreadsheet
 
-        # do a batchGet api call to get data for all the sheets at once
+    def load_sheets(self, sheets):
+        """Fetch values for sheets with a single batchGet api call."""
+        if not sheets:
+            return
         ranges = [sheet.encompassing_range() for sheet in sheets]
-        response = service.values().batchGet(spreadsheetId=id, ranges=ranges).execute()
+        response = (
+            self.service_factory.sheets_api_service()
+            .values()
+            .batchGet(spreadsheetId=self.id, ranges=ranges)
+            .execute()
+        )
         for sheet, value_range in zip(sheets, response["valueRanges"]):
+            sheet._loader = None
             if "values" not in value_range:
                 # its an empty sheet, continue
                 continue
             sheet.set_values(value_range["values"])
-        return cls(id, title, sheets, service_factory)
+
+    def refresh(self):
+        """Bring the loaded values up to date, returning the sheets that changed.
+
+        The workbook's drive version is checked first, and nothing more is
+        fetched while it is unchanged since for_id or the last refresh.
+        Otherwise sheet properties are re-read, added
+        and removed sheets are reconciled, and loaded sheets are re-fetched in
+        one batchGet, with only those whose grid or values differ updated (in
+        place, so references to GoogleSheet objects stay valid).  Sheets that
+        were never loaded are left to load lazily."""
+        revision = self._drive_revision()
+        if revision == self._revision:
+            return []
+
+        response = (
+            self.service_factory.sheets_api_service()
+            .get(spreadsheetId=self.id, fields=METADATA_FIELDS)
+            .execute()
+        )
+        self.title = response["properties"]["title"]
+        existing = {sheet.id: sheet for sheet in self.sheets}
+        changed, to_fetch, sheets = [], [], []
+        for fresh in GoogleSheet.from_response(response["sheets"]):
+            sheet = existing.get(fresh.id)
+            if sheet is None:
+                fresh._loader = self._load_sheet
+                changed.append(fresh)
+                sheets.append(fresh)
+                continue
+            if sheet.update_properties(fresh):
+                changed.append(sheet)
+            if sheet.loaded:
+                to_fetch.append(sheet)
+            sheets.append(sheet)
+        self.sheets = sorted(sheets, key=lambda sheet: sheet.index)
+        self._sheets_by_title = None
+
+        if to_fetch:
+            response = (
+                self.service_factory.sheets_api_service()
+                .values()
+                .batchGet(
+                    spreadsheetId=self.id,
+                    ranges=[sheet.encompassing_range() for sheet in to_fetch],
+                )
+                .execute()
+            )
+            for sheet, value_range in zip(to_fetch, response["valueRanges"]):
+                values = value_range.get("values", [])
+                if values != (sheet._values or []):
+                    sheet.set_values(values)
+                    sheet.columns = None
+                    if all(sheet is not other for other in changed):
+                        changed.append(sheet)
+        self._revision = revision
+        return changed
+
+    def _drive_revision(self):
+        response = (
+            self.service_factory.drive_api_service()
+            .files()
+            .get(fileId=self.id, fields="version, modifiedTime")
+            .execute()
+        )
+        return response.get("version"), response.get("modifiedTime")
+
+    def load_columns(self, sheets=None, header=True, date_time_render="SERIAL_NUMBER"):
+        """Fetch unformatted, column-major values and store them on each sheet
+        as ColumnarValues (sheet.columns), with typed numeric columns.  Dates
+        come back as serial numbers unless date_time_render is
+        FORMATTED_STRING."""
+        sheets = self.sheets if sheets is None else sheets
+        if not sheets:
+            return
+        response = (
+            self.service_factory.sheets_api_service()
+            .values()
+            .batchGet(
+                spreadsheetId=self.id,
+                ranges=[sheet.encompassing_range() for sheet in sheets],
+                majorDimension="COLUMNS",
+                valueRenderOption="UNFORMATTED_VALUE",
+                dateTimeRenderOption=date_time_render,
+            )
+            .execute()
+        )
+        for sheet, value_range in zip(sheets, response["valueRanges"]):
+            sheet.columns = ColumnarValues.from_columns(
+                value_range.get("values", []), header=header
+            )
+
+    def _load_sheet(self, sheet):
+        self.load_sheets([sheet])
 
     def get_sheet(self, title):
-        for sheet in self.sheets:
-            if sheet.title.lower() == title.lower():
-                return sheet
+        key = title.lower()
+        lookup = self._sheets_by_title
+        sheet = lookup.get(key) if lookup is not None else None
+        if sheet is None or sheet.title.lower() != key:
+            # sheets were added or renamed since the lookup was built
+            self._sheets_by_title = {
+                sheet.title.lower(): sheet for sheet in self.sheets
+            }
+            sheet = self._sheets_by_title.get(key)
+        return sheet
 
     def update_range(self, range, values, input_option="RAW"):
         data = [{"range": range, "values": values}]
@@ -49,6 +204,40 @@ class GoogleSpreadsheet:
             spreadsheetId=self.id, body=batch_update_values_request_body
         ).execute()
 
+    def buffered_writes(self, **kwargs):
+        """A WriteBuffer for this spreadsheet, best used as a context manager:
+
+        with spreadsheet.buffered_writes() as buffer:
+            buffer.set("Sheet1", 2, 3, "value")
+        """
+        return WriteBuffer(self, **kwargs)
+
+    def write_rows(
+        self,
+        sheet_title,
+        rows,
+        start_row=1,
+        block_rows=DEFAULT_BLOCK_ROWS,
+        max_workers=4,
+        input_option="RAW",
+        on_progress=None,
+        max_request_bytes=MAX_REQUEST_BYTES,
+        headroom_rows=DEFAULT_HEADROOM_ROWS,
+    ):
+        """Bulk upload an iterable of rows, see sheet_writes.write_rows."""
+        return write_rows(
+            self,
+            sheet_title,
+            rows,
+            start_row=start_row,
+            block_rows=block_rows,
+            max_workers=max_workers,
+            input_option=input_option,
+            on_progress=on_progress,
+            max_request_bytes=max_request_bytes,
+            headroom_rows=headroom_rows,
+        )
+
     def add_sheet(self, name):
         data = {"requests": [{"addSheet": {"properties": {"title": name}}}]}
         self.service_factory.sheets_api_service().batchUpdate(
@@ -78,6 +267,13 @@ class GoogleSheet:
     meta_row_count: int
     meta_col_count: int
     _values: list = None
+    # set for lazily loaded sheets, called to fetch values on first access
+    _loader: object = field(default=None, repr=False, compare=False)
+    # typed, column-major values, see GoogleSpreadsheet.load_columns
+    columns: ColumnarValues = field(default=None, repr=False, compare=False)
+    # hash indexes by column number, see create_index
+    _indexes: dict = field(default_factory=dict, repr=False, compare=False)
+    header_row: int = field(default=1, repr=False, compare=False)
 
     @classmethod
     def from_response(cls, response):
@@ -98,24 +294,146 @@ class GoogleSheet:
         return sheets
 
     def set_values(self, values):
-        self._values = values
+        if self._values is not None:
+            # replacing loaded values, the columnar view no longer matches
+            self.columns = None
+        self._values = values or None
         self.row_count = len(values)
-        self.col_count = max(len(_) for _ in values)
+        self.col_count = max((len(_) for _ in values), default=0)
+        for index in self._indexes.values():
+            index.build(values, self.header_row + 1)
+
+    def update_properties(self, other):
+        """Copy sheet properties from a freshly fetched GoogleSheet, returning
+        whether the grid itself changed."""
+        grid_changed = (self.title, self.meta_row_count, self.meta_col_count) != (
+            other.title,
+            other.meta_row_count,
+            other.meta_col_count,
+        )
+        self.title = other.title
+        self.index = other.index
+        self.hidden = other.hidden
+        self.sheet_type = other.sheet_type
+        self.meta_row_count = other.meta_row_count
+        self.meta_col_count = other.meta_col_count
+        return grid_changed
 
     def encompassing_range(self):
-        last_col_letter = column_number_to_name(self.meta_col_count)
-        return f"{self.title}!A1:{last_col_letter}{self.meta_row_count}"
+        return str(A1Range(self.title, 1, 1, self.meta_row_count, self.meta_col_count))
+
+    @property
+    def loaded(self):
+        return self._loader is None
+
+    def load(self):
+        if self._loader is not None:
+            self._loader(self)
 
     @property
     def rows(self):
+        self.load()
         return self._values
 
     def get(self, row_idx, col_idx):
+        self.load()
         try:
             return self._values[row_idx - 1][col_idx - 1]
         except IndexError:
             pass
 
+    def set(self, row_idx, col_idx, value):
+        """Set a cell in the local values only, growing them as needed."""
+        self.load()
+        if self._values is None:
+            self._values = []
+        index = self._indexes.get(col_idx) if row_idx > self.header_row else None
+        if index is not None:
+            old_value = cell_value(self._values, row_idx, col_idx)
+            index.check(value, row_idx)
+        while len(self._values) < row_idx:
+            self._values.append([])
+            if len(self._values) > self.header_row:
+                for other in self._indexes.values():
+                    other.add("", len(self._values))
+        row = self._values[row_idx - 1]
+        if len(row) < col_idx:
+            row.extend([""] * (col_idx - len(row)))
+        row[col_idx - 1] = value
+        if self.columns is not None and not self.columns.set(row_idx, col_idx, value):
+            self.columns = None
+        if index is not None:
+            index.remove(old_value, row_idx)
+            index.add(value, row_idx)
+        self.row_count = len(self._values)
+        self.col_count = max(getattr(self, "col_count", 0), len(row))
+
+    def create_index(self, column, unique=False):
+        """Index a column (header name or 1-based number) for find/where.
+        Indexes are kept up to date by set() and set_values()."""
+        self.load()
+        col_idx = self.column_index(column)
+        index = SheetIndex(col_idx, unique=unique)
+        index.build(self._values or [], self.header_row + 1)
+        self._indexes[col_idx] = index
+        return index
+
+    def column_index(self, column):
+        if isinstance(column, int):
+            return column
+        self.load()
+        headers = cell_row(self._values, self.header_row)
+        for idx, name in enumerate(headers, 1):
+            if name == column:
+                return idx
+        for idx, name in enumerate(headers, 1):
+            if str(name).lower() == column.lower():
+                return idx
+        raise KeyError(f"No column {column!r} in the header row of {self.title!r}")
+
+    def find(self, **criteria):
+        """First row whose columns equal the given values, or None."""
+        matches = self.where(**criteria)
+        return matches[0] if matches else None
+
+    def where(self, predicate=None, **criteria):
+        """Rows below the header whose columns equal the given values (use
+        where(**{"Header name": value}) for names that are not identifiers),
+        optionally filtered further by predicate(SheetRow)."""
+        self.load()
+        values = self._values or []
+        conditions = [
+            (self.column_index(column), value) for column, value in criteria.items()
+        ]
+        candidates = None
+        for col_idx, value in conditions:
+            if (index := self._indexes.get(col_idx)) is not None:
+                rows = set(index.lookup(value))
+                candidates = rows if candidates is None else candidates & rows
+        if candidates is None:
+            candidates = range(self.header_row + 1, len(values) + 1)
+        ret = []
+        for row_idx in sorted(candidates):
+            if all(
+                cell_value(values, row_idx, col_idx) == value
+                for col_idx, value in conditions
+            ):
+                row = SheetRow(self.title, row_idx, cell_row(values, row_idx))
+                if predicate is None or predicate(row):
+                    ret.append(row)
+        return ret
+
     def __getitem__(self, address):
         row, col = address_to_coordinates(address)
         return self.get(row, col)
+
+    def __setitem__(self, address, value):
+        row, col = address_to_coordinates(address)
+        self.set(row, col, value)
+
+
+def cell_row(values, row_idx):
+    try:
+        return values[row_idx - 1]
+    except (IndexError, TypeError):
+        return []
@@ -0,0 +1,56 @@
+from contextlib import contextmanager
+import sqlite3
+import threading
+
+STATE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class _SqliteStore:
+    """Plumbing shared by the local SQLite stores.
+
+    One connection is shared by every thread behind a lock.  Subclasses set
+    SCHEMA, created next to a key/value state table for sync cursors, and
+    TABLE, the table whose rows len() counts."""
+
+    SCHEMA = ""
+    TABLE = None
+
+    def __init__(self, path=":memory:"):
+        self.path = path
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._transaction() as conn:
+            conn.executescript(STATE_SCHEMA + self.SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def __len__(self):
+        return self._fetchone(f"SELECT COUNT(*) FROM {self.TABLE}")[0]
+
+    @contextmanager
+    def _transaction(self):
+        """The connection, locked; committed on success, else rolled back."""
+        with self._lock, self._conn:
+            yield self._conn
+
+    def _fetchone(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+
+    def _fetchall(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _state(self, key):
+        row = self._fetchone("SELECT value FROM state WHERE key = ?", (key,))
+        return row[0] if row else None
+
+    def _set_state(self, key, value):
+        # only called inside a _transaction
+        self._conn.execute("INSERT OR REPLACE INTO state VALUES (?, ?)", (key, value))
@@ -1,4 +1,4 @@
-from .service import ServiceFactory
+from .service import ServiceFactory, execute_batch
 
 
 class TaskClient:
@@ -6,7 +6,19 @@ class TaskClient:
         self.token_file = token_file
         self.secrets_file = secrets_file
         self.factory = ServiceFactory(self.token_file, self.secrets_file, scopes=scopes)
-        self.service = self.get_service()
+        self._service = None
+
+    @property
+    def service(self):
+        # built on first use, so constructing a client (e.g. in AsyncTaskClient
+        # on the event loop) doesn't load credentials or build the service
+        if self._service is None:
+            self._service = self.get_service()
+        return self._service
+
+    @service.setter
+    def service(self, value):
+        self._service = value
 
     def get_service(self, refresh=False):
         return self.factory.tasks_api_service(refresh=refresh)
@@ -22,18 +34,32 @@ class TaskClient:
         raise ValueError(f"Tasklist {title!r} not found")
 
     def clear_tasklist(self, tasklist_id):
-        # google tasks().clear method seems to have no effect, so iterate over items
-        # and delete one-by-one
+        # google tasks().clear method seems to have no effect, so delete the items
+        # explicitly, batched to keep the number of round trips down
         # self.service.tasks().clear(tasklist=id).execute()
-        for task in self.list_tasks(tasklist_id):
-            self.delete_task(tasklist_id, task["id"])
+        tasks = self.list_tasks(tasklist_id)
+        results = self.delete_tasks(tasklist_id, [task["id"] for task in tasks])
+        for result in results:
+            if not result.ok:
+                raise result.error
 
     def create_tasklist(self, title):
         return self.service.tasklists().insert(body=title)
 
     def list_tasks(self, tasklist_id):
-        response = self.service.tasks().list(tasklist=tasklist_id).execute()
-        return response["items"]
+        tasks = []
+        page_token = None
+        while True:
+            response = (
+                self.service.tasks()
+                .list(tasklist=tasklist_id, maxResults=100, pageToken=page_token)
+                .execute()
+            )
+            tasks.extend(response.get("items", []))
+            page_token = response.get("nextPageToken")
+            if page_token is None:
+                break
+        return tasks
 
     def insert_task(self, tasklist_id, task):
         return (
@@ -47,3 +73,12 @@ class TaskClient:
 
     def delete_task(self, tasklist_id, task_id):
         return self.service.tasks().delete(tasklist=tasklist_id, task=task_id).execute()
+
+    def delete_tasks(self, tasklist_id, task_ids):
+        """Delete tasks in batches, returning a BatchResult per task id."""
+        task_ids = list(task_ids)
+        requests = [
+            self.service.tasks().delete(tasklist=tasklist_id, task=task_id)
+            for task_id in task_ids
+        ]
+        return execute_batch(self.service, requests, keys=task_ids)
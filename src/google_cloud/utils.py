@@ -1,6 +1,10 @@
+from functools import lru_cache
 import re
 
+_ADDRESS = re.compile(r"([A-Za-z]+)(\d+)")
 
+
+@lru_cache(maxsize=4096)
 def column_number_to_name(n):
     """Number to column name, e.g., 1 = A, 26 = Z, 27 = AA, 703 = AAA."""
     name = ""
@@ -10,6 +14,7 @@ def column_number_to_name(n):
     return name
 
 
+@lru_cache(maxsize=4096)
 def column_name_to_number(name):
     """Excel-style column name to number, e.g., A = 1, Z = 26, AA = 27, AAA = 703."""
     n = 0
@@ -18,8 +23,9 @@ def column_name_to_number(name):
     return n
 
 
+@lru_cache(maxsize=4096)
 def address_to_coordinates(address):
-    if match := re.match(r"([a-z]+)(\d+)", address.lower()):
+    if match := _ADDRESS.match(address):
         column_name = match.group(1)
         row = int(match.group(2))
         return row, column_name_to_number(column_name)
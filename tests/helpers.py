@@ -0,0 +1,224 @@
+"""Test doubles shared by the test modules."""
+
+import datetime
+
+from googleapiclient.errors import HttpError
+import httplib2
+
+from google_cloud.calendar import Calendar
+from google_cloud.ranges import parse_range
+
+UTC = datetime.timezone.utc
+
+
+class FakeRequest:
+    """Stands in for an api request; execute() returns the canned response,
+    or raises it when it is an exception."""
+
+    def __init__(self, response):
+        self.response = response
+
+    def execute(self):
+        if isinstance(self.response, Exception):
+            raise self.response
+        return self.response
+
+
+class FakeFiles:
+    def __init__(self, pages):
+        self.pages = pages
+        self.calls = []
+
+    def list(self, **kwargs):
+        self.calls.append(kwargs)
+        idx = int(kwargs.get("pageToken") or 0)
+        response = {"files": self.pages[idx]}
+        if idx + 1 < len(self.pages):
+            response["nextPageToken"] = str(idx + 1)
+        return FakeRequest(response)
+
+
+class FakeDriveService:
+    def __init__(self, pages):
+        self._files = FakeFiles(pages)
+
+    def files(self):
+        return self._files
+
+
+PAGES = [
+    [{"id": "1", "name": "a"}, {"id": "2", "name": "b"}],
+    [{"id": "3", "name": "c"}],
+]
+
+
+class FakeRevisionDrive:
+    """Answers the drive files.get a spreadsheet makes for its revision."""
+
+    def __init__(self):
+        self.revision = {"version": "1", "modifiedTime": "t1"}
+        self.gets = 0
+
+    def files(self):
+        return self
+
+    def get(self, fileId, fields):
+        self.gets += 1
+        return FakeRequest(dict(self.revision))
+
+
+class FakeValues:
+    def __init__(self, data):
+        self.data = data
+        self.batch_gets = []
+
+    def batchGet(self, spreadsheetId, ranges, **kwargs):
+        self.batch_gets.append(ranges)
+        return FakeRequest(
+            {"valueRanges": [self.data.get(parse_range(r).sheet, {}) for r in ranges]}
+        )
+
+
+class FakeSheetsService:
+    def __init__(self, titles, data):
+        self.titles = titles
+        self._values = FakeValues(data)
+        self.metadata_fields = None
+        self.drive = FakeRevisionDrive()
+
+    def get(self, spreadsheetId, fields=None):
+        self.metadata_fields = fields
+        sheets = [
+            {
+                "properties": {
+                    "sheetId": idx,
+                    "title": title,
+                    "index": idx,
+                    "sheetType": "GRID",
+                    "gridProperties": {"rowCount": 1000, "columnCount": 26},
+                }
+            }
+            for idx, title in enumerate(self.titles)
+        ]
+        return FakeRequest({"properties": {"title": "Book"}, "sheets": sheets})
+
+    def values(self):
+        return self._values
+
+
+def event(id, day, hour, status="confirmed"):
+    return {
+        "id": id,
+        "summary": id,
+        "status": status,
+        "start": {"dateTime": f"2024-01-{day:02d}T{hour:02d}:00:00Z"},
+        "end": {"dateTime": f"2024-01-{day:02d}T{hour + 1:02d}:00:00Z"},
+    }
+
+
+class FakeEvents:
+    def __init__(self, pages):
+        # {calendar_id: [page items, ...]}
+        self.pages = pages
+        self.calls = []
+        # {sync token: items changed since}
+        self.changes = {}
+
+    def list(self, calendarId, pageToken=None, syncToken=None, **kwargs):
+        self.calls.append((calendarId, pageToken, kwargs))
+        if syncToken is not None:
+            if syncToken not in self.changes:
+                raise HttpError(httplib2.Response({"status": 410}), b"gone")
+            return FakeRequest(
+                {"items": self.changes[syncToken], "nextSyncToken": syncToken + "+"}
+            )
+        pages = self.pages[calendarId]
+        idx = int(pageToken or 0)
+        response = {"items": pages[idx]}
+        if idx + 1 < len(pages):
+            response["nextPageToken"] = str(idx + 1)
+        else:
+            response["nextSyncToken"] = f"{calendarId}-token"
+        return FakeRequest(response)
+
+    def instances(self, calendarId, eventId, pageToken=None, **kwargs):
+        self.calls.append((calendarId, pageToken, kwargs))
+        # two weekly instances, one per page
+        if pageToken is None:
+            return FakeRequest(
+                {"items": [event(f"{eventId}_1", 1, 9)], "nextPageToken": "1"}
+            )
+        return FakeRequest({"items": [event(f"{eventId}_8", 8, 9)]})
+
+
+class FakeFreebusy:
+    def __init__(self):
+        self.queries = []
+
+    def query(self, body):
+        self.queries.append(body)
+        return FakeRequest(
+            {
+                "calendars": {
+                    item["id"]: {
+                        "busy": (
+                            [
+                                {
+                                    "start": "2024-01-01T09:00:00Z",
+                                    "end": "2024-01-01T10:00:00Z",
+                                }
+                            ]
+                            if item["id"] != "c7"
+                            else [
+                                {
+                                    "start": "2024-01-01T09:30:00Z",
+                                    "end": "2024-01-01T11:00:00Z",
+                                }
+                            ]
+                        )
+                    }
+                    for item in body["items"]
+                }
+            }
+        )
+
+
+class FakeCalendarService:
+    def __init__(self, pages):
+        self._events = FakeEvents(pages)
+        self._freebusy = FakeFreebusy()
+
+    def events(self):
+        return self._events
+
+    def freebusy(self):
+        return self._freebusy
+
+
+def calendar(id):
+    return Calendar(id, id, UTC)
+
+
+class FakeBatch:
+    def __init__(self, callback, log):
+        self.callback = callback
+        self.requests = []
+        log.append(self)
+
+    def add(self, request, request_id):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        for request_id, request in self.requests:
+            if request == "bad":
+                self.callback(request_id, None, ValueError(request))
+            else:
+                self.callback(request_id, {"id": request}, None)
+
+
+class FakeBatchService:
+    def __init__(self):
+        self.batches = []
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatch(callback, self.batches)
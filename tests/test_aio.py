@@ -0,0 +1,208 @@
+import asyncio
+import datetime
+import threading
+import time
+
+from google_cloud.aio import (
+    AsyncCalendarClient,
+    AsyncDriveClient,
+    AsyncExecutor,
+    AsyncGoogleSpreadsheet,
+    AsyncTaskClient,
+)
+from google_cloud.drive import FileWithId
+from google_cloud.service import ServiceFactory
+from helpers import (
+    PAGES,
+    FakeCalendarService,
+    FakeDriveService,
+    FakeRequest,
+    FakeSheetsService,
+    calendar,
+    event,
+)
+
+
+def test_executor_bounds_requests_in_flight():
+    executor = AsyncExecutor(max_concurrency=2)
+    lock = threading.Lock()
+    running = [0]
+    peak = [0]
+
+    def work():
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+
+    async def main():
+        await asyncio.gather(*(executor.run(work) for _ in range(8)))
+
+    try:
+        asyncio.run(main())
+    finally:
+        executor.close()
+    assert peak[0] == 2
+
+
+def test_drive_iter_files_yields_every_page():
+    client = AsyncDriveClient("", "")
+    service = FakeDriveService(PAGES)
+    client.client.get_service = lambda refresh=False: service
+
+    async def main():
+        async with client:
+            return [file async for file in client.iter_files(parent="root")]
+
+    files = asyncio.run(main())
+    assert files == [FileWithId(f["name"], f["id"]) for page in PAGES for f in page]
+    assert len(service._files.calls) == len(PAGES)
+
+
+def test_calendar_iter_events_parses_every_page():
+    client = AsyncCalendarClient("", "")
+    service = FakeCalendarService(
+        {
+            "a": [
+                [event("a1", 1, 9), event("gone", 1, 10, "cancelled")],
+                [event("a2", 2, 9)],
+            ]
+        }
+    )
+    client.client.get_service = lambda refresh=False: service
+
+    async def main():
+        async with client:
+            return [
+                item
+                async for item in client.iter_events(
+                    calendar("a"),
+                    datetime.datetime(2024, 1, 1),
+                    datetime.datetime(2024, 2, 1),
+                )
+            ]
+
+    events = asyncio.run(main())
+    assert [item.id for item in events] == ["a1", "a2"]
+    assert events[0].start == datetime.datetime(
+        2024, 1, 1, 9, tzinfo=datetime.timezone.utc
+    )
+    assert len(service._events.calls) == 2
+
+
+def test_calendar_list_events_merges_calendars_by_start():
+    client = AsyncCalendarClient("", "", max_concurrency=2)
+    service = FakeCalendarService(
+        {
+            "a": [[event("a1", 1, 9)], [event("a2", 3, 9)]],
+            "b": [[event("b1", 2, 9)]],
+        }
+    )
+    client.client.get_service = lambda refresh=False: service
+
+    async def main():
+        async with client:
+            return await client.list_events(
+                [calendar("a"), calendar("b")],
+                datetime.datetime(2024, 1, 1),
+                datetime.datetime(2024, 2, 1),
+            )
+
+    assert [item.id for item in asyncio.run(main())] == ["a1", "b1", "a2"]
+
+
+def test_spreadsheet_for_id_runs_on_the_client_pool(monkeypatch):
+    service = FakeSheetsService(["One"], {"One": {"values": [["a"]]}})
+    threads = []
+
+    def sheets_api_service(self, refresh=False):
+        threads.append(threading.current_thread().name)
+        return service
+
+    monkeypatch.setattr(ServiceFactory, "sheets_api_service", sheets_api_service)
+    monkeypatch.setattr(
+        ServiceFactory, "drive_api_service", lambda self, refresh=False: service.drive
+    )
+
+    async def main():
+        async with await AsyncGoogleSpreadsheet.for_id("id", "", "") as book:
+            return (await book.get_sheet("One"))["A1"]
+
+    assert asyncio.run(main()) == "a"
+    assert threads and all(name.startswith("google-cloud") for name in threads)
+
+
+def test_spreadsheet_get_sheet_loads_lazy_sheets_on_the_pool(monkeypatch):
+    service = FakeSheetsService(["One"], {"One": {"values": [["a"]]}})
+    monkeypatch.setattr(
+        ServiceFactory, "sheets_api_service", lambda self, refresh=False: service
+    )
+    monkeypatch.setattr(
+        ServiceFactory, "drive_api_service", lambda self, refresh=False: service.drive
+    )
+    load_threads = []
+
+    async def main():
+        async with await AsyncGoogleSpreadsheet.for_id("id", "", "", lazy=True) as book:
+            sheet = book.spreadsheet.get_sheet("One")
+            loader = sheet._loader
+            sheet._loader = lambda sheet: (
+                load_threads.append(threading.current_thread().name),
+                loader(sheet),
+            )
+            sheet = await book.get_sheet("One")
+            return sheet.loaded, sheet["A1"]
+
+    assert asyncio.run(main()) == (True, "a")
+    assert len(load_threads) == 1 and load_threads[0].startswith("google-cloud")
+
+
+class FakeTasks:
+    def __init__(self, pages):
+        self.pages = pages
+
+    def list(self, tasklist, pageToken=None, **kwargs):
+        idx = int(pageToken or 0)
+        response = {"items": self.pages[idx]}
+        if idx + 1 < len(self.pages):
+            response["nextPageToken"] = str(idx + 1)
+        return FakeRequest(response)
+
+
+class FakeTasksService:
+    def __init__(self, pages):
+        self._tasks = FakeTasks(pages)
+
+    def tasks(self):
+        return self._tasks
+
+    def tasklists(self):
+        return self
+
+    def list(self):
+        return FakeRequest({"items": [{"id": "l1", "title": "Inbox"}]})
+
+
+def test_task_client_builds_its_service_off_the_event_loop(monkeypatch):
+    service = FakeTasksService([[{"id": "t1"}, {"id": "t2"}], [{"id": "t3"}]])
+    threads = []
+
+    def tasks_api_service(self, refresh=False):
+        threads.append(threading.current_thread().name)
+        return service
+
+    monkeypatch.setattr(ServiceFactory, "tasks_api_service", tasks_api_service)
+
+    async def main():
+        async with AsyncTaskClient("", "") as client:
+            assert threads == []
+            tasklist = await client.get_tasklist("Inbox")
+            tasks = [task["id"] async for task in client.iter_tasks(tasklist["id"])]
+            return tasks, await client.list_tasks(tasklist["id"])
+
+    tasks, listed = asyncio.run(main())
+    assert tasks == ["t1", "t2", "t3"]
+    assert [task["id"] for task in listed] == tasks
+    assert threads and all(name.startswith("google-cloud") for name in threads)
@@ -0,0 +1,258 @@
+import datetime
+import random
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from google_cloud.calendar import (
+    AvailabilityIndex,
+    Calendar,
+    CalendarClient,
+    Event,
+    IntervalIndex,
+    find_conflicts,
+    parse_events,
+)
+from google_cloud.calendar_store import CalendarStore
+from google_cloud.event_table import EventTable
+from google_cloud.service import ServiceFactory
+from helpers import FakeCalendarService, calendar, event
+
+UTC = datetime.timezone.utc
+
+
+@pytest.fixture
+def calendar_service(monkeypatch):
+    service = FakeCalendarService(
+        {
+            "a": [[event("a1", 1, 9), event("a2", 3, 9)], [event("a3", 5, 9)]],
+            "b": [[event("b1", 2, 9), event("gone", 2, 10, "cancelled")]],
+        }
+    )
+    monkeypatch.setattr(
+        ServiceFactory, "calendar_api_service", lambda self, refresh=False: service
+    )
+    return service
+
+
+def test_list_events_paginates_and_merges_by_start(calendar_service):
+    client = CalendarClient("", "")
+    events = client.list_events(
+        [calendar("a"), calendar("b")],
+        datetime.datetime(2024, 1, 1),
+        datetime.datetime(2024, 2, 1),
+    )
+    assert [e.id for e in events] == ["a1", "b1", "a2", "a3"]
+    calls = calendar_service._events.calls
+    assert len(calls) == 3
+    assert all(
+        kwargs["singleEvents"]
+        and kwargs["orderBy"] == "startTime"
+        and kwargs["maxResults"] == 2500
+        for _, _, kwargs in calls
+    )
+
+
+def test_iter_events_streams_pages_instead_of_listing_everything(
+    calendar_service,
+):
+    calendar_service._events.pages["a"] = [
+        [event(f"a{day}", day, 8)] for day in range(1, 9)
+    ]
+    client = CalendarClient("", "")
+    events = client.iter_events(
+        [calendar("a"), calendar("b")],
+        datetime.datetime(2024, 1, 1),
+        datetime.datetime(2024, 2, 1),
+    )
+    assert next(events).id == "a1"
+    # the first page of each calendar, plus at most one prefetched page of a
+    assert len(calendar_service._events.calls) <= 3
+    assert [e.id for e in events] == ["a2", "b1", "a3", "a4", "a5", "a6", "a7", "a8"]
+
+
+def test_list_event_instances_follows_pages(calendar_service):
+    client = CalendarClient("", "")
+    parent = Event("r", "r", None, None, calendar("a"), UTC, ["RRULE:FREQ=WEEKLY"])
+    instances = client.list_event_instances(
+        parent, datetime.datetime(2024, 1, 1), datetime.datetime(2024, 2, 1)
+    )
+    assert [e.id for e in instances] == ["r_1", "r_8"]
+
+
+def test_sync_applies_deltas_and_resyncs_on_410(calendar_service):
+    store = CalendarStore()
+    client = CalendarClient("", "", store=store)
+    a = calendar("a")
+    assert client.sync([a]) == {"a": 3}
+    assert store.sync_token("a") == "a-token"
+
+    instance = event("a1_x", 4, 9) | {"recurringEventId": "a1"}
+    calendar_service._events.changes["a-token"] = [
+        instance,
+        event("a2", 3, 9, "cancelled"),
+    ]
+    calls = len(calendar_service._events.calls)
+    assert client.sync([a]) == {"a": 2}
+    assert len(calendar_service._events.calls) == calls + 1
+    assert [e.id for e in store.events(a)] == ["a1", "a1_x", "a3"]
+    assert [e.id for e in store.instances(a, "a1")] == ["a1_x"]
+    window = store.events(
+        a,
+        datetime.datetime(2024, 1, 4, tzinfo=UTC),
+        datetime.datetime(2024, 1, 5, tzinfo=UTC),
+    )
+    assert [e.id for e in window] == ["a1_x"]
+
+    # "a-token+" is unknown to the server: start again from a full listing
+    assert client.sync([a]) == {"a": 3}
+    assert [e.id for e in store.events(a)] == ["a1", "a2", "a3"]
+
+
+def test_interval_index_matches_brute_force():
+    rng = random.Random(7)
+    intervals = []
+    for idx in range(500):
+        start = rng.uniform(0, 1000)
+        intervals.append((start, start + rng.uniform(0, 50), idx))
+    index = IntervalIndex(intervals)
+    for _ in range(100):
+        lo = rng.uniform(0, 1000)
+        hi = lo + rng.uniform(0, 30)
+        expected = {item for start, end, item in intervals if start < hi and end > lo}
+        assert {item for _, _, item in index.overlapping(lo, hi)} == expected
+
+
+def at(hour, minute=0):
+    return datetime.datetime(2024, 1, 1, hour, minute, tzinfo=UTC)
+
+
+def test_freebusy_chunks_calendars_and_finds_free_slots(calendar_service):
+    client = CalendarClient("", "")
+    ids = [f"c{idx}" for idx in range(120)]
+    index = client.freebusy(ids, at(8), at(18))
+    assert sorted(len(q["items"]) for q in calendar_service._freebusy.queries) == [
+        20,
+        50,
+        50,
+    ]
+    assert index.busy(at(8), at(18)) == [(at(9), at(11))]
+    assert index.free_slots(at(8), at(18), datetime.timedelta(hours=1)) == [
+        (at(8), at(9)),
+        (at(11), at(18)),
+    ]
+    assert index.free_slots(
+        at(8), at(12), datetime.timedelta(minutes=30), calendar_ids=["c1"]
+    ) == [(at(8), at(9)), (at(10), at(12))]
+    assert [b.calendar_id for b in index.conflicts(at(10, 30), at(11))] == ["c7"]
+    assert index.is_free(at(10), at(11), calendar_ids=["c1", "c2"])
+
+
+def test_events_index_skips_all_day_and_finds_conflicts(calendar_service):
+    client = CalendarClient("", "")
+    a, b = calendar("a"), calendar("b")
+    events = client.list_events([a, b], at(0), datetime.datetime(2024, 2, 1))
+    overlapping = client.list_events([b], at(0), datetime.datetime(2024, 2, 1))[0]
+    overlapping.id = "b1-copy"
+    assert [(x.id, y.id) for x, y in find_conflicts(events + [overlapping])] == [
+        ("b1", "b1-copy")
+    ]
+
+    all_day = Event(
+        "holiday", "holiday", at(0), at(0) + datetime.timedelta(days=1), a, UTC, None
+    )
+    index = AvailabilityIndex.from_events(events + [all_day])
+    assert index.is_free(at(10), at(23))
+    day_two = datetime.datetime(2024, 1, 2, 9, tzinfo=UTC)
+    assert [
+        b.event.id
+        for b in index.conflicts(day_two, day_two + datetime.timedelta(minutes=1))
+    ] == ["b1"]
+
+
+def test_event_times_keep_the_payload_offset():
+    ny = Calendar("ny", "ny", ZoneInfo("America/New_York"))
+    [utc, offset, floating] = parse_events(
+        [
+            event("utc", 1, 10),
+            {
+                "id": "offset",
+                "start": {"dateTime": "2024-01-01T12:00:00+01:00"},
+                "end": {"dateTime": "2024-01-01T13:00:00+01:00"},
+            },
+            {
+                "id": "floating",
+                "start": {"dateTime": "2024-01-01T09:00:00"},
+                "end": {"dateTime": "2024-01-01T10:00:00"},
+            },
+        ],
+        ny,
+        None,
+    )
+    assert utc.start == at(10)
+    assert utc.start.tzinfo is ny.time_zone and utc.start.hour == 5
+    assert offset.start == at(11)
+    assert floating.start == at(14)
+
+    store = CalendarStore()
+    store.replace_calendar(ny, [event("utc", 1, 10)], "token")
+    assert [e.id for e in store.events(ny, at(10, 30), at(12))] == ["utc"]
+    assert store.events(ny, at(5), at(6)) == []
+
+
+def test_availability_mixes_events_and_freebusy_in_other_zones():
+    ny = Calendar("ny", "ny", ZoneInfo("America/New_York"))
+    [meeting] = parse_events(
+        [
+            {
+                "id": "m",
+                "start": {"dateTime": "2024-01-01T09:30:00Z"},
+                "end": {"dateTime": "2024-01-01T10:30:00Z"},
+            }
+        ],
+        ny,
+        None,
+    )
+    index = AvailabilityIndex.from_events([meeting])
+    index.add_freebusy(
+        {
+            "calendars": {
+                "ny": {
+                    "busy": [
+                        {
+                            "start": "2024-01-01T04:00:00-05:00",
+                            "end": "2024-01-01T10:00:00Z",
+                        }
+                    ]
+                }
+            }
+        }
+    )
+    assert index.busy(at(8), at(12)) == [(at(9), at(10, 30))]
+    assert index.free_slots(at(8), at(12), datetime.timedelta(hours=1)) == [
+        (at(8), at(9)),
+        (at(10, 30), at(12)),
+    ]
+    assert [b.event for b in index.conflicts(at(10, 15), at(10, 20))] == [meeting]
+
+
+def test_event_table_round_trips_and_queries_by_time():
+    a = Calendar("a", "a", ZoneInfo("America/New_York"))
+    items = [
+        event("late", 3, 9),
+        event("early", 1, 9),
+        event("gone", 2, 9, "cancelled"),
+        {"id": "day", "start": {"date": "2024-01-02"}, "end": {"date": "2024-01-03"}},
+    ]
+    table = EventTable()
+    table.extend_payloads(items, a)
+    assert len(table) == 3 and table.calendars == [a]
+    assert list(table) == parse_events(items, a, None)
+    assert list(table.all_day) == [0, 0, 1]
+
+    window = table.between(
+        datetime.datetime(2024, 1, 2, 12, tzinfo=a.time_zone),
+        datetime.datetime(2024, 1, 3, 10, tzinfo=a.time_zone),
+    )
+    assert [e.id for e in window] == ["day", "late"]
+    assert list(table.ids) == ["early", "day", "late"]
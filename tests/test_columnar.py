@@ -0,0 +1,33 @@
+from array import array
+import math
+
+import pytest
+
+from google_cloud.columnar import ColumnarValues
+
+RAW_COLUMNS = [
+    ["name", "alice", "bob", "carol"],
+    ["score", 1.5, "", 3],
+    ["flag", True, False],
+]
+
+
+def test_numeric_columns_are_packed_and_padded():
+    values = ColumnarValues.from_columns(RAW_COLUMNS)
+    assert values.names == ["name", "score", "flag"]
+    assert len(values) == 3
+    assert isinstance(values["score"], array)
+    assert values["score"][0] == 1.5 and math.isnan(values["score"][1])
+    assert not values.is_numeric("flag")
+    assert values["flag"] == [True, False, ""]
+
+
+def test_to_records():
+    records = ColumnarValues.from_columns(RAW_COLUMNS).to_records()
+    assert records[2] == {"name": "carol", "score": 3.0, "flag": ""}
+
+
+def test_to_numpy():
+    np = pytest.importorskip("numpy")
+    arrays = ColumnarValues.from_columns(RAW_COLUMNS).to_numpy(["score"])
+    assert np.nansum(arrays["score"]) == 4.5
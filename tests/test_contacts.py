@@ -0,0 +1,237 @@
+from googleapiclient.errors import HttpError
+import httplib2
+import pytest
+
+from google_cloud.contact_store import ContactStore
+from google_cloud.contact_utils import ContactDirectory
+from google_cloud.contacts import ContactsClient
+from google_cloud.service import ServiceFactory
+from helpers import FakeRequest
+
+
+def person(id, email=None, deleted=False):
+    ret = {"resourceName": f"people/{id}"}
+    if email:
+        ret["emailAddresses"] = [{"value": email}]
+    if deleted:
+        ret["metadata"] = {"deleted": True}
+    return ret
+
+
+class FakeConnections:
+    def __init__(self, pages):
+        self.pages = pages
+        self.calls = []
+        # {sync token: people changed since}
+        self.changes = {}
+
+    def list(self, resourceName, pageSize, personFields, **kwargs):
+        self.calls.append(kwargs)
+        if sync_token := kwargs.get("syncToken"):
+            if sync_token not in self.changes:
+                return FakeRequest(
+                    HttpError(
+                        httplib2.Response({"status": 400}),
+                        b'{"error": {"status": "FAILED_PRECONDITION", '
+                        b'"message": "EXPIRED_SYNC_TOKEN"}}',
+                    )
+                )
+            return FakeRequest(
+                {"connections": self.changes[sync_token], "nextSyncToken": "t2"}
+            )
+        idx = int(kwargs.get("pageToken", 0))
+        response = {"connections": self.pages[idx]}
+        if idx + 1 < len(self.pages):
+            response["nextPageToken"] = str(idx + 1)
+        elif kwargs.get("requestSyncToken"):
+            response["nextSyncToken"] = "t1"
+        return FakeRequest(response)
+
+
+class FakePeopleService:
+    def __init__(self, pages):
+        self._connections = FakeConnections(pages)
+        self.batch_deletes = []
+
+    def batchDeleteContacts(self, body):
+        self.batch_deletes.append(body["resourceNames"])
+        if "people/bad" in body["resourceNames"]:
+            return FakeRequest(HttpError(httplib2.Response({"status": 400}), b""))
+        return FakeRequest({})
+
+    def people(self):
+        return self
+
+    def connections(self):
+        return self._connections
+
+
+@pytest.fixture
+def people_service(monkeypatch):
+    service = FakePeopleService(
+        [[person(1, "a@x.com"), person(2, "b@x.com")], [person(3, "c@x.com")]]
+    )
+    monkeypatch.setattr(
+        ServiceFactory, "people_api_service", lambda self, refresh=False: service
+    )
+    return service
+
+
+def test_iter_contacts_streams_pages(people_service):
+    client = ContactsClient("", "")
+    contacts = client.iter_contacts()
+    assert next(contacts)["resourceName"] == "people/1"
+    assert len(people_service._connections.calls) == 1
+    assert [c["resourceName"] for c in client.list()] == [
+        "people/1",
+        "people/2",
+        "people/3",
+    ]
+
+
+def test_list_debug_path_is_configurable(people_service, tmp_path):
+    path = tmp_path / "contacts.json"
+    ContactsClient("", "").list(debug=True, debug_path=path)
+    assert "people/3" in path.read_text()
+
+
+def test_delete_contacts_uses_batch_delete(people_service):
+    client = ContactsClient("", "")
+    contacts = [person(idx) for idx in range(501)] + [person("bad")]
+
+    results = client.delete_contacts(contacts)
+    assert [len(names) for names in people_service.batch_deletes] == [500, 2]
+    assert [result.key for result in results] == [c["resourceName"] for c in contacts]
+    assert sum(result.ok for result in results) == 500
+    assert isinstance(results[-1].error, HttpError)
+
+
+def test_sync_applies_changes_and_resyncs_expired_token(people_service):
+    store = ContactStore()
+    client = ContactsClient("", "", store=store)
+    assert client.sync() == 3
+    assert store.sync_token == "t1"
+
+    people_service._connections.changes["t1"] = [
+        person(2, deleted=True),
+        person(3, "new@x.com"),
+        person(4, "d@x.com"),
+    ]
+    assert client.sync() == 3
+    assert store.sync_token == "t2"
+    assert store.get("people/2") is None
+    assert store.get("people/3")["emailAddresses"] == [{"value": "new@x.com"}]
+    assert len(store) == 3
+
+    # "t2" has expired on the server
+    assert client.sync() == 3
+    assert [c["resourceName"] for c in store.list()] == [
+        "people/1",
+        "people/2",
+        "people/3",
+    ]
+
+    # a token issued for other fields isn't reused
+    calls = len(people_service._connections.calls)
+    client.sync(include_memberships=True)
+    assert "syncToken" not in people_service._connections.calls[calls]
+
+
+def test_interrupted_resync_keeps_the_previous_contacts(people_service):
+    store = ContactStore()
+    client = ContactsClient("", "", store=store)
+    client.sync()
+    connections = people_service._connections
+    list_page = connections.list
+
+    def fail_second_page(resourceName, pageSize, personFields, **kwargs):
+        if kwargs.get("pageToken") == "1":
+            return FakeRequest(HttpError(httplib2.Response({"status": 503}), b""))
+        return list_page(resourceName, pageSize, personFields, **kwargs)
+
+    connections.list = fail_second_page
+    # other fields, so this lists everyone again
+    with pytest.raises(HttpError):
+        client.sync(include_phone_numbers=True)
+    assert len(store) == 3
+    assert (store.sync_token, store.person_fields) == ("t1", "names,emailAddresses")
+
+
+def test_contact_directory_indexes_and_updates():
+    groups = [
+        {"resourceName": "contactGroups/f", "name": "Friends"},
+        {"resourceName": "contactGroups/w", "name": "Work"},
+    ]
+    ann = {
+        "resourceName": "people/1",
+        "names": [{"displayName": "Ann Lee"}],
+        "emailAddresses": [{"value": " Ann@X.com"}],
+        "phoneNumbers": [{"value": "(555) 010-0000", "canonicalForm": "+15550100000"}],
+        "memberships": [
+            {"contactGroupMembership": {"contactGroupResourceName": "contactGroups/f"}}
+        ],
+    }
+    bob = {
+        "resourceName": "people/2",
+        "emailAddresses": [{"value": "bob@x.com"}],
+        "phoneNumbers": [{"value": "+44 20 7946 0000"}],
+    }
+    directory = ContactDirectory([ann, bob], groups)
+
+    assert directory.find_by_email("ann@x.com") is ann
+    assert directory.find_by_phone("+1 555 010 0000") == [ann]
+    assert directory.find_by_phone("+442079460000") == [bob]
+    assert directory.find_by_name("ann lee") == [ann]
+    assert directory.members("friends") == [ann]
+    assert directory.group("WORK")["resourceName"] == "contactGroups/w"
+    assert directory.email_lookup() == {"ann@x.com": ann, "bob@x.com": bob}
+
+    moved = ann | {
+        "emailAddresses": [{"value": "ann@y.com"}],
+        "memberships": [
+            {"contactGroupMembership": {"contactGroupResourceName": "contactGroups/w"}}
+        ],
+    }
+    directory.update(moved)
+    assert directory.find_by_email("ann@x.com") is None
+    assert directory.find_by_email("ann@y.com") is moved
+    assert directory.members("friends") == []
+    assert directory.members("contactGroups/w") == [moved]
+
+    directory.remove("people/1")
+    assert len(directory) == 1
+    assert directory.members("Work") == []
+
+
+def test_contact_helpers_match_directory_lookups():
+    from google_cloud.contact_utils import (
+        contacts_as_email_lookup,
+        filter_contacts_by_group,
+        find_group_by_name,
+    )
+
+    groups = [{"resourceName": "contactGroups/f", "name": "Friends"}]
+    mine = {
+        "contactGroupMembership": {
+            "contactGroupResourceName": "contactGroups/myContacts"
+        }
+    }
+    ann = {
+        "resourceName": "people/1",
+        "emailAddresses": [{"value": "Ann@X.com"}],
+        "memberships": [
+            mine,
+            {"contactGroupMembership": {"contactGroupResourceName": "contactGroups/f"}},
+        ],
+    }
+    bob = {"resourceName": "people/2", "memberships": [mine]}
+    directory = ContactDirectory([ann, bob], groups)
+
+    # system groups aren't in the groups listing, but memberships still match
+    assert directory.members("contactGroups/myContacts") == [ann, bob]
+    assert directory.members("no such group") == []
+
+    assert find_group_by_name(groups, "friends") is groups[0]
+    assert find_group_by_name(groups, "family") is None
+    assert filter_contacts_by_group([ann, bob], groups[0]) == [ann]
+    assert contacts_as_email_lookup([ann, bob]) == {"ann@x.com": ann}
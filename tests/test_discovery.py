@@ -0,0 +1,92 @@
+import json
+import os
+import threading
+
+from googleapiclient.errors import UnknownApiNameOrVersion
+import pytest
+
+from google_cloud import discovery
+from google_cloud.discovery import DiscoveryStore, SERVICE_APIS
+
+
+def test_pinned_document_takes_precedence(tmp_path):
+    pinned = tmp_path / "pinned"
+    pinned.mkdir()
+    (pinned / "drive.v3.json").write_text(json.dumps({"revision": "pinned"}))
+    store = DiscoveryStore(cache_dir=tmp_path / "cache", pinned_dir=pinned)
+    assert store.document("drive", "v3") == {"revision": "pinned"}
+
+
+def test_pin_writes_all_service_apis_and_builds_offline(tmp_path):
+    store = DiscoveryStore(
+        cache_dir=tmp_path / "cache",
+        pinned_dir=tmp_path / "pinned",
+        allow_network=False,
+    )
+    store.pin()
+    for name, version in SERVICE_APIS:
+        assert (tmp_path / "pinned" / f"{name}.{version}.json").exists()
+
+    offline = DiscoveryStore(
+        cache_dir=tmp_path / "cache",
+        pinned_dir=tmp_path / "pinned",
+        allow_network=False,
+    )
+    service = offline.build("tasks", "v1", developerKey="key")
+    assert hasattr(service, "tasklists")
+
+
+def test_default_store_is_created_once_across_threads(monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    monkeypatch.setattr(discovery, "_default_store", None)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        stores = list(pool.map(lambda _: discovery.default_store(), range(32)))
+    assert all(store is stores[0] for store in stores)
+
+
+def unbundled(name, version):
+    return None
+
+
+def test_stale_cache_is_used_when_the_fetch_fails(tmp_path, monkeypatch):
+    monkeypatch.setattr(discovery.discovery_cache, "get_static_doc", unbundled)
+
+    def server_error(name, version):
+        raise UnknownApiNameOrVersion(f"name: {name}  version: {version} (HTTP 503)")
+
+    monkeypatch.setattr(discovery, "_fetch", server_error)
+    store = DiscoveryStore(cache_dir=tmp_path, max_age=60)
+    with pytest.raises(UnknownApiNameOrVersion):
+        store.document("drive", "v3")
+
+    cached = store.cache_path("drive", "v3")
+    cached.parent.mkdir(parents=True)
+    cached.write_text(json.dumps({"revision": "stale"}))
+    os.utime(cached, (0, 0))
+    assert store.document("drive", "v3") == {"revision": "stale"}
+
+
+def test_document_fetches_outside_the_lock(tmp_path, monkeypatch):
+    monkeypatch.setattr(discovery.discovery_cache, "get_static_doc", unbundled)
+    store = DiscoveryStore(cache_dir=tmp_path)
+    fetching = threading.Event()
+    release = threading.Event()
+
+    def fetch(name, version):
+        if name == "drive":
+            fetching.set()
+            assert release.wait(5)
+        return json.dumps({"name": name})
+
+    monkeypatch.setattr(discovery, "_fetch", fetch)
+    slow = threading.Thread(target=store.document, args=("drive", "v3"))
+    slow.start()
+    try:
+        assert fetching.wait(5)
+        # answered while drive's fetch is still in flight
+        assert store.document("tasks", "v1") == {"name": "tasks"}
+    finally:
+        release.set()
+        slow.join()
+    assert store.document("drive", "v3") == {"name": "drive"}
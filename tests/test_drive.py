@@ -0,0 +1,444 @@
+import json
+
+import httplib2
+import pytest
+
+from google_cloud.drive import DriveClient, FileWithId
+from helpers import PAGES, FakeDriveService, FakeRequest
+
+
+def make_client(pages):
+    client = DriveClient(token_file="", secrets_file="")
+    service = FakeDriveService(pages)
+    client.get_service = lambda refresh=False: service
+    return client, service
+
+
+def test_iter_files_streams_pages_with_page_size_and_order():
+    client, service = make_client(PAGES)
+    files = list(client.iter_files(parent="root", order_by="name"))
+    assert files == [FileWithId("a", "1"), FileWithId("b", "2"), FileWithId("c", "3")]
+    assert [call["pageSize"] for call in service.files().calls] == [1000, 1000]
+    assert service.files().calls[0]["orderBy"] == "name"
+    assert "'root' in parents" in service.files().calls[0]["q"]
+
+
+def test_iter_file_pages_resumes_from_token():
+    client, _ = make_client(PAGES)
+    first = next(client.iter_file_pages())
+    resumed = list(client.iter_file_pages(page_token=first.next_page_token))
+    assert [f.id for page in resumed for f in page.files] == ["3"]
+
+
+def test_page_size_is_bounded():
+    client, _ = make_client(PAGES)
+    with pytest.raises(ValueError):
+        client.list_files(page_size=5000)
+
+
+class FakeTreeFiles:
+    def __init__(self, files):
+        self.files = files
+        self.queries = []
+
+    def list(self, q, **kwargs):
+        self.queries.append(q)
+        matches = [
+            file
+            for file in self.files
+            if any(f"'{parent}' in parents" in q for parent in file["parents"])
+        ]
+        return FakeRequest({"files": matches})
+
+
+def test_tree_indexes_paths_with_one_query_per_level():
+    folder = "application/vnd.google-apps.folder"
+    files = FakeTreeFiles(
+        [
+            {"id": "a", "name": "a", "mimeType": folder, "parents": ["root"]},
+            {"id": "x", "name": "x.txt", "mimeType": "text/plain", "parents": ["root"]},
+            {"id": "b", "name": "b", "mimeType": folder, "parents": ["a"]},
+            {"id": "c", "name": "c.png", "mimeType": "image/png", "parents": ["b"]},
+        ]
+    )
+    client = DriveClient(token_file="", secrets_file="")
+    service = FakeDriveService([])
+    service._files = files
+    client.get_service = lambda refresh=False: service
+
+    tree = client.tree("root")
+    assert tree.lookup("a/b/c.png") == FileWithId("c.png", "c")
+    assert tree.parent("c").id == "b"
+    assert len(tree) == 4
+    assert len(files.queries) == 3  # one per level of folders
+
+
+def test_tree_is_independent_of_listing_order_and_keeps_every_parent():
+    folder = "application/vnd.google-apps.folder"
+    files = [
+        {"id": "a", "name": "a", "mimeType": folder, "parents": ["root"]},
+        {"id": "b", "name": "b", "mimeType": folder, "parents": ["root"]},
+        {"id": "s", "name": "shared", "mimeType": "text/plain", "parents": ["a", "b"]},
+        {"id": "d2", "name": "dup", "mimeType": "text/plain", "parents": ["root"]},
+        {"id": "d1", "name": "dup", "mimeType": "text/plain", "parents": ["root"]},
+    ]
+    trees = []
+    for listing in (files, files[::-1]):
+        client = DriveClient(token_file="", secrets_file="")
+        service = FakeDriveService([])
+        service._files = FakeTreeFiles(listing)
+        client.get_service = lambda refresh=False, service=service: service
+        trees.append(client.tree("root"))
+
+    first, second = trees
+    assert first.paths == second.paths
+    assert first.lookup("dup") == FileWithId("dup", "d1")
+    assert [node.id for node in first.parents("s")] == ["a", "b"]
+    assert [node.id for node in first.children("b")] == ["s"]
+    assert [node.id for node in first.children("root")] == ["a", "b", "d1", "d2"]
+
+
+def test_mimetype_for_path():
+    from pathlib import Path
+
+    from google_cloud.drive import mimetype_for_path
+
+    assert mimetype_for_path(Path("a.JPG")) == "image/jpeg"
+    assert mimetype_for_path(Path("a.png")) == "image/png"
+    assert mimetype_for_path(Path("report.pdf")) == "application/pdf"
+    with pytest.raises(ValueError):
+        mimetype_for_path(Path("no-extension"))
+
+
+def test_upload_manager_skips_unchanged_files(tmp_path):
+    from google_cloud.drive_upload import UploadManager, file_md5
+
+    path = tmp_path / "photo.png"
+    path.write_bytes(b"png bytes")
+
+    class FakeClient:
+        def list_files(self, parent=None, fields=None):
+            return [{"id": "9", "name": "photo.png", "md5Checksum": file_md5(path)}]
+
+    [result] = UploadManager(FakeClient()).upload([path], parent="folder")
+    assert result.skipped
+    assert result.file == FileWithId("photo.png", "9")
+
+
+class FakeUploadHttp:
+    def __init__(self, received=None):
+        # bytes the server already holds for the saved session
+        self.received = received
+        self.calls = []
+
+    def request(self, uri, method="GET", body=None, headers=None):
+        self.calls.append((uri, method, headers))
+        if method == "POST":
+            return httplib2.Response({"status": 200, "location": "session-1"}), b""
+        if self.received is None:
+            return httplib2.Response({"status": 404}), b"gone"
+        resp = {"status": 308, "range": f"bytes=0-{self.received - 1}"}
+        return httplib2.Response(resp), b""
+
+
+class FakeUploadRequest:
+    def __init__(self, media, http, fail_first_chunk=False):
+        self.media = media
+        self.http = http
+        self.fail_first_chunk = fail_first_chunk
+        self.uri = "upload-uri"
+        self.method = "POST"
+        self.body = "{}"
+        self.headers = {}
+        self.resumable_uri = None
+        self.resumable_progress = 0
+        self.chunks = []
+
+    def next_chunk(self):
+        assert self.resumable_uri is not None
+        if self.fail_first_chunk:
+            self.fail_first_chunk = False
+            raise ConnectionResetError()
+        end = min(self.resumable_progress + self.media.chunksize(), self.media.size())
+        self.chunks.append((self.resumable_progress, end))
+        self.resumable_progress = end
+        if end < self.media.size():
+            return None, None
+        return None, {"id": "new"}
+
+
+def make_uploader(tmp_path, http, fail_first_chunk=False, max_retries=0):
+    from google_cloud.drive_upload import CHUNK_ALIGNMENT, UploadManager
+    from google_cloud.ratelimit import ApiExecutor, Quota, RateLimiter, RetryPolicy
+
+    executor = ApiExecutor(RateLimiter(Quota(1000, 1)), RetryPolicy(max_retries))
+    executor._sleep = lambda seconds: None
+    manager = UploadManager(
+        None,
+        state_file=tmp_path / "sessions.json",
+        chunk_size=CHUNK_ALIGNMENT,
+        skip_unchanged=False,
+        executor=executor,
+    )
+    requests = []
+
+    class Files:
+        def create(self, body, media_body, fields):
+            request = FakeUploadRequest(media_body, http, fail_first_chunk)
+            requests.append(request)
+            return request
+
+    class Service:
+        def files(self):
+            return Files()
+
+    class Client:
+        def get_service(self):
+            return Service()
+
+    manager.client = Client()
+    return manager, requests
+
+
+def test_upload_saves_session_before_first_chunk(tmp_path):
+    from google_cloud.drive_upload import CHUNK_ALIGNMENT
+
+    path = tmp_path / "big.bin"
+    path.write_bytes(b"x" * (CHUNK_ALIGNMENT * 3))
+    manager, _ = make_uploader(tmp_path, FakeUploadHttp(), fail_first_chunk=True)
+    with pytest.raises(ConnectionResetError):
+        manager._upload(path, "folder", "md5")
+    [session] = json.loads((tmp_path / "sessions.json").read_text()).values()
+    assert session == {"uri": "session-1", "md5": "md5"}
+
+
+def test_upload_resumes_saved_session_and_clears_it(tmp_path):
+    from google_cloud.drive_upload import CHUNK_ALIGNMENT
+
+    path = tmp_path / "big.bin"
+    path.write_bytes(b"x" * (CHUNK_ALIGNMENT * 3))
+    http = FakeUploadHttp(received=CHUNK_ALIGNMENT * 2)
+    manager, requests = make_uploader(tmp_path, http)
+    key = f"{path.resolve()}::folder"
+    manager.sessions.save(key, "session-1", "md5")
+
+    file = manager._upload(path, "folder", "md5")
+    assert file == FileWithId("big.bin", "new")
+    [(uri, method, headers)] = http.calls
+    assert (uri, method) == ("session-1", "PUT")
+    assert headers["Content-Range"] == f"bytes */{CHUNK_ALIGNMENT * 3}"
+    # only the chunk the server didn't have was sent
+    assert requests[0].chunks == [(CHUNK_ALIGNMENT * 2, CHUNK_ALIGNMENT * 3)]
+    assert manager.sessions.get(key) is None
+    assert json.loads((tmp_path / "sessions.json").read_text()) == {}
+
+
+def test_upload_retries_a_failed_chunk_from_the_server_offset(tmp_path):
+    from google_cloud.drive_upload import CHUNK_ALIGNMENT
+
+    path = tmp_path / "big.bin"
+    path.write_bytes(b"x" * (CHUNK_ALIGNMENT * 3))
+    http = FakeUploadHttp(received=CHUNK_ALIGNMENT)
+    manager, requests = make_uploader(
+        tmp_path, http, fail_first_chunk=True, max_retries=2
+    )
+
+    assert manager._upload(path, "folder", "md5").id == "new"
+    assert [method for _, method, _ in http.calls] == ["POST", "PUT"]
+    assert requests[0].chunks == [
+        (CHUNK_ALIGNMENT, CHUNK_ALIGNMENT * 2),
+        (CHUNK_ALIGNMENT * 2, CHUNK_ALIGNMENT * 3),
+    ]
+
+
+def test_upload_reports_transport_errors_per_file(tmp_path):
+    path = tmp_path / "a.bin"
+    path.write_bytes(b"x")
+
+    class FailingHttp(FakeUploadHttp):
+        def request(self, uri, method="GET", body=None, headers=None):
+            raise httplib2.ServerNotFoundError("no dns")
+
+    manager, _ = make_uploader(tmp_path, FailingHttp())
+    [result] = manager.upload([path], parent="folder")
+    assert isinstance(result.error, httplib2.ServerNotFoundError)
+
+
+def test_upload_restarts_when_saved_session_expired(tmp_path):
+    from google_cloud.drive_upload import CHUNK_ALIGNMENT
+
+    path = tmp_path / "big.bin"
+    path.write_bytes(b"x" * CHUNK_ALIGNMENT)
+    http = FakeUploadHttp()
+    manager, requests = make_uploader(tmp_path, http)
+    key = f"{path.resolve()}::folder"
+    manager.sessions.save(key, "expired", "md5")
+
+    assert manager._upload(path, "folder", "md5").id == "new"
+    assert [method for _, method, _ in http.calls] == ["PUT", "POST"]
+    assert requests[-1].chunks == [(0, CHUNK_ALIGNMENT)]
+    assert manager.sessions.get(key) is None
+
+
+def test_download_to_path_fetches_large_blobs_in_ranges(tmp_path):
+    blob = bytes(range(256)) * 40
+
+    class MediaRequest:
+        def __init__(self):
+            self.headers = {}
+
+        def execute(self):
+            start, end = self.headers["range"][len("bytes=") :].split("-")
+            return blob[int(start) : int(end) + 1]
+
+    class Files:
+        def get(self, fileId, fields):
+            return FakeRequest({"mimeType": "image/png", "size": str(len(blob))})
+
+        def get_media(self, fileId):
+            return MediaRequest()
+
+    client = DriveClient(token_file="", secrets_file="")
+    service = FakeDriveService([])
+    service._files = Files()
+    client.get_service = lambda refresh=False: service
+
+    path = tmp_path / "blob.png"
+    client.download_to_path("id", path, part_size=1000)
+    assert path.read_bytes() == blob
+
+
+def test_diff_permissions_is_minimal_and_leaves_owners_alone():
+    from google_cloud.drive import Grant, diff_permissions
+
+    current = [
+        {"id": "o", "type": "user", "role": "owner", "emailAddress": "me@x.com"},
+        {"id": "1", "type": "user", "role": "reader", "emailAddress": "A@x.com"},
+        {"id": "2", "type": "user", "role": "writer", "emailAddress": "b@x.com"},
+        {"id": "3", "type": "anyone", "role": "reader"},
+    ]
+    grants = [
+        Grant("user", "writer", "a@x.com"),
+        Grant("user", "writer", "b@x.com"),
+        Grant("domain", "reader", domain="x.com"),
+    ]
+    report = diff_permissions("f", current, grants)
+    assert report.to_update == [("1", "writer")]
+    assert report.to_delete == ["3"]
+    assert report.to_create == [Grant("domain", "reader", domain="x.com")]
+
+
+def test_create_permission_request_omits_missing_email_address():
+    class Permissions:
+        def create(self, fileId, sendNotificationEmail, body):
+            return body
+
+    class Service:
+        def permissions(self):
+            return Permissions()
+
+    client = DriveClient(token_file="", secrets_file="")
+    domain = client._create_permission_request(
+        Service(), "f", "reader", "domain", None, domain="example.com"
+    )
+    assert domain == {"role": "reader", "type": "domain", "domain": "example.com"}
+    user = client._create_permission_request(
+        Service(), "f", "writer", "user", "a@example.com"
+    )
+    assert user["emailAddress"] == "a@example.com"
+
+
+class FakePermissions:
+    """Direct permissions per file; children also list their folder's
+    permissions as inherited, like drive does."""
+
+    def __init__(self, direct, parents):
+        self.direct = direct
+        self.parents = parents
+        self.created = 0
+
+    def list(self, fileId, fields, pageToken=None):
+        perms = list(self.direct[fileId])
+        if parent := self.parents.get(fileId):
+            perms += [
+                dict(perm, permissionDetails=[{"inherited": True}])
+                for perm in self.direct[parent]
+                if perm["role"] != "owner"
+            ]
+        return FakeRequest({"permissions": perms})
+
+    def create(self, fileId, sendNotificationEmail, body):
+        def run():
+            self.created += 1
+            self.direct[fileId].append(dict(body, id=f"new{self.created}"))
+
+        return run
+
+    def delete(self, fileId, permissionId):
+        def run():
+            if not any(perm["id"] == permissionId for perm in self.direct[fileId]):
+                raise ValueError("inherited permissions can't be deleted")
+            self.direct[fileId] = [
+                perm for perm in self.direct[fileId] if perm["id"] != permissionId
+            ]
+
+        return run
+
+
+class FakeApplyBatch:
+    def __init__(self, callback):
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        for request_id, request in self.requests:
+            try:
+                self.callback(request_id, request(), None)
+            except ValueError as err:
+                self.callback(request_id, None, err)
+
+
+def make_permission_client():
+    folder = "application/vnd.google-apps.folder"
+    owner = {"id": "o", "type": "user", "role": "owner", "emailAddress": "me@x.com"}
+    old = {"id": "old", "type": "user", "role": "reader", "emailAddress": "old@x.com"}
+    permissions = FakePermissions({"a": [owner], "s": [owner, old]}, {"s": "a"})
+    service = FakeDriveService([])
+    service._files = FakeTreeFiles(
+        [{"id": "s", "name": "s", "mimeType": folder, "parents": ["a"]}]
+    )
+    service.permissions = lambda: permissions
+    service.new_batch_http_request = lambda callback: FakeApplyBatch(callback)
+    client = DriveClient(token_file="", secrets_file="")
+    client.get_service = lambda refresh=False: service
+    return client, permissions
+
+
+def test_reconcile_subtree_relies_on_inherited_grants():
+    from google_cloud.drive import Grant
+
+    grants = [Grant("user", "writer", "new@x.com")]
+
+    client, _ = make_permission_client()
+    planned = client.reconcile_permissions({"a": grants}, subtree=True, dry_run=True)
+    assert [(r.file_id, r.to_create, r.to_delete) for r in planned] == [
+        ("a", grants, []),
+        ("s", [], ["old"]),
+    ]
+
+    client, permissions = make_permission_client()
+    reports = client.reconcile_permissions({"a": grants}, subtree=True)
+    assert [(r.file_id, r.to_create, r.to_delete) for r in reports] == [
+        ("a", grants, []),
+        ("s", [], ["old"]),
+    ]
+    assert not any(report.errors for report in reports)
+    # the grant lives on the folder only, and the child keeps just its owner
+    assert [perm["emailAddress"] for perm in permissions.direct["a"]] == [
+        "me@x.com",
+        "new@x.com",
+    ]
+    assert [perm["id"] for perm in permissions.direct["s"]] == ["o"]
@@ -0,0 +1,88 @@
+import datetime
+
+from google_cloud.drive import DriveClient, FileWithId
+from google_cloud.drive_mirror import DriveMirror
+from helpers import FakeRequest
+
+
+def file(id, name, parent, modified="2024-01-01T00:00:00.000Z"):
+    return {
+        "id": id,
+        "name": name,
+        "parents": [parent],
+        "mimeType": "text/plain",
+        "modifiedTime": modified,
+    }
+
+
+def test_changes_update_and_remove_files():
+    mirror = DriveMirror()
+    mirror.replace_all([file("1", "a", "root"), file("2", "b", "root")], "10")
+    assert mirror.page_token == "10"
+
+    applied = mirror.apply_changes(
+        [
+            {"fileId": "1", "removed": True},
+            {"fileId": "2", "file": dict(file("2", "b", "root"), trashed=True)},
+            {"fileId": "3", "file": file("3", "c", "other", "2024-06-01T00:00:00Z")},
+            {"changeType": "drive", "driveId": "d"},
+        ],
+        "11",
+    )
+    assert applied == 3
+    assert mirror.page_token == "11"
+    assert mirror.list_files(parent="root") == []
+    assert mirror.list_files(parent="other") == [FileWithId("c", "3")]
+
+
+def test_mirror_answers_modified_after_and_fields():
+    mirror = DriveMirror()
+    mirror.replace_all(
+        [
+            file("1", "old", "root", "2023-01-01T00:00:00.000Z"),
+            file("2", "new", "root", "2024-06-01T00:00:00.000Z"),
+        ],
+        "1",
+    )
+    recent = mirror.list_files(
+        modified_after=datetime.datetime(2024, 1, 1), fields=("id", "parents")
+    )
+    assert recent == [{"id": "2", "parents": ["root"]}]
+
+
+class FakeSyncService:
+    def __init__(self, files):
+        self.listed = files
+        self.list_calls = 0
+
+    def changes(self):
+        return self
+
+    def getStartPageToken(self):
+        return FakeRequest({"startPageToken": "5"})
+
+    def files(self):
+        return self
+
+    def get(self, fileId, fields=None):
+        assert fileId == "root"
+        return FakeRequest({"id": "0AbcRoot"})
+
+    def list(self, **kwargs):
+        self.list_calls += 1
+        return FakeRequest({"files": self.listed})
+
+
+def test_client_uses_mirror_only_once_synced_and_resolves_root():
+    service = FakeSyncService([file("1", "a", "0AbcRoot"), file("2", "b", "f")])
+    client = DriveClient("", "", mirror=DriveMirror())
+    client.get_service = lambda refresh=False: service
+
+    # nothing synced yet, so the api answers
+    assert len(client.list_files(parent="root")) == 2
+    assert service.list_calls == 1
+
+    assert client.sync() == 2
+    assert client.mirror.root_id == "0AbcRoot"
+    assert client.list_files(parent="root") == [FileWithId("a", "1")]
+    assert service.list_calls == 2
@@ -0,0 +1,62 @@
+import pytest
+
+from google_cloud.ranges import (
+    A1Range,
+    column_names,
+    column_numbers,
+    merge_ranges,
+    parse_cell,
+    parse_range,
+)
+
+
+@pytest.mark.parametrize(
+    "text,expected",
+    [
+        ("B2", A1Range(None, 2, 2, 2, 2)),
+        ("Sheet1!B2:D40", A1Range("Sheet1", 2, 2, 40, 4)),
+        ("'My ''Data'''!$A$1:C", A1Range("My 'Data'", 1, 1, None, 3)),
+        ("A:C", A1Range(None, 1, 1, None, 3)),
+        ("Sheet1!2:5", A1Range("Sheet1", 2, 1, 5, None)),
+        ("A5:C", A1Range(None, 5, 1, None, 3)),
+        ("Sheet1", A1Range("Sheet1")),
+    ],
+)
+def test_parse_range_round_trips(text, expected):
+    parsed = parse_range(text)
+    assert parsed == expected
+    assert parse_range(str(parsed)) == parsed
+
+
+def test_parse_invalid():
+    with pytest.raises(ValueError):
+        parse_range("Sheet1!B2:?")
+    with pytest.raises(ValueError):
+        parse_cell("B")
+    assert parse_cell("$AA$10") == (10, 27)
+
+
+def test_intersection_and_union():
+    a = parse_range("S!A1:C10")
+    assert a.intersection(parse_range("S!B5:Z")) == parse_range("S!B5:C10")
+    assert a.intersection(parse_range("S!D1:D2")) is None
+    assert a.intersection(parse_range("T!A1:C10")) is None
+    assert a.union(parse_range("S!A11:C20")) == parse_range("S!A1:C20")
+    assert a.union(parse_range("S!D1:D10")) == parse_range("S!A1:D10")
+    assert a.union(parse_range("S!D2:D10")) is None
+    assert merge_ranges(
+        [parse_range(r) for r in ("S!A1:A2", "S!B3:B4", "S!A3:A4", "S!B1:B2")]
+    ) == [parse_range("S!A1:B4")]
+
+
+def test_split():
+    pieces = parse_range("S!A1:B10").split_rows(4)
+    assert [str(p) for p in pieces] == ["'S'!A1:B4", "'S'!A5:B8", "'S'!A9:B10"]
+    assert len(parse_range("A1:J10").split_cells(30)) == 4
+    with pytest.raises(ValueError):
+        parse_range("A:B").split_rows(2)
+
+
+def test_column_conversion():
+    assert column_names([1, 26, 27, 703]) == ["A", "Z", "AA", "AAA"]
+    assert column_numbers(["a", "Z", "AA", "AAA"]) == [1, 26, 27, 703]
@@ -0,0 +1,99 @@
+import ssl
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from google_cloud.ratelimit import (
+    ApiExecutor,
+    Quota,
+    RateLimiter,
+    RetryPolicy,
+    is_retryable,
+)
+
+
+def http_error(status, content=b"", headers=None):
+    resp = httplib2.Response({"status": status, **(headers or {})})
+    return HttpError(resp, content)
+
+
+def make_executor(max_retries=5):
+    executor = ApiExecutor(RateLimiter(Quota(100, 1)), RetryPolicy(max_retries))
+    executor.sleeps = []
+    executor._sleep = executor.sleeps.append
+    return executor
+
+
+def test_retries_honor_retry_after_and_throttle():
+    executor = make_executor()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if len(calls) == 1:
+            raise http_error(429, headers={"retry-after": "7"})
+        return "ok"
+
+    assert executor.call(fn) == "ok"
+    assert executor.sleeps == [7.0]
+    assert executor.limiter.rate < executor.limiter.max_rate
+
+
+def test_user_rate_limit_403_is_retried_but_other_403s_are_not():
+    executor = make_executor()
+    content = b'{"error": {"errors": [{"reason": "userRateLimitExceeded"}]}}'
+    responses = [http_error(403, content), "ok"]
+
+    def fn():
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    assert executor.call(fn) == "ok"
+
+    def forbidden():
+        raise http_error(403, b'{"error": {"errors": [{"reason": "forbidden"}]}}')
+
+    with pytest.raises(HttpError):
+        executor.call(forbidden)
+    assert len(executor.sleeps) == 1
+
+
+def test_gives_up_after_max_retries():
+    executor = make_executor(max_retries=2)
+
+    def fn():
+        raise http_error(503)
+
+    with pytest.raises(HttpError):
+        executor.call(fn)
+    assert len(executor.sleeps) == 2
+
+
+@pytest.mark.parametrize(
+    "err",
+    [
+        httplib2.ServerNotFoundError("dns"),
+        ssl.SSLError("connection dropped"),
+        ConnectionResetError(),
+        TimeoutError(),
+    ],
+)
+def test_transport_errors_are_retried(err):
+    executor = make_executor()
+    responses = [err, "ok"]
+
+    def fn():
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    assert executor.call(fn) == "ok"
+    assert len(executor.sleeps) == 1
+
+
+def test_certificate_errors_are_not_retried():
+    assert not is_retryable(ssl.SSLCertVerificationError("bad cert"))
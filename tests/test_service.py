@@ -1,4 +1,5 @@
 from google_cloud.service import ServiceFactory, DEFAULT_SCOPES
+from helpers import FakeBatchService
 
 
 def test_default_scopes_when_no_scopes_passed():
@@ -15,3 +16,134 @@ def test_passed_in_scopes():
     scopes = ["first-scope", "second-scope"]
     factory = ServiceFactory(token_file="", secrets_file="", scopes=scopes)
     assert factory.scopes == scopes
+
+
+class FakeCredentials:
+    valid = True
+
+
+def test_service_cache_reuses_built_service(monkeypatch, tmp_path):
+    from google_cloud import service
+
+    built = []
+
+    def fake_build(name, version, creds, discovery_store):
+        built.append((name, version))
+        return object()
+
+    monkeypatch.setattr(service, "_load_credentials", lambda *a: FakeCredentials())
+    monkeypatch.setattr(service, "_build_service", fake_build)
+    service.clear_service_cache()
+
+    token_file = tmp_path / "token.json"
+    factory = ServiceFactory(token_file=token_file, secrets_file="")
+    first = factory.drive_api_service()
+    assert factory.drive_api_service() is first
+    assert factory.drive_api_service(refresh=True) is not first
+    assert built == [("drive", "v3"), ("drive", "v3")]
+    assert service.service_cache_info() == (1, 2, 1)
+
+
+def test_service_cache_rebuilds_when_token_file_changes(monkeypatch, tmp_path):
+    from google_cloud import service
+
+    monkeypatch.setattr(service, "_load_credentials", lambda *a: FakeCredentials())
+    monkeypatch.setattr(service, "_build_service", lambda *a: object())
+    service.clear_service_cache()
+
+    token_file = tmp_path / "token.json"
+    factory = ServiceFactory(token_file=token_file, secrets_file="")
+    first = factory.tasks_api_service()
+    token_file.write_text("{}")
+    assert factory.tasks_api_service() is not first
+
+
+def test_http_pool_gives_each_thread_its_own_transport():
+    import threading
+
+    from google_cloud.service import HttpPool
+
+    pool = HttpPool()
+    creds = FakeCredentials()
+    main_http = pool.http_for(creds)
+    assert pool.http_for(creds) is main_http
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(pool.http_for(creds)))
+    thread.start()
+    thread.join()
+    assert other[0] is not main_http
+
+
+def test_execute_batch_splits_and_collects_results():
+    from google_cloud.service import execute_batch
+
+    service = FakeBatchService()
+    requests = [f"r{i}" for i in range(250)]
+    requests[120] = "bad"
+    results = execute_batch(service, requests, keys=[f"k{i}" for i in range(250)])
+
+    assert [len(batch.requests) for batch in service.batches] == [100, 100, 50]
+    assert [result.key for result in results[:2]] == ["k0", "k1"]
+    assert results[5].response == {"id": "r5"}
+    assert not results[120].ok
+    assert sum(result.ok for result in results) == 249
+
+
+def test_service_cache_slow_build_does_not_block_other_apis(monkeypatch, tmp_path):
+    import threading
+
+    from google_cloud import service
+
+    building = threading.Event()
+    release = threading.Event()
+
+    def fake_build(name, version, creds, discovery_store):
+        if name == "drive":
+            building.set()
+            release.wait(5)
+        return object()
+
+    monkeypatch.setattr(service, "_load_credentials", lambda *a: FakeCredentials())
+    monkeypatch.setattr(service, "_build_service", fake_build)
+    service.clear_service_cache()
+
+    factory = ServiceFactory(token_file=tmp_path / "token.json", secrets_file="")
+    tasks = factory.tasks_api_service()
+    thread = threading.Thread(target=factory.drive_api_service)
+    thread.start()
+    try:
+        assert building.wait(5)
+        # drive is mid-build, yet a cached tasks service still comes straight back
+        hits = []
+        hit = threading.Thread(target=lambda: hits.append(factory.tasks_api_service()))
+        hit.start()
+        hit.join(1)
+        assert hits == [tasks]
+    finally:
+        release.set()
+        thread.join()
+
+
+def test_service_cache_keeps_discovery_stores_apart(monkeypatch, tmp_path):
+    from google_cloud import service
+    from google_cloud.discovery import DiscoveryStore
+
+    used = []
+
+    def fake_build(name, version, creds, discovery_store):
+        used.append(discovery_store)
+        return object()
+
+    monkeypatch.setattr(service, "_load_credentials", lambda *a: FakeCredentials())
+    monkeypatch.setattr(service, "_build_service", fake_build)
+    service.clear_service_cache()
+
+    token_file = tmp_path / "token.json"
+    first_store = DiscoveryStore(cache_dir=tmp_path / "a")
+    second_store = DiscoveryStore(cache_dir=tmp_path / "b")
+    first = ServiceFactory(token_file, "", discovery_store=first_store)
+    second = ServiceFactory(token_file, "", discovery_store=second_store)
+    assert first.drive_api_service() is not second.drive_api_service()
+    assert first.drive_api_service() is first.drive_api_service()
+    assert used == [first_store, second_store]
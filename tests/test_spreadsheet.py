@@ -0,0 +1,274 @@
+import pytest
+
+from google_cloud.ranges import parse_range
+from google_cloud.service import ServiceFactory
+from google_cloud.spreadsheet import GoogleSpreadsheet
+from helpers import FakeRequest, FakeSheetsService, FakeValues
+
+
+@pytest.fixture
+def sheets_service(monkeypatch):
+    service = FakeSheetsService(
+        ["One", "Two", "Three"],
+        {
+            "One": {"values": [["a", "b"], ["c"]]},
+            "Two": {"values": [["x"]]},
+        },
+    )
+    monkeypatch.setattr(
+        ServiceFactory, "sheets_api_service", lambda self, refresh=False: service
+    )
+    monkeypatch.setattr(
+        ServiceFactory, "drive_api_service", lambda self, refresh=False: service.drive
+    )
+    return service
+
+
+def test_for_id_loads_only_selected_sheets(sheets_service):
+    book = GoogleSpreadsheet.for_id("id", "", "", sheets=["two"])
+    assert sheets_service.metadata_fields
+    assert len(sheets_service._values.batch_gets) == 1
+    assert book.get_sheet("Two").loaded
+    assert not book.get_sheet("One").loaded
+
+    assert book.get_sheet("One")["B1"] == "b"
+    assert len(sheets_service._values.batch_gets) == 2
+    assert book.get_sheet("Three").rows is None
+    assert book.get_sheet("Three").loaded
+
+
+def test_for_id_lazy_fetches_nothing_up_front(sheets_service):
+    book = GoogleSpreadsheet.for_id("id", "", "", lazy=True)
+    assert sheets_service._values.batch_gets == []
+    assert book.get_sheet("one").get(2, 1) == "c"
+
+
+def test_for_id_rejects_unknown_sheet(sheets_service):
+    with pytest.raises(ValueError):
+        GoogleSpreadsheet.for_id("id", "", "", sheets=["missing"])
+
+
+def test_coalesce_merges_adjacent_cells_into_rectangles():
+    from google_cloud.sheet_writes import coalesce
+
+    cells = {(1, 1): "a", (1, 2): "b", (2, 1): "c", (2, 2): "d", (5, 3): "x"}
+    assert coalesce(cells) == [
+        (1, 1, 2, 2, [["a", "b"], ["c", "d"]]),
+        (5, 3, 5, 3, [["x"]]),
+    ]
+
+
+def test_split_payload_respects_request_size():
+    from google_cloud.sheet_writes import split_payload
+
+    data = [{"range": "'S'!A1:A100", "values": [["x" * 10]] * 100}]
+    chunks = list(split_payload(data, max_bytes=500))
+    assert len(chunks) > 1
+    assert sum(len(item["values"]) for chunk in chunks for item in chunk) == 100
+    assert chunks[0][0]["range"].startswith("'S'!A1:A")
+
+
+class FakeBatchUpdateValues(FakeValues):
+    def __init__(self, data):
+        super().__init__(data)
+        self.updates = []
+
+    def batchUpdate(self, spreadsheetId, body):
+        self.updates.append(body)
+        return FakeRequest({})
+
+
+def test_write_buffer_flushes_coalesced_ranges_on_exit(sheets_service):
+    sheets_service._values = FakeBatchUpdateValues(sheets_service._values.data)
+    book = GoogleSpreadsheet.for_id("id", "", "")
+    with book.buffered_writes() as buffer:
+        buffer.set("One", 1, 3, "c1")
+        buffer["'One'!D1"] = "d1"
+        buffer.set("Two", 2, 1, "y")
+        assert sheets_service._values.updates == []
+
+    [update] = sheets_service._values.updates
+    assert [item["range"] for item in update["data"]] == ["'One'!C1:D1", "'Two'!A2"]
+    assert book.get_sheet("One").rows[0] == ["a", "b", "c1", "d1"]
+    assert book.get_sheet("Two")["A2"] == "y"
+
+
+def test_write_buffer_flushes_at_max_cells(sheets_service):
+    sheets_service._values = FakeBatchUpdateValues(sheets_service._values.data)
+    book = GoogleSpreadsheet.for_id("id", "", "")
+    buffer = book.buffered_writes(max_cells=2)
+    buffer.set("One", 1, 1, 1)
+    buffer.set("One", 1, 1, 2)
+    assert sheets_service._values.updates == []
+    buffer.set("One", 3, 1, 3)
+    assert len(sheets_service._values.updates) == 1
+    assert len(buffer) == 0
+
+
+def test_write_rows_grows_grid_and_reports_progress(sheets_service):
+    sheets_service._values = FakeBatchUpdateValues(sheets_service._values.data)
+    grid_updates = []
+    sheets_service.batchUpdate = lambda spreadsheetId, body: FakeRequest(
+        grid_updates.append(body)
+    )
+    book = GoogleSpreadsheet.for_id("id", "", "")
+    progress = []
+
+    rows = ([i, f"row {i}"] for i in range(2500))
+    result = book.write_rows(
+        "Three", rows, block_rows=1000, max_workers=2, on_progress=progress.append
+    )
+
+    assert result.rows_written == 2500 and result.next_row == 2501
+    assert len(sheets_service._values.updates) == 3
+    [append] = grid_updates[0]["requests"]
+    assert append["appendDimension"]["dimension"] == "ROWS"
+    assert book.get_sheet("Three").meta_row_count >= 2500
+    assert progress[-1] == result
+
+
+def test_write_rows_headroom_bounds_the_blank_tail(sheets_service):
+    sheets_service._values = FakeBatchUpdateValues(sheets_service._values.data)
+    appended = []
+    sheets_service.batchUpdate = lambda spreadsheetId, body: FakeRequest(
+        appended.extend(
+            r["appendDimension"]["length"]
+            for r in body["requests"]
+            if r["appendDimension"]["dimension"] == "ROWS"
+        )
+    )
+    book = GoogleSpreadsheet.for_id("id", "", "")
+    sheet = book.get_sheet("Three")
+    rows_before = sheet.meta_row_count
+
+    rows = ([i] for i in range(rows_before + 250))
+    book.write_rows("Three", rows, block_rows=100, max_workers=4, headroom_rows=0)
+    assert sheet.meta_row_count == rows_before + 250
+
+    sheet.meta_row_count = rows_before
+    appended.clear()
+    rows = ([i] for i in range(rows_before + 250))
+    book.write_rows("Three", rows, block_rows=100, max_workers=4, headroom_rows=200)
+    assert appended == [300]
+    assert sheet.meta_row_count == rows_before + 300
+
+
+def test_write_rows_skips_empty_blocks_and_splits_large_ones(sheets_service):
+    sheets_service._values = FakeBatchUpdateValues(sheets_service._values.data)
+    sheets_service.batchUpdate = lambda spreadsheetId, body: FakeRequest({})
+    book = GoogleSpreadsheet.for_id("id", "", "")
+    progress = []
+
+    rows = [[]] * 10 + [["x" * 50]] * 10 + [[]] * 5
+    result = book.write_rows(
+        "Three",
+        rows,
+        block_rows=10,
+        max_request_bytes=200,
+        on_progress=progress.append,
+    )
+
+    assert (result.rows_written, result.next_row) == (25, 26)
+    ranges = [
+        item["range"] for u in sheets_service._values.updates for item in u["data"]
+    ]
+    assert len(ranges) > 1
+    assert parse_range(ranges[0]).first_row == 11
+    assert parse_range(ranges[-1]).last_row == 20
+    assert progress[-1] == result
+
+
+def make_config_sheet():
+    from google_cloud.spreadsheet import GoogleSheet
+
+    sheet = GoogleSheet(1, "Config", 0, False, "GRID", 1000, 26)
+    sheet.set_values(
+        [
+            ["Key", "Value", "Env"],
+            ["a", "1", "prod"],
+            ["b", "2", "dev"],
+            ["c", "3", "prod"],
+        ]
+    )
+    return sheet
+
+
+def test_indexes_answer_find_and_where():
+    sheet = make_config_sheet()
+    sheet.create_index("key", unique=True)
+    sheet.create_index("Env")
+
+    row = sheet.find(Key="b")
+    assert (row.row_number, row.values) == (3, ["b", "2", "dev"])
+    assert row.address == "'Config'!A3:C3"
+    assert [r.row_number for r in sheet.where(Env="prod")] == [2, 4]
+    assert [r.row_number for r in sheet.where(Env="prod", Value="3")] == [4]
+    assert sheet.find(Key="missing") is None
+
+
+def test_indexes_follow_local_edits():
+    sheet = make_config_sheet()
+    sheet.create_index("Key", unique=True)
+    sheet.set(3, 1, "renamed")
+    sheet.set(6, 1, "new")
+    assert sheet.find(Key="b") is None
+    assert sheet.find(Key="renamed").row_number == 3
+    assert sheet.find(Key="new").row_number == 6
+    assert [r.row_number for r in sheet.where(Key="")] == [5]
+    with pytest.raises(ValueError):
+        sheet.set(2, 1, "new")
+    assert sheet.get(2, 1) == "a"
+
+
+def test_local_edits_keep_columns_current():
+    from google_cloud.columnar import ColumnarValues
+
+    sheet = make_config_sheet()
+    sheet.columns = ColumnarValues.from_columns([["k", "a", "b"], ["v", 1, 2]])
+    sheet.set(2, 2, 99)
+    assert list(sheet.columns["v"]) == [99.0, 2.0]
+    sheet.set(3, 2, "text")
+    assert sheet.columns["v"] == [99.0, "text"]
+
+    # a header edit can't be mirrored, so the columnar view is dropped
+    sheet.set(1, 2, "renamed")
+    assert sheet.columns is None
+
+    sheet.columns = ColumnarValues.from_columns([["k", "a"]])
+    sheet.set_values([["k"], ["z"]])
+    assert sheet.columns is None
+
+
+def test_get_sheet_sees_added_sheets(sheets_service):
+    from google_cloud.spreadsheet import GoogleSheet
+
+    book = GoogleSpreadsheet.for_id("id", "", "")
+    assert book.get_sheet("four") is None
+    book.sheets.append(GoogleSheet(9, "Four", 3, False, "GRID", 10, 10))
+    assert book.get_sheet("FOUR").id == 9
+
+
+def test_refresh_skips_unchanged_workbooks_and_updates_in_place(sheets_service):
+    book = GoogleSpreadsheet.for_id("id", "", "", sheets=["One"])
+    one = book.get_sheet("One")
+    # the revision was recorded by for_id, so nothing is re-fetched
+    gets = len(sheets_service._values.batch_gets)
+    assert book.refresh() == []
+    assert len(sheets_service._values.batch_gets) == gets
+
+    sheets_service.drive.revision["version"] = "2"
+    sheets_service._values.data["One"] = {"values": [["changed"]]}
+    assert book.refresh() == [one]
+    assert book.get_sheet("One") is one
+    assert one["A1"] == "changed"
+    assert not book.get_sheet("Two").loaded
+
+
+def test_for_id_opens_without_drive_access(sheets_service):
+    from googleapiclient.errors import HttpError
+    import httplib2
+
+    forbidden = HttpError(httplib2.Response({"status": 403}), b"")
+    sheets_service.drive.get = lambda fileId, fields: FakeRequest(forbidden)
+    book = GoogleSpreadsheet.for_id("id", "", "", sheets=["One"])
+    assert book.get_sheet("One")["A1"] == "a"
@@ -0,0 +1,42 @@
+import pytest
+
+from google_cloud.tasks import TaskClient
+from helpers import FakeBatchService, FakeRequest
+
+
+class FakeTasksService(FakeBatchService):
+    def tasks(self):
+        return self
+
+    def delete(self, tasklist, task):
+        return task
+
+    def list(self, tasklist, maxResults, pageToken=None):
+        return FakeRequest({"items": [{"id": "t1"}, {"id": "bad"}]})
+
+
+def test_delete_tasks_accepts_a_generator():
+    client = TaskClient("", "")
+    service = FakeTasksService()
+    client.get_service = lambda refresh=False: service
+
+    results = client.delete_tasks("list", (f"t{idx}" for idx in range(3)))
+    assert [result.key for result in results] == ["t0", "t1", "t2"]
+    assert all(result.ok for result in results)
+
+
+def test_clear_tasklist_raises_when_a_delete_fails():
+    client = TaskClient("", "")
+    service = FakeTasksService()
+    client.get_service = lambda refresh=False: service
+
+    with pytest.raises(ValueError):
+        client.clear_tasklist("list")
+    assert len(service.batches) == 1
+
+
+def test_service_can_be_assigned():
+    client = TaskClient("", "")
+    service = FakeTasksService()
+    client.service = service
+    assert client.service is service